@@ -0,0 +1,8 @@
+"""Benchmarks of urbs performance
+
+Run a benchmark module from the repository root, e.g.::
+
+    python -m benchmark.get_entity mimo-example.xlsx
+    python -m benchmark.suite result.json --sites 10 --timesteps 720
+
+"""
@@ -0,0 +1,92 @@
+"""Benchmark of result extraction with get_entity
+
+Compares urbs.get_entity with the previous implementation, which built a
+DataFrame from one tuple per index, on all variables (and duals) of a
+solved model, and checks that both return the same Series.
+
+Usage::
+
+    python -m benchmark.get_entity [input.xlsx] [timesteps] [solver]
+
+"""
+import sys
+import time
+import pandas as pd
+import pyomo.environ
+import pyomo.core as pyomo
+from pyomo.opt.base import SolverFactory
+import urbs
+from urbs.pyomoio import _get_onset_names, _unique_labels
+
+
+def get_entity_tuples(instance, name):
+    """Previous get_entity for indexed variables and constraints."""
+    entity = instance.__getattribute__(name)
+    labels = _unique_labels(_get_onset_names(entity), name)
+    if isinstance(entity, pyomo.Constraint):
+        if entity.dim() > 1:
+            results = pd.DataFrame(
+                [v[0] + (instance.dual[v[1]],) for v in entity.items()])
+        else:
+            results = pd.DataFrame(
+                [(v[0], instance.dual[v[1]]) for v in entity.items()])
+    else:
+        if entity.dim() > 1:
+            results = pd.DataFrame(
+                [v[0] + (v[1].value,) for v in entity.items()])
+        else:
+            results = pd.DataFrame(
+                [(v[0], v[1].value) for v in entity.items()])
+    if results.empty:
+        return pd.Series(name=name)
+    results.columns = labels + [name]
+    results.set_index(labels, inplace=True)
+    return results[name]
+
+
+def run(input_file='mimo-example.xlsx', length=168, solver='glpk'):
+    """Time both implementations on all indexed variables and constraints.
+
+    Args:
+        input_file: input spreadsheet
+        length: number of modelled timesteps
+        solver: solver name for SolverFactory
+
+    Returns:
+        DataFrame indexed by entity name with columns entries, tuples
+        (seconds), bulk (seconds) and speedup
+    """
+    data = urbs.read_excel(input_file)
+    prob = urbs.create_model(data, range(3000, 3000 + length + 1),
+                             dual=True)
+    SolverFactory(solver).solve(prob)
+
+    names = (urbs.list_entities(prob, 'var').index.tolist() +
+             urbs.list_entities(prob, 'con').index.tolist())
+    rows = []
+    for name in names:
+        if getattr(prob, name).dim() == 0:
+            continue
+        clock = time.time()
+        old = get_entity_tuples(prob, name)
+        old_time = time.time() - clock
+        clock = time.time()
+        new = urbs.get_entity(prob, name)
+        new_time = time.time() - clock
+        if not (old.index.equals(new.index) and
+                old.fillna(0).equals(new.fillna(0))):
+            raise AssertionError('get_entity differs for ' + name)
+        rows.append((name, len(new), old_time, new_time))
+
+    result = pd.DataFrame(rows, columns=['entity', 'entries', 'tuples',
+                                         'bulk']).set_index('entity')
+    result.loc['total'] = result.sum()
+    result['speedup'] = result['tuples'] / result['bulk']
+    return result
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) > 1:
+        args[1] = int(args[1])
+    print(run(*args).to_string())
@@ -0,0 +1,198 @@
+"""Benchmark suite of the urbs workflow on synthetic input
+
+Times each step of a model run, from reading the input spreadsheet to the
+result figures, on a synthetic input of given size (c.f.
+benchmark.synthetic) and records the timings as JSON, so that the
+performance of releases can be compared.
+
+Cases, in order of execution: read_excel, validate_input, create_model,
+write_lp, solve, create_result_cache, save, load, report and
+result_figures. A failing case is recorded with its traceback; the
+following cases are still run.
+
+Usage::
+
+    python -m benchmark.suite result.json --sites 10 --timesteps 720
+    python -m benchmark.suite --compare old.json new.json
+
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+import pandas as pd
+import pyomo.environ
+from pyomo.opt.base import SolverFactory
+import urbs
+from urbs.saveload import create_result_cache
+from .synthetic import synthetic_input, write_excel
+
+# benchmark cases, in order of execution
+CASES = ['read_excel', 'validate_input', 'create_model', 'write_lp', 'solve',
+         'create_result_cache', 'save', 'load', 'report', 'result_figures']
+
+
+def run(sites=3, processes=8, storages=1, transmission_density=0.5,
+        dsm_sites=1, timesteps=168, solver='glpk', seed=0, filename=None):
+    """Run all benchmark cases on a synthetic input.
+
+    Args:
+        sites, processes, storages, transmission_density, dsm_sites,
+        timesteps, seed: size of the synthetic input, c.f.
+            benchmark.synthetic.synthetic_input
+        solver: (optional) solver name for SolverFactory, default 'glpk'
+        filename: (optional) JSON file to write the results to
+
+    Returns:
+        dict with keys created, versions, parameters, size (of the model),
+        objective, timings (case name to seconds, None if failed) and
+        errors (case name to traceback)
+    """
+    parameters = {'sites': sites, 'processes': processes,
+                  'storages': storages,
+                  'transmission_density': transmission_density,
+                  'dsm_sites': dsm_sites, 'timesteps': timesteps,
+                  'seed': seed, 'solver': solver}
+    results = {'created': datetime.now().strftime('%Y%m%dT%H%M%S'),
+               'versions': {'python': platform.python_version(),
+                            'pandas': pd.__version__,
+                            'pyomo': pyomo.version.version},
+               'parameters': parameters,
+               'size': {},
+               'objective': None,
+               'timings': dict((case, None) for case in CASES),
+               'errors': {}}
+
+    directory = tempfile.mkdtemp(prefix='urbs-benchmark-')
+    try:
+        input_file = os.path.join(directory, 'input.xlsx')
+        write_excel(synthetic_input(sites, processes, storages,
+                                    transmission_density, dsm_sites,
+                                    timesteps, seed), input_file)
+        state = {}
+
+        def case_read_excel():
+            state['data'] = urbs.read_excel(input_file)
+
+        def case_validate_input():
+            urbs.validate_input(state['data'])
+
+        def case_create_model():
+            state['prob'] = urbs.create_model(state['data'],
+                                              range(1, timesteps + 1))
+
+        def case_write_lp():
+            state['prob'].write(os.path.join(directory, 'model.lp'),
+                                io_options={'symbolic_solver_labels': True})
+
+        def case_solve():
+            result = SolverFactory(solver).solve(state['prob'])
+            state['prob'].solver_status = str(
+                result.solver.termination_condition)
+
+        def case_create_result_cache():
+            create_result_cache(state['prob'])
+
+        def case_save():
+            urbs.save(state['prob'], os.path.join(directory, 'result.h5'))
+
+        def case_load():
+            urbs.load(os.path.join(directory, 'result.h5'), lazy=False)
+
+        def case_report():
+            urbs.report(state['prob'], os.path.join(directory, 'report.xlsx'))
+
+        def case_result_figures():
+            urbs.result_figures(state['prob'],
+                                os.path.join(directory, 'figure'),
+                                plot_sites_name={}, extensions=['png'])
+
+        functions = {
+            'read_excel': case_read_excel,
+            'validate_input': case_validate_input,
+            'create_model': case_create_model,
+            'write_lp': case_write_lp,
+            'solve': case_solve,
+            'create_result_cache': case_create_result_cache,
+            'save': case_save,
+            'load': case_load,
+            'report': case_report,
+            'result_figures': case_result_figures}
+        for case in CASES:
+            start = time.time()
+            try:
+                functions[case]()
+            except Exception:
+                results['errors'][case] = traceback.format_exc()
+                continue
+            results['timings'][case] = time.time() - start
+
+        prob = state.get('prob')
+        if prob is not None:
+            results['size'] = {
+                'variables': prob.nvariables(),
+                'constraints': prob.nconstraints()}
+            if 'solve' not in results['errors']:
+                results['objective'] = pyomo.environ.value(prob.obj)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if filename is not None:
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return results
+
+
+def compare(old, new):
+    """Compare the timings of two benchmark result files.
+
+    Args:
+        old: JSON file of the reference results, e.g. of the last release
+        new: JSON file of the results to compare
+
+    Returns:
+        DataFrame indexed by case with columns old, new (seconds) and ratio
+        (new / old, above 1 for regressions)
+    """
+    timings = {}
+    for key, filename in (('old', old), ('new', new)):
+        with open(filename) as f:
+            timings[key] = pd.Series(json.load(f)['timings'], dtype=float)
+    result = pd.DataFrame(timings).reindex(CASES)
+    result['ratio'] = result['new'] / result['old']
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark urbs on synthetic input.')
+    parser.add_argument('filename', nargs='?',
+                        help='JSON file to write the results to')
+    parser.add_argument('--sites', type=int, default=3)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--storages', type=int, default=1)
+    parser.add_argument('--transmission-density', type=float, default=0.5)
+    parser.add_argument('--dsm-sites', type=int, default=1)
+    parser.add_argument('--timesteps', type=int, default=168)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--solver', default='glpk')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead')
+    args = parser.parse_args()
+
+    if args.compare:
+        print(compare(*args.compare).to_string())
+        sys.exit()
+
+    results = run(args.sites, args.processes, args.storages,
+                  args.transmission_density, args.dsm_sites, args.timesteps,
+                  args.solver, args.seed, args.filename)
+    print(pd.Series(results['timings'], dtype=float).to_string())
+    for case, error in sorted(results['errors'].items()):
+        print('\n{} failed:\n{}'.format(case, error))
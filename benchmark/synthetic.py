@@ -0,0 +1,285 @@
+"""Synthetic urbs input of scalable size
+
+synthetic_input creates an input dict in the structure returned by
+urbs.read_excel, modelled on mimo-example.xlsx, whose size is controlled by
+the number of sites, processes per site, storages per site, the density of
+the transmission network, the number of sites with demand-side management
+and the number of timesteps. Timeseries are drawn from a seeded random
+generator, so that the same parameters always yield the same input.
+
+Usage::
+
+    python -m benchmark.synthetic output.xlsx [sites] [processes] [timesteps]
+
+"""
+import itertools
+import sys
+import numpy as np
+import pandas as pd
+from urbs.input import INPUT_SHEETS, TIMESERIES_INPUTS, _prepare_input
+
+# process templates: (name, {commodity: ratio} in, {commodity: ratio} out,
+# ratio-min of the input (or None), process attributes); processes beyond
+# the number of templates are numbered copies of them
+PROCESSES = [
+    ('Slack powerplant', {'Slack': 1.0}, {'Elec': 1.0, 'CO2': 0.0}, None,
+     {'inst-cap': 999999, 'cap-up': 999999, 'inv-cost': 0, 'fix-cost': 0,
+      'var-cost': 0.0}),
+    ('Gas plant', {'Gas': 1.0}, {'Elec': 0.6, 'CO2': 0.2}, 1.2,
+     {'cap-up': 100000, 'max-grad': 4.8, 'min-fraction': 0.25,
+      'inv-cost': 450000, 'fix-cost': 6000, 'var-cost': 1.62}),
+    ('Wind park', {'Wind': 1.0}, {'Elec': 1.0}, None,
+     {'cap-up': 60000, 'inv-cost': 1500000, 'fix-cost': 25000,
+      'var-cost': 0.0}),
+    ('Photovoltaics', {'Solar': 1.0}, {'Elec': 1.0}, None,
+     {'cap-up': 160000, 'inv-cost': 600000, 'fix-cost': 12000,
+      'var-cost': 0.0}),
+    ('Coal plant', {'Coal': 1.0}, {'Elec': 0.4, 'CO2': 0.3}, 1.4,
+     {'cap-up': 100000, 'max-grad': 0.6, 'min-fraction': 0.5,
+      'inv-cost': 600000, 'fix-cost': 18000, 'var-cost': 0.6}),
+    ('Biomass plant', {'Biomass': 1.0}, {'Elec': 0.35, 'CO2': 0.0}, None,
+     {'cap-up': 5000, 'max-grad': 1.2, 'inv-cost': 875000,
+      'fix-cost': 28000, 'var-cost': 1.4}),
+    ('Hydro plant', {'Hydro': 1.0}, {'Elec': 1.0}, None,
+     {'cap-up': 20000, 'inv-cost': 1600000, 'fix-cost': 20000,
+      'var-cost': 0.0}),
+    ('Lignite plant', {'Lignite': 1.0}, {'Elec': 0.4, 'CO2': 0.4}, 2.0,
+     {'cap-up': 60000, 'max-grad': 0.9, 'min-fraction': 0.65,
+      'inv-cost': 600000, 'fix-cost': 18000, 'var-cost': 0.6}),
+    ('Feed-in', {'Elec': 1.0}, {'Elec sell': 1.0}, None,
+     {'cap-up': 2500, 'inv-cost': 0, 'fix-cost': 0, 'var-cost': 0.0}),
+    ('Purchase', {'Elec buy': 1.0}, {'Elec': 1.0, 'CO2': 0.0005}, None,
+     {'cap-up': 2500, 'inv-cost': 0, 'fix-cost': 0, 'var-cost': 0.0}),
+]
+
+# default process attributes
+PROCESS_DEFAULTS = {'inst-cap': 0, 'cap-lo': 0, 'max-grad': float('inf'),
+                    'min-fraction': 0.0, 'wacc': 0.07, 'depreciation': 30,
+                    'area-per-cap': float('nan')}
+
+# commodities: type, price
+COMMODITIES = {
+    'Elec': ('Demand', float('nan')),
+    'CO2': ('Env', 0.0),
+    'Slack': ('Stock', 999.0),
+    'Gas': ('Stock', 27.0),
+    'Coal': ('Stock', 7.0),
+    'Biomass': ('Stock', 6.0),
+    'Lignite': ('Stock', 4.0),
+    'Wind': ('SupIm', float('nan')),
+    'Solar': ('SupIm', float('nan')),
+    'Hydro': ('SupIm', float('nan')),
+    'Elec sell': ('Sell', 0.25),
+    'Elec buy': ('Buy', 1.25),
+}
+
+# attribute columns of the inputs which may have no rows
+TRANSMISSION_COLUMNS = ['eff', 'inv-cost', 'fix-cost', 'var-cost', 'inst-cap',
+                        'cap-lo', 'cap-up', 'wacc', 'depreciation']
+STORAGE_COLUMNS = ['inst-cap-c', 'cap-lo-c', 'cap-up-c', 'inst-cap-p',
+                   'cap-lo-p', 'cap-up-p', 'eff-in', 'eff-out', 'inv-cost-p',
+                   'inv-cost-c', 'fix-cost-p', 'fix-cost-c', 'var-cost-p',
+                   'var-cost-c', 'wacc', 'depreciation', 'init', 'discharge']
+DSM_COLUMNS = ['delay', 'eff', 'recov', 'cap-max-do', 'cap-max-up']
+
+# storage templates: name, eff-in/-out, inv-cost-p, inv-cost-c
+STORAGES = [
+    ('Pump storage', 0.94, 100000, 0.0),
+    ('Battery', 0.95, 75000, 150000.0),
+    ('Hydrogen', 0.64, 42000, 6.54),
+]
+
+
+def synthetic_input(sites=3, processes=8, storages=1,
+                    transmission_density=0.5, dsm_sites=1, timesteps=168,
+                    seed=0):
+    """Create a synthetic urbs input dict.
+
+    Every site gets the same processes and storages and an electricity
+    demand. The first process is a slack power plant, so that every site can
+    satisfy its demand even without transmission.
+
+    Args:
+        sites: number of sites
+        processes: number of processes per site; the templates in PROCESSES
+            are used in order and repeated as numbered copies
+        storages: number of electricity storages per site
+        transmission_density: fraction (0 to 1) of all site pairs connected
+            by a (bidirectional) transmission line; a chain of lines through
+            all sites is always included for densities above 0
+        dsm_sites: number of sites with demand-side management
+        timesteps: number of timesteps, not counting the initial timestep 0
+        seed: seed of the random timeseries and transmission network
+
+    Returns:
+        a dict of input DataFrames, identical in structure to read_excel
+    """
+    rng = np.random.RandomState(seed)
+    site_names = ['Site{}'.format(i) for i in range(sites)]
+    t = pd.Index(range(timesteps + 1), name='t')
+
+    # processes and their commodities
+    process_rows = []
+    process_commodity_rows = []
+    commodities = set(['Elec', 'CO2'])
+    for i in range(processes):
+        name, inputs, outputs, ratio_min, attributes = \
+            PROCESSES[i % len(PROCESSES)]
+        if i >= len(PROCESSES):
+            name = '{} {}'.format(name, i // len(PROCESSES) + 1)
+        attributes = dict(PROCESS_DEFAULTS, **attributes)
+        for site in site_names:
+            process_rows.append(dict(attributes, Site=site, Process=name))
+        for com, ratio in inputs.items():
+            process_commodity_rows.append(
+                {'Process': name, 'Commodity': com, 'Direction': 'In',
+                 'ratio': ratio,
+                 'ratio-min': ratio_min if ratio_min else float('nan')})
+        for com, ratio in outputs.items():
+            process_commodity_rows.append(
+                {'Process': name, 'Commodity': com, 'Direction': 'Out',
+                 'ratio': ratio, 'ratio-min': float('nan')})
+        commodities.update(inputs)
+        commodities.update(outputs)
+
+    commodity_rows = []
+    for site in site_names:
+        for com in sorted(commodities):
+            com_type, price = COMMODITIES[com]
+            # no limits for demand and intermittent supply commodities
+            limit = (float('nan') if com_type in ('Demand', 'SupIm')
+                     else float('inf'))
+            commodity_rows.append({'Site': site, 'Commodity': com,
+                                   'Type': com_type, 'price': price,
+                                   'max': limit, 'maxperstep': limit})
+
+    storage_rows = []
+    for i in range(storages):
+        name, eff, inv_cost_p, inv_cost_c = STORAGES[i % len(STORAGES)]
+        if i >= len(STORAGES):
+            name = '{} {}'.format(name, i // len(STORAGES) + 1)
+        for site in site_names:
+            storage_rows.append({
+                'Site': site, 'Storage': name, 'Commodity': 'Elec',
+                'inst-cap-c': 0, 'cap-lo-c': 0, 'cap-up-c': float('inf'),
+                'inst-cap-p': 0, 'cap-lo-p': 0, 'cap-up-p': float('inf'),
+                'eff-in': eff, 'eff-out': eff, 'inv-cost-p': inv_cost_p,
+                'inv-cost-c': inv_cost_c, 'fix-cost-p': 0, 'fix-cost-c': 0,
+                'var-cost-p': 0.02, 'var-cost-c': 0, 'wacc': 0.07,
+                'depreciation': 50, 'init': 0.5, 'discharge': 0.0})
+
+    # transmission: a chain through all sites, plus random further pairs
+    pairs = list(itertools.combinations(range(sites), 2))
+    connected = set()
+    if transmission_density > 0:
+        connected.update((i, i + 1) for i in range(sites - 1))
+    number = int(round(transmission_density * len(pairs)))
+    for k in rng.permutation(len(pairs)):
+        if len(connected) >= number:
+            break
+        connected.add(pairs[k])
+    transmission_rows = []
+    for i, j in sorted(connected):
+        for site_in, site_out in ((i, j), (j, i)):
+            transmission_rows.append({
+                'Site In': site_names[site_in],
+                'Site Out': site_names[site_out],
+                'Transmission': 'hvac', 'Commodity': 'Elec', 'eff': 0.9,
+                'inv-cost': 1650000, 'fix-cost': 16500, 'var-cost': 0,
+                'inst-cap': 0, 'cap-lo': 0, 'cap-up': float('inf'),
+                'wacc': 0.07, 'depreciation': 40})
+
+    dsm_rows = [{'Site': site, 'Commodity': 'Elec', 'delay': 8, 'eff': 1.0,
+                 'recov': 1, 'cap-max-do': 500, 'cap-max-up': 500}
+                for site in site_names[:dsm_sites]]
+
+    # timeseries: daily cycles with random noise; timestep 0 is all zeros
+    hours = np.arange(len(t))
+    demand = pd.DataFrame(index=t)
+    supim = pd.DataFrame(index=t)
+    for site in site_names:
+        level = rng.uniform(5000, 50000)
+        demand[site + '.Elec'] = level * (
+            1 + 0.3 * np.sin(2 * np.pi * (hours - 6) / 24) +
+            0.05 * rng.standard_normal(len(t)))
+        for com in sorted(commodities):
+            if COMMODITIES[com][0] != 'SupIm':
+                continue
+            if com == 'Solar':
+                series = np.maximum(
+                    0, np.sin(2 * np.pi * (hours - 6) / 24)) * \
+                    rng.uniform(0.6, 1.0, len(t))
+            else:
+                series = rng.uniform(0, 1, len(t))
+            supim['{}.{}'.format(site, com)] = series
+    buy_sell_price = pd.DataFrame(index=t)
+    buy_sell_price['Elec buy'] = rng.uniform(0.05, 0.15, len(t))
+    buy_sell_price['Elec sell'] = rng.uniform(-0.05, 0.1, len(t))
+    for df in (demand, supim, buy_sell_price):
+        df.iloc[0] = 0
+
+    data = {
+        'global_prop': pd.DataFrame(
+            {'value': [float('inf')],
+             'description': ['Limits the sum of all created CO2']},
+            index=pd.Index(['CO2 limit'], name='Property')),
+        'site': pd.DataFrame({'area': float('nan')},
+                             index=pd.Index(site_names, name='Name')),
+        'commodity': _frame(commodity_rows, 'commodity'),
+        'process': _frame(process_rows, 'process'),
+        'process_commodity': _frame(process_commodity_rows,
+                                    'process_commodity'),
+        'transmission': _frame(transmission_rows, 'transmission',
+                               TRANSMISSION_COLUMNS),
+        'storage': _frame(storage_rows, 'storage', STORAGE_COLUMNS),
+        'demand': demand,
+        'supim': supim,
+        'buy_sell_price': buy_sell_price,
+        'dsm': _frame(dsm_rows, 'dsm', DSM_COLUMNS),
+    }
+    return _prepare_input(data)
+
+
+def _frame(rows, key, columns=None):
+    """Create the input DataFrame key from a list of row dicts.
+
+    Args:
+        rows: list of dicts of index and attribute columns
+        key: input dict key, e.g. 'storage'
+        columns: (optional) list of attribute columns; required if rows may
+            be empty
+
+    Returns:
+        the input DataFrame with its index set
+    """
+    index = INPUT_SHEETS[key][1]
+    if columns is not None:
+        columns = index + columns
+    return pd.DataFrame(rows, columns=columns).set_index(index)
+
+
+def write_excel(data, filename):
+    """Write an urbs input dict to a spreadsheet readable by read_excel.
+
+    Args:
+        data: urbs input dict, e.g. from synthetic_input
+        filename: Excel spreadsheet filename, will be overwritten if exists
+
+    Returns:
+        Nothing
+    """
+    with pd.ExcelWriter(filename) as writer:
+        for key, (sheet, index) in INPUT_SHEETS.items():
+            df = data[key].copy()
+            if key in TIMESERIES_INPUTS:
+                # join MultiIndex columns ('DE', 'Elec') back to 'DE.Elec'
+                df.columns = ['.'.join(col) if isinstance(col, tuple)
+                              else col for col in df.columns]
+            df.reset_index().to_excel(writer, sheet_name=sheet, index=False)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    sizes = dict(zip(['sites', 'processes', 'timesteps'],
+                     [int(arg) for arg in args[1:]]))
+    write_excel(synthetic_input(**sizes), args[0])
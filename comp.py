@@ -27,15 +27,15 @@ def get_most_recent_entry(search_dir):
 
 
 def glob_result_files(folder_name):
-    """ Glob result spreadsheets from specified folder.
+    """ Glob result files from specified folder.
 
     Args:
         folder_name: an absolute or relative path to a directory
 
     Returns:
-        list of filenames that match the pattern 'scenario_*.xlsx'
+        list of filenames that match the pattern 'scenario_*.h5'
     """
-    glob_pattern = os.path.join(folder_name, 'scenario_*.xlsx')
+    glob_pattern = os.path.join(folder_name, 'scenario_*.h5')
     result_files = sorted(glob.glob(glob_pattern))
     return result_files
 
@@ -88,26 +88,26 @@ def group_hbar_plots(ax, group_size, inner_sep=None):
 
 
 def compare_scenarios(result_files, output_filename):
-    """ Create report sheet and plots for given report spreadsheets.
+    """ Create report sheet and plots for given result files.
+
+    Costs and created energies are taken from the scenario catalogue of
+    each result directory (see urbs.update_catalogue), so only new or
+    changed result files are read, and of these only the costs and the
+    process outputs of demand and environmental commodities.
 
     Args:
-        result_files: a list of spreadsheet filenames generated by urbs.report
+        result_files: a list of HDF5 result filenames generated by urbs.save
         output_filename: a spreadsheet filename that the comparison is to be
                          written to
 
      Returns:
         Nothing
-
-    To do:
-        Don't use report spreadsheets, instead load pickled problem
-        instances. This would make this function less fragile and dependent
-        on the output format of urbs.report().
     """
 
     # derive list of scenario names for column labels/figure captions
     scenario_names = [os.path.basename(rf)  # drop folder names, keep filename
                       .replace('_', ' ')  # replace _ with spaces
-                      .replace('.xlsx', '')  # drop file extension
+                      .replace('.h5', '')  # drop file extension
                       .replace('scenario ', '')  # drop 'scenario ' prefix
                       for rf in result_files]
 
@@ -119,40 +119,29 @@ def compare_scenarios(result_files, output_filename):
     except ValueError:
         pass  # do nothing if no base scenario is found
 
-    costs = []  # total costs by type and scenario
-    esums = []  # sum of energy produced by scenario
-
     # READ
 
+    catalogues = {}
+    for directory in set(os.path.dirname(rf) for rf in result_files):
+        catalogues[directory] = urbs.update_catalogue(directory)
+
+    costs = []  # total costs by type and scenario
+    esums = []  # energy created by commodity and process, per scenario
     for rf in result_files:
-        with pd.ExcelFile(rf) as xls:
-            cost = xls.parse('Costs', index_col=[0])
-            esum = xls.parse('Commodity sums')
-
-            # repair broken MultiIndex in the first column
-            esum.reset_index(inplace=True)
-            esum.fillna(method='ffill', inplace=True)
-            esum.set_index(['level_0', 'level_1'], inplace=True)
-
-            costs.append(cost)
-
-            # extract sites and commodities from scenario
-            sitcom = [value.split('.') for value
-                      in esum.columns.get_level_values(0)]
-            coms = set([com for sit, com in sitcom])
-            com_sums = pd.DataFrame()
-            # get site.commodity names
-            sit_com = esum.columns.get_level_values(0)
-            # sum each commodity (e.g. Elec, CO2)
-            for com in coms:
-                com_sum = pd.DataFrame(esum.loc[:, sit_com.str.contains(com)]
-                                       .sum(axis=1), columns=[com])
-                com_sums = pd.concat([com_sums, com_sum], axis=1)
-            esums.append(com_sums)
+        scenarios, created = catalogues[os.path.dirname(rf)]
+        scenario = os.path.splitext(os.path.basename(rf))[0]
+        costs.append(scenarios.loc[scenario]
+                              .drop(urbs.catalogue.SCENARIO_COLUMNS)
+                              .astype(float).to_frame('costs'))
+        esums.append(created.xs(scenario, level='scenario').unstack('com'))
+
+    # same commodities for all scenarios, as group_hbar_plots expects
+    coms = sorted(set(com for esum in esums for com in esum.columns))
+    esums = [esum.reindex(columns=coms) for esum in esums]
 
     # merge everything into one DataFrame each
     costs = pd.concat(costs, axis=1, keys=scenario_names)
-    esums = pd.concat(esums, axis=1, keys=scenario_names)
+    esums = pd.concat(esums, axis=1, keys=scenario_names).fillna(0)
 
     # ANALYSE
 
@@ -172,7 +161,6 @@ def compare_scenarios(result_files, output_filename):
     # make index name 'Commodity' nicer for plot
     # drop all unused commodities and sort/transpose
     # convert MWh to GWh
-    esums = esums.loc['Created']
     esums.index.name = 'Commodity'
     used_commodities = (esums.sum(axis=1) > 0)
     esums = esums[used_commodities].sort_index().transpose()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import urbs
+import urbs.catalogue
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), '..',
+                          'mimo-example.xlsx')
+
+
+class CatalogueTest(unittest.TestCase):
+    """The catalogue summarises the result files of a directory."""
+
+    @classmethod
+    def setUpClass(cls):
+        data = urbs.read_excel(INPUT_FILE)
+        cls.models = {}
+        for scenario, limit in (('base', None), ('co2_limit', 0.5)):
+            sce_data = urbs.copy_input(data)
+            if limit is not None:
+                sce_data['global_prop'].loc['CO2 limit', 'value'] *= limit
+            mm = urbs.create_model(sce_data, range(0, 7), backend='matrix')
+            mm.solve()
+            cls.models[scenario] = mm
+
+    def setUp(self):
+        self.result_dir = tempfile.mkdtemp()
+        for scenario, mm in self.models.items():
+            urbs.save(mm, os.path.join(self.result_dir, scenario + '.h5'))
+
+    def tearDown(self):
+        shutil.rmtree(self.result_dir)
+
+    def test_costs(self):
+        scenarios, created = urbs.update_catalogue(self.result_dir)
+        self.assertEqual(sorted(scenarios.index), sorted(self.models))
+        for scenario, mm in self.models.items():
+            row = scenarios.loc[scenario]
+            self.assertEqual(row['file'], scenario + '.h5')
+            self.assertEqual(row['solver_status'], 'optimal')
+            self.assertAlmostEqual(row['objective'] / mm.obj_value, 1,
+                                   places=9)
+            for cost_type, value in mm._result['costs'].items():
+                self.assertAlmostEqual(row[cost_type], value, places=3)
+
+            e_pro_out = mm._result['e_pro_out'].dropna()
+            elec = e_pro_out.xs('Elec', level='com').groupby(
+                level='pro').sum()
+            for pro, value in elec.items():
+                self.assertAlmostEqual(created[scenario, 'Elec', pro], value,
+                                       places=3)
+
+    def test_unchanged_files(self):
+        expected = urbs.update_catalogue(self.result_dir)
+
+        # unchanged result files are taken from the catalogue
+        with mock.patch('urbs.catalogue._catalogue_entry',
+                        side_effect=AssertionError('read again')):
+            scenarios, created = urbs.update_catalogue(self.result_dir)
+        self.assertTrue(scenarios.equals(expected[0]))
+        self.assertTrue(created.equals(expected[1]))
+
+        # a changed modification time marks a file as changed
+        result_file = os.path.join(self.result_dir, 'base.h5')
+        mtime = os.path.getmtime(result_file) + 10
+        os.utime(result_file, (mtime, mtime))
+        with mock.patch('urbs.catalogue._catalogue_entry',
+                        wraps=urbs.catalogue._catalogue_entry) as entry:
+            scenarios, created = urbs.update_catalogue(self.result_dir)
+        self.assertEqual(entry.call_count, 1)
+        self.assertEqual(entry.call_args[0][0], result_file)
+        self.assertEqual(scenarios.loc['base', 'mtime'], mtime)
+        self.assertTrue(created.equals(expected[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pandas as pd
+
+import urbs
+import urbs.input
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), '..',
+                          'mimo-example.xlsx')
+
+
+def parquet_available():
+    for module in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+class InputRoundTripTest(unittest.TestCase):
+    """write_input and read_input reproduce the input of read_excel."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = urbs.read_excel(INPUT_FILE)
+
+    def assertRoundTrip(self, fmt):
+        path = tempfile.mkdtemp()
+        try:
+            urbs.write_input(self.data, path, fmt=fmt)
+            data = urbs.read_input(path)
+        finally:
+            shutil.rmtree(path)
+        for key in ('demand', 'supim', 'buy_sell_price'):
+            self.assertTrue(data[key].equals(self.data[key]), key)
+
+    def test_csv(self):
+        self.assertRoundTrip('csv')
+
+    @unittest.skipUnless(parquet_available(),
+                         'requires pyarrow or fastparquet')
+    def test_parquet(self):
+        self.assertRoundTrip('parquet')
+
+
+class ReadExcelCacheTest(unittest.TestCase):
+    """read_excel(cache=True) returns fresh copies of the parsed input."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'input.xlsx')
+        self.cache_dir = os.path.join(self.path, 'cache')
+        shutil.copyfile(INPUT_FILE, self.filename)
+        # start without the parsed inputs of earlier tests
+        patcher = mock.patch.dict(urbs.input._input_cache, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def read(self):
+        return urbs.read_excel(self.filename, cache=True,
+                               cache_dir=self.cache_dir)
+
+    def test_cache_hit(self):
+        data = self.read()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        # neither the parsed input of this process nor the cache file
+        # require parsing the spreadsheet again
+        with mock.patch('urbs.input._parse_excel',
+                        side_effect=AssertionError('parsed again')):
+            cached = self.read()
+            urbs.input._input_cache.clear()
+            from_file = self.read()
+        for key in data:
+            self.assertTrue(cached[key].equals(data[key]), key)
+            self.assertTrue(from_file[key].equals(data[key]), key)
+
+    def test_changed_file(self):
+        limit = self.read()['global_prop'].loc['CO2 limit', 'value']
+
+        sheets = pd.read_excel(self.filename, sheet_name=None)
+        prop = sheets['Global']
+        prop.loc[prop['Property'] == 'CO2 limit', 'value'] = limit / 2
+        with pd.ExcelWriter(self.filename) as writer:
+            for name, sheet in sheets.items():
+                sheet.to_excel(writer, sheet_name=name, index=False)
+
+        data = self.read()
+        self.assertEqual(data['global_prop'].loc['CO2 limit', 'value'],
+                         limit / 2)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_no_mutation_leak(self):
+        data = self.read()
+        limit = data['global_prop'].loc['CO2 limit', 'value']
+        data['global_prop'].loc['CO2 limit', 'value'] = 0
+        data['demand'].iloc[:, 0] = -1
+        data['dsm'] = pd.DataFrame()
+
+        data = self.read()
+        self.assertEqual(data['global_prop'].loc['CO2 limit', 'value'],
+                         limit)
+        self.assertTrue((data['demand'].iloc[:, 0] >= 0).all())
+        self.assertFalse(data['dsm'].empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
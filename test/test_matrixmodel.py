@@ -0,0 +1,75 @@
+import os
+import unittest
+
+import pyomo.environ
+from pyomo.opt.base import SolverFactory
+
+import urbs
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), '..',
+                          'mimo-example.xlsx')
+
+
+def glpk_available():
+    return SolverFactory('glpk').available(exception_flag=False)
+
+
+@unittest.skipUnless(glpk_available(), 'requires the glpk solver')
+class MatrixModelTest(unittest.TestCase):
+    """The matrix backend solves the same problem as the Pyomo model."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = urbs.read_excel(INPUT_FILE)
+
+    def assertSameObjective(self, data, timesteps):
+        prob = urbs.create_model(urbs.copy_input(data), timesteps)
+        result = SolverFactory('glpk').solve(prob)
+        self.assertEqual(str(result.solver.termination_condition),
+                         'optimal')
+
+        mm = urbs.create_model(urbs.copy_input(data), timesteps,
+                               backend='matrix')
+        mm.solve('highs')
+        self.assertAlmostEqual(mm.obj_value / pyomo.environ.value(prob.obj),
+                               1, places=6)
+
+    def test_objective(self):
+        self.assertSameObjective(self.data, range(0, 49))
+
+    def test_objective_representative_periods(self):
+        data = urbs.aggregate_timeseries(self.data, 2,
+                                         timesteps=range(0, 24 * 7 + 1))
+        self.assertSameObjective(data, range(0, 49))
+
+    def test_solve_input(self):
+        # regenerate the problem from the input data and solve it with
+        # glpsol from an LP file; the result cache has the entities of a
+        # solved Pyomo model
+        prob = urbs.create_model(urbs.copy_input(self.data), range(0, 25),
+                                 dsm='pairwise')
+        urbs.solve_input(prob, 'glpk')
+        mm = urbs.create_model(urbs.copy_input(self.data), range(0, 25),
+                               backend='matrix')
+        mm.solve('highs')
+        self.assertAlmostEqual(prob._result['costs'].sum() / mm.obj_value,
+                               1, places=6)
+        for name in ('e_pro_in', 'e_pro_out', 'com', 'pro_input_tuples',
+                     'process_cap_lo', 'co2_limit'):
+            self.assertIn(name, prob._result)
+        self.assertEqual(len(prob._result['e_pro_in']),
+                         len(prob.tm) * len(prob.pro_tuples) * len(prob.com))
+
+    @unittest.skipUnless(SolverFactory('cbc').available(exception_flag=False),
+                         'requires the cbc solver')
+    def test_solve_file_cbc(self):
+        mm = urbs.create_model(urbs.copy_input(self.data), range(0, 25),
+                               backend='matrix')
+        mm.solve('cbc')
+        obj_cbc = mm.obj_value
+        mm.solve('highs')
+        self.assertAlmostEqual(obj_cbc / mm.obj_value, 1, places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pandas as pd
+import pandas.core.indexing
+from pyomo.core.base.constraint import Constraint
+from pyomo.core.base.objective import Objective
+from pyomo.environ import value
+from pyomo.opt.base import SolverFactory
+
+import urbs
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), '..',
+                          'mimo-example.xlsx')
+
+
+class ConstraintRulesTest(unittest.TestCase):
+    """Constraint and objective rules only use the dicts of pyomo_model_prep.
+
+    DataFrame and Series lookups are orders of magnitude slower than dict
+    lookups, so a single one in a rule slows down model creation for large
+    models noticeably. While any constraint or objective is constructed,
+    all pandas item and .loc/.iloc access raises.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = urbs.read_excel(INPUT_FILE)
+
+    def create_model_guarded(self, dsm):
+        constructing = []
+
+        def guard(method, what):
+            def guarded(obj, *args, **kwargs):
+                if constructing:
+                    raise AssertionError('{} in rule of {}'.format(
+                        what, constructing[-1]))
+                return method(obj, *args, **kwargs)
+            return guarded
+
+        def construct(method):
+            def tracked(component, data=None):
+                constructing.append(component.name)
+                try:
+                    return method(component, data)
+                finally:
+                    constructing.pop()
+            return tracked
+
+        indexing = pandas.core.indexing
+        patchers = [
+            mock.patch.object(Constraint, 'construct',
+                              construct(Constraint.construct)),
+            mock.patch.object(Objective, 'construct',
+                              construct(Objective.construct))]
+        for cls, what in ((pd.DataFrame, 'DataFrame[]'),
+                          (pd.Series, 'Series[]'),
+                          (indexing._LocIndexer, '.loc[]'),
+                          (indexing._iLocIndexer, '.iloc[]')):
+            patchers.append(mock.patch.object(
+                cls, '__getitem__', guard(cls.__getitem__, what)))
+        for patcher in patchers:
+            patcher.start()
+        try:
+            return urbs.create_model(urbs.copy_input(self.data),
+                                     range(3000, 3025), dsm=dsm)
+        finally:
+            for patcher in patchers:
+                patcher.stop()
+
+    def test_no_dataframe_access_in_rules(self):
+        for dsm in ('compact', 'pairwise'):
+            prob = self.create_model_guarded(dsm)
+            # the input covers the features with their own rules
+            for name in ('pro_area_tuples', 'pro_partial_tuples',
+                         'pro_sell_buy_tuples', 'dsm_site_tuples'):
+                self.assertTrue(len(getattr(prob, name)), name)
+
+
+@unittest.skipUnless(SolverFactory('glpk').available(exception_flag=False),
+                     'requires the glpk solver')
+class DsmFormulationTest(unittest.TestCase):
+    """The compact and pairwise DSM formulations allow the same shifts."""
+
+    def test_same_objective(self):
+        data = urbs.read_excel(INPUT_FILE)
+        self.assertFalse(data['dsm'].empty)
+        objectives = {}
+        for dsm in ('compact', 'pairwise'):
+            prob = urbs.create_model(urbs.copy_input(data), range(0, 49),
+                                     dsm=dsm)
+            SolverFactory('glpk').solve(prob)
+            objectives[dsm] = value(prob.obj)
+        mm = urbs.create_model(urbs.copy_input(data), range(0, 49),
+                               backend='matrix')
+        mm.solve()
+        objectives['matrix'] = mm.obj_value
+
+        for dsm in ('pairwise', 'matrix'):
+            self.assertAlmostEqual(objectives[dsm] / objectives['compact'],
+                                   1, places=6, msg=dsm)
+
+
+if __name__ == '__main__':
+    unittest.main()
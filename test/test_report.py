@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import urbs
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), '..',
+                          'mimo-example.xlsx')
+
+
+def available(*modules):
+    for module in modules:
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+# Parquet sidecars need pyarrow or fastparquet
+SIDECARS = ['csv']
+if available('pyarrow', 'fastparquet'):
+    SIDECARS.append('parquet')
+
+
+@unittest.skipUnless(available('xlsxwriter'), 'requires xlsxwriter')
+class StreamingReportTest(unittest.TestCase):
+    """The streaming report has the sheets of the ExcelWriter report."""
+
+    @classmethod
+    def setUpClass(cls):
+        data = urbs.read_excel(INPUT_FILE)
+        cls.prob = urbs.create_model(data, range(0, 7), backend='matrix')
+        cls.prob.solve()
+
+    def setUp(self):
+        self.result_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.result_dir)
+
+    def test_same_sheets(self):
+        report_tuples = [('Mid', 'Elec'), ('South', 'Elec'),
+                         (['North', 'Mid'], 'Elec')]
+        report_sites_name = {('North', 'Mid'): 'North and Mid'}
+        filename = os.path.join(self.result_dir, 'report.xlsx')
+        streamed = os.path.join(self.result_dir, 'streamed.xlsx')
+        urbs.report(self.prob, filename, report_tuples,
+                    dict(report_sites_name))
+        urbs.report(self.prob, streamed, report_tuples,
+                    dict(report_sites_name), streaming=True,
+                    sidecars=SIDECARS)
+
+        # index columns of the sheets with one header row; timeseries
+        # sheets have one index column and two header rows
+        costs, cpro, ctra, csto = urbs.get_constants(self.prob)
+        index_levels = {'Costs': costs.index.nlevels,
+                        'Process caps': cpro.index.nlevels,
+                        'Transmission caps': ctra.index.nlevels,
+                        'Storage caps': csto.index.nlevels,
+                        'Commodity sums': 2}
+
+        with pd.ExcelFile(filename) as expected, \
+                pd.ExcelFile(streamed) as actual:
+            self.assertEqual(actual.sheet_names, expected.sheet_names)
+            for sheet in expected.sheet_names:
+                if sheet in index_levels:
+                    header = [0]
+                    index_col = list(range(index_levels[sheet]))
+                else:
+                    header = [0, 1]
+                    index_col = [0]
+                pd.testing.assert_frame_equal(
+                    actual.parse(sheet, header=header, index_col=index_col),
+                    expected.parse(sheet, header=header,
+                                   index_col=index_col),
+                    obj=sheet)
+
+            # one sidecar per format and timeseries sheet
+            for name in ('Mid.Elec', 'South.Elec', 'North and Mid.Elec'):
+                sheet = expected.parse('{} timeseries'.format(name),
+                                       header=[0, 1], index_col=[0])
+                basename = os.path.join(self.result_dir,
+                                        'streamed-{}'.format(name))
+                csv = pd.read_csv(basename + '.csv', header=[0, 1],
+                                  index_col=[0])
+                self.assertTrue(np.allclose(csv.values, sheet.values,
+                                            equal_nan=True), name)
+                if 'parquet' in SIDECARS:
+                    parquet = pd.read_parquet(basename + '.parquet')
+                    self.assertTrue(np.allclose(parquet.values, sheet.values,
+                                                equal_nan=True), name)
+        self.assertFalse(os.path.exists(os.path.join(
+            self.result_dir, 'report-Mid.Elec.csv')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import urbs
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), '..',
+                          'mimo-example.xlsx')
+
+
+class RollingHorizonTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = urbs.read_excel(INPUT_FILE)
+
+    def plan(self, timesteps):
+        plan = urbs.create_model(urbs.copy_input(self.data), timesteps,
+                                 backend='matrix')
+        plan.solve()
+        return plan
+
+    def test_single_window(self):
+        # one window over the whole horizon is the model of the horizon
+        timesteps = range(0, 97)
+        plan = self.plan(timesteps)
+        result = urbs.run_rolling_horizon(self.data, timesteps, window=96,
+                                          overlap=0, capacities=plan)
+        self.assertEqual(len(result.windows), 1)
+        self.assertAlmostEqual(result.obj_value / plan.obj_value, 1,
+                               places=6)
+        for cost_type, value in plan._result['costs'].items():
+            self.assertAlmostEqual(
+                result._result['costs'][cost_type], value,
+                delta=1e-6 * abs(plan.obj_value))
+
+    def test_multiple_windows(self):
+        # mimo-example has storages and DSM in South
+        timesteps = list(range(0, 97))
+        result = urbs.run_rolling_horizon(self.data, timesteps, window=48,
+                                          overlap=12,
+                                          capacities=self.plan(timesteps))
+        self.assertEqual(len(result.windows), 3)
+
+        # every timestep is committed by exactly one window
+        windows = result.windows
+        self.assertEqual(windows['first'].tolist(),
+                         [1] + (windows['last'][:-1] + 1).tolist())
+        self.assertEqual(windows['last'].iloc[-1], timesteps[-1])
+        for name, t0 in (('tau_pro', 0), ('e_pro_out', 1),
+                         ('e_sto_con', 0), ('dsm_up', 1)):
+            values = result._result[name]
+            self.assertFalse(values.index.duplicated().any(), name)
+            steps = values.index.get_level_values('t').unique()
+            self.assertEqual(sorted(steps), timesteps[t0:], name)
+        self.assertGreater(len(result._result['dsm_down']), 0)
+
+        result_dir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(result_dir, 'rolling.xlsx')
+            urbs.report(result, filename, [('South', 'Elec')])
+            self.assertTrue(os.path.isfile(filename))
+        finally:
+            shutil.rmtree(result_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
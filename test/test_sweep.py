@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyomo.environ
+from pyomo.opt.base import SolverFactory
+
+import urbs
+from runme import scenario_base, scenario_co2_limit, scenario_stock_prices
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), '..',
+                          'mimo-example.xlsx')
+
+
+@unittest.skipUnless(
+    SolverFactory('appsi_highs').available(exception_flag=False),
+    'requires the appsi_highs solver')
+class SweepTest(unittest.TestCase):
+    """Updating a model in place gives the results of a fresh model."""
+
+    def test_same_objectives_as_fresh_models(self):
+        timesteps = range(0, 25)
+        scenarios = [scenario_base, scenario_stock_prices, scenario_co2_limit]
+        result_dir = tempfile.mkdtemp()
+        try:
+            summary = urbs.run_sweep(INPUT_FILE, timesteps, scenarios,
+                                     result_dir, plot_tuples=[],
+                                     report_tuples=[])
+        finally:
+            shutil.rmtree(result_dir)
+        self.assertEqual(summary['error'].tolist(), [''] * len(scenarios))
+        # only the first scenario creates a model
+        self.assertEqual(summary['rebuilt'].tolist(), [True, False, False])
+
+        data = urbs.read_excel(INPUT_FILE)
+        for scenario in scenarios:
+            prob = urbs.create_model(scenario(urbs.copy_input(data)),
+                                     timesteps)
+            SolverFactory('appsi_highs').solve(prob)
+            self.assertAlmostEqual(
+                summary.loc[scenario.__name__, 'objective'] /
+                pyomo.environ.value(prob.obj), 1, places=6,
+                msg=scenario.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
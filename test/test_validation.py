@@ -0,0 +1,75 @@
+import time
+import unittest
+
+import urbs
+from benchmark.synthetic import synthetic_input
+
+
+def baseline_violations(data):
+    """(table, index) of all violations, found by the row by row loops that
+    validate_input replaced (collecting instead of raising)."""
+    found = set()
+    pro_com_index = [(p, c) for p, c, d in
+                     data['process_commodity'].index.tolist()]
+    com_index = [(s, c) for s, c, t in data['commodity'].index.tolist()]
+    for (sit, pro) in data['process'].index:
+        for com in data['commodity'].index.get_level_values('Commodity'):
+            if (pro, com) in pro_com_index and (sit, com) not in com_index:
+                found.add(('process', (sit, pro)))
+
+    for table, bounds in (
+            ('process', [('cap-lo', 'inst-cap', 'cap-up')]),
+            ('transmission', [('cap-lo', 'inst-cap', 'cap-up')]),
+            ('storage', [('cap-lo-p', 'inst-cap-p', 'cap-up-p'),
+                         ('cap-lo-c', 'inst-cap-c', 'cap-up-c')])):
+        df = data[table]
+        for index in df.index:
+            for cap_lo, inst_cap, cap_up in bounds:
+                if not (df.loc[index][cap_lo] <= df.loc[index][cap_up] and
+                        df.loc[index][inst_cap] <= df.loc[index][cap_up]):
+                    found.add((table, index))
+
+    for column in data['supim'].columns:
+        if (data['supim'][column] > 1).sum() > 0:
+            found.add(('supim', column))
+    return found
+
+
+class ValidationTest(unittest.TestCase):
+
+    def test_same_violations_as_baseline(self):
+        data = synthetic_input(sites=3, processes=8, timesteps=24)
+        self.assertEqual(urbs.validate_input(data), [])
+
+        # processes of Site1 use coal, which is not defined there
+        data['commodity'] = data['commodity'].drop(
+            ('Site1', 'Coal', 'Stock'))
+        process = data['process']
+        process.loc[('Site0', 'Gas plant'), 'cap-up'] = -1
+        process.loc[('Site2', 'Wind park'), ['inst-cap', 'cap-up']] = [10, 5]
+        transmission = data['transmission']
+        transmission.loc[transmission.index[0], 'cap-up'] = -1
+        storage = data['storage']
+        storage.loc[('Site1', 'Pump storage', 'Elec'), 'cap-up-c'] = -1
+        data['supim'].loc[5, ('Site2', 'Solar')] = 1.5
+
+        violations = urbs.validate_input(data, raise_errors=False)
+        expected = baseline_violations(data)
+        self.assertEqual(set((v['table'], v['index']) for v in violations),
+                         expected)
+        self.assertEqual(len(expected), 6)
+        with self.assertRaises(ValueError):
+            urbs.validate_input(data)
+
+    def test_large_input(self):
+        # the row by row checks took several seconds for 300 processes per
+        # site; the vectorised ones take milliseconds
+        data = synthetic_input(sites=10, processes=300, storages=10,
+                               timesteps=24)
+        start = time.time()
+        urbs.validate_input(data)
+        self.assertLess(time.time() - start, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,12 +10,20 @@ commodities.
 
 """
 
+from .aggregation import aggregate_timeseries, expand_timeseries
+from .catalogue import read_catalogue, update_catalogue
 from .data import COLORS
 from .model import create_model
-from .input import read_excel, get_input
+from .matrixmodel import solve_input
+from .input import (read_excel, read_input, write_input, get_input,
+                    copy_input)
 from .validation import validate_input
-from .output import get_constants, get_timeseries
+from .output import get_constants, get_timeseries, get_timeseries_many
 from .plot import plot, result_figures, to_color
 from .pyomoio import get_entity, get_entities, list_entities
 from .report import report
+from .rolling import run_rolling_horizon
 from .saveload import load, save
+from .sweep import update_model
+from .runfunctions import (prepare_result_directory, setup_solver,
+                           run_scenario, run_scenarios, run_sweep)
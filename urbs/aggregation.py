@@ -0,0 +1,234 @@
+"""Time series aggregation into representative periods
+
+Clusters the periods (e.g. days or weeks) of the input timeseries 'demand',
+'supim' and 'buy_sell_price' into a few representative periods. The
+aggregated input dict can be passed to create_model like any other: each
+representative period is weighted by the number of original periods it
+stands for, and process ramping is cyclic within each period (cf.
+modelhelper.timestep_weights). Storage content e_sto_con is relative to the
+start of its representative period; the content at the start of each
+original period, e_sto_con_inter, links the periods in their original
+order (cf. def_storage_state_inter_rule in urbs.model).
+
+"""
+import numpy as np
+import pandas as pd
+from .input import copy_input, TIMESERIES_INPUTS
+
+
+def aggregate_timeseries(data, num_periods, period_length=24,
+                         timesteps=None, method='kmeans', seed=0,
+                         max_iter=300):
+    """Aggregate input timeseries into representative periods.
+
+    The modelled timesteps (all but the first of timesteps) are cut into
+    consecutive periods of period_length timesteps. The profiles of all
+    timeseries, each scaled to its maximum absolute value, are clustered
+    into num_periods groups. The representative of a group is its mean
+    profile (method 'kmeans') or the member closest to all others (method
+    'kmedoids', which keeps actual, coherent periods).
+
+    The returned input dict holds the representative periods one after
+    another as timesteps 1 to num_periods * period_length (plus the initial
+    timestep 0), and two additional DataFrames:
+      - 'period': weight (number of original periods), first and last
+        timestep of each representative period
+      - 'period_order': representative period and first original timestep
+        of each original period, used by expand_timeseries
+
+    Args:
+        data: urbs input dict, e.g. from read_excel
+        num_periods: number of representative periods
+        period_length: (optional) timesteps per period, default: 24
+        timesteps: (optional) list of timesteps, default: demand timeseries
+        method: (optional) 'kmeans' (default) or 'kmedoids'
+        seed: (optional) seed of the random initial cluster centres
+        max_iter: (optional) maximum number of clustering iterations
+
+    Returns:
+        aggregated urbs input dict
+
+    Example:
+        >>> data = read_excel('mimo-example.xlsx')
+        >>> data = aggregate_timeseries(data, 12)
+        >>> prob = create_model(data)
+    """
+    if timesteps is None:
+        timesteps = data['demand'].index.tolist()
+    tm = list(timesteps)[1:]
+    if len(tm) % period_length:
+        raise ValueError('The {} modelled timesteps cannot be divided into '
+                         'periods of length {}.'.format(len(tm),
+                                                        period_length))
+    num_original = len(tm) // period_length
+    if not 0 < num_periods <= num_original:
+        raise ValueError('Number of representative periods must be between '
+                         '1 and {}.'.format(num_original))
+
+    # profiles: original period x timestep within period x timeseries
+    keys = [key for key in TIMESERIES_INPUTS if len(data[key].columns) > 0]
+    profiles = np.hstack([data[key].loc[tm].values.astype(float)
+                          for key in keys])
+    profiles = profiles.reshape(num_original, period_length, -1)
+
+    # scale each timeseries to [-1, 1], so that all count alike
+    scale = np.abs(profiles).max(axis=(0, 1))
+    scale[scale == 0] = 1
+    features = (profiles / scale).reshape(num_original, -1)
+
+    rng = np.random.RandomState(seed)
+    if method == 'kmeans':
+        labels = _kmeans(features, num_periods, rng, max_iter)
+    elif method == 'kmedoids':
+        labels, medoids = _kmedoids(features, num_periods, rng, max_iter)
+    else:
+        raise ValueError("Unknown aggregation method '{}'".format(method))
+
+    # number representative periods by first occurrence, dropping empty
+    # clusters
+    clusters = pd.unique(labels)
+    labels = pd.Index(clusters).get_indexer(labels)
+    weights = np.bincount(labels)
+
+    if method == 'kmeans':
+        representatives = np.array([profiles[labels == p].mean(axis=0)
+                                    for p in range(len(clusters))])
+    else:
+        representatives = profiles[[medoids[c] for c in clusters]]
+
+    aggregated = copy_input(data)
+    first = 1 + period_length * np.arange(len(clusters))
+    values = representatives.reshape(len(clusters) * period_length, -1)
+    values = np.vstack([values[:1], values])  # initial timestep
+    index = pd.Index(np.arange(len(values)), name='t')
+    column = 0
+    for key in TIMESERIES_INPUTS:
+        columns = data[key].columns
+        aggregated[key] = pd.DataFrame(
+            values[:, column:column + len(columns)],
+            index=index, columns=columns)
+        column += len(columns)
+
+    aggregated['period'] = pd.DataFrame(
+        {'weight': weights,
+         'first': first,
+         'last': first + period_length - 1},
+        index=pd.Index(np.arange(len(clusters)), name='period'),
+        columns=['weight', 'first', 'last'])
+    aggregated['period_order'] = pd.DataFrame(
+        {'period': labels,
+         'first': tm[::period_length]},
+        index=pd.Index(np.arange(num_original), name='original'),
+        columns=['period', 'first'])
+    return aggregated
+
+
+def expand_timeseries(df, prob):
+    """Expand a result timeseries of an aggregated model to the full year.
+
+    Each original period gets the values of its representative period, so
+    that e.g. the timeseries DataFrames of get_timeseries can be analysed
+    and plotted in the original chronology.
+
+    Args:
+        df: DataFrame or Series, indexed by timestep or with an index level
+            't' (e.g. from get_entity)
+        prob: a urbs model instance or input dict created from
+            aggregate_timeseries
+
+    Returns:
+        the expanded DataFrame or Series, indexed by original timestep
+    """
+    data = prob._data if hasattr(prob, '_data') else prob
+    period = data['period']
+    order = data['period_order']
+    length = int(period['last'].iloc[0] - period['first'].iloc[0] + 1)
+
+    # aggregated timestep of every original timestep
+    offset = np.arange(length)
+    mapping = pd.DataFrame({
+        't': (np.asarray(order['first'])[:, np.newaxis] + offset).ravel(),
+        '_t_agg': (period['first'].values[order['period'].values]
+                   [:, np.newaxis] + offset).ravel()})
+
+    # repeat each row of df for all original timesteps it represents
+    names = list(df.index.names)
+    level = names.index('t') if 't' in names else 0
+    rows = mapping.merge(
+        pd.DataFrame({'_t_agg': df.index.get_level_values(level),
+                      '_row': np.arange(len(df))}),
+        on='_t_agg', sort=False)
+    expanded = df.iloc[rows['_row'].values]
+
+    levels = [df.index.get_level_values(k)[rows['_row'].values]
+              for k in range(len(names))]
+    levels[level] = rows['t'].values
+    names[level] = 't'
+    if len(levels) == 1:
+        expanded.index = pd.Index(levels[0], name='t')
+    else:
+        expanded.index = pd.MultiIndex.from_arrays(levels, names=names)
+    return expanded.sort_index()
+
+
+def _distances(features, centres):
+    """Squared euclidean distances between all rows of two arrays."""
+    return ((features[:, np.newaxis, :] -
+             centres[np.newaxis, :, :]) ** 2).sum(axis=2)
+
+
+def _initial_centres(features, k, rng):
+    """Choose k rows as initial cluster centres (k-means++ seeding)."""
+    chosen = [rng.randint(len(features))]
+    for _ in range(1, k):
+        distance = _distances(features, features[chosen]).min(axis=1)
+        if distance.sum() > 0:
+            chosen.append(rng.choice(len(features),
+                                     p=distance / distance.sum()))
+        else:
+            # fewer distinct profiles than clusters
+            chosen.append(rng.randint(len(features)))
+    return chosen
+
+
+def _kmeans(features, k, rng, max_iter):
+    """Cluster rows of features into k groups by Lloyd's algorithm.
+
+    Returns:
+        array of cluster labels
+    """
+    centres = features[_initial_centres(features, k, rng)]
+    labels = None
+    for _ in range(max_iter):
+        new_labels = _distances(features, centres).argmin(axis=1)
+        if labels is not None and (new_labels == labels).all():
+            break
+        labels = new_labels
+        for c in range(k):
+            if (labels == c).any():
+                centres[c] = features[labels == c].mean(axis=0)
+    return labels
+
+
+def _kmedoids(features, k, rng, max_iter):
+    """Cluster rows of features into k groups around medoid rows.
+
+    Returns:
+        (labels, medoids) tuple of cluster labels and the row number of each
+        cluster's medoid
+    """
+    distance = _distances(features, features)
+    medoids = np.array(_initial_centres(features, k, rng))
+    for _ in range(max_iter):
+        labels = distance[:, medoids].argmin(axis=1)
+        new_medoids = medoids.copy()
+        for c in range(k):
+            members = np.flatnonzero(labels == c)
+            if len(members):
+                within = distance[np.ix_(members, members)].sum(axis=1)
+                new_medoids[c] = members[within.argmin()]
+        if (new_medoids == medoids).all():
+            break
+        medoids = new_medoids
+    labels = distance[:, medoids].argmin(axis=1)
+    return labels, medoids
@@ -0,0 +1,147 @@
+"""Catalogue of the scenario result files in a result directory
+
+The catalogue file (catalogue.h5) summarises every HDF5 result file from
+urbs.save in a directory: its metadata, total and per-type costs and the
+energy created per commodity and process. Comparing scenarios then only
+needs the catalogue, which is updated incrementally for new or changed
+result files.
+
+"""
+import glob
+import os
+import pandas as pd
+import warnings
+from .saveload import _select
+
+CATALOGUE_FILE = 'catalogue.h5'
+
+# columns of the scenarios table besides the costs by type
+SCENARIO_COLUMNS = ['file', 'mtime', 'created', 'solver_status',
+                    'solve_time', 'objective']
+
+# commodity types whose created energy is catalogued
+CATALOGUE_COMMODITY_TYPES = ['Demand', 'Env']
+
+
+def update_catalogue(result_dir, filename=CATALOGUE_FILE):
+    """Add new or changed result files of a directory to its catalogue.
+
+    Args:
+        result_dir: directory with HDF5 result files (*.h5)
+        filename: (optional) catalogue filename within result_dir
+
+    Returns:
+        (scenarios, created) tuple of
+          - scenarios: DataFrame indexed by scenario (result filename
+            without extension) with columns file, mtime, created,
+            solver_status, solve_time, objective and one per cost type
+          - created: Series of created energy (MWh) in the modelled
+            timesteps, indexed by scenario, commodity and process; stock
+            use is listed as process 'Stock'
+    """
+    path = os.path.join(result_dir, filename)
+    scenarios, created = read_catalogue(result_dir, filename)
+
+    files = sorted(f for f in glob.glob(os.path.join(result_dir, '*.h5'))
+                   if os.path.basename(f) != filename)
+    rows, energies = [], []
+    for result_file in files:
+        scenario = os.path.splitext(os.path.basename(result_file))[0]
+        mtime = os.path.getmtime(result_file)
+        if (scenario in scenarios.index and
+                scenarios.loc[scenario, 'mtime'] == mtime):
+            rows.append(scenarios.loc[scenario])
+            if scenario in created.index.get_level_values('scenario'):
+                energies.append(created.loc[[scenario]])
+            continue
+        row, energy = _catalogue_entry(result_file, scenario, mtime)
+        rows.append(row)
+        energies.append(energy)
+
+    scenarios = pd.DataFrame(rows).infer_objects()
+    scenarios.index.name = 'scenario'
+    if energies:
+        created = pd.concat(energies)
+    created.name = 'created'
+
+    with warnings.catch_warnings(), pd.HDFStore(path, mode='w') as store:
+        # the few text columns (file, status) are pickled
+        warnings.simplefilter('ignore', pd.io.pytables.PerformanceWarning)
+        store.put('scenarios', scenarios)
+        store.put('created', created)
+    return scenarios, created
+
+
+def read_catalogue(result_dir, filename=CATALOGUE_FILE):
+    """Read the catalogue of a result directory as it is.
+
+    Args:
+        result_dir: directory with HDF5 result files (*.h5)
+        filename: (optional) catalogue filename within result_dir
+
+    Returns:
+        (scenarios, created) tuple as returned by update_catalogue; both
+        are empty if there is no catalogue yet
+    """
+    path = os.path.join(result_dir, filename)
+    if not os.path.exists(path):
+        empty = pd.MultiIndex.from_arrays([[], [], []], names=[
+            'scenario', 'com', 'pro'])
+        return (pd.DataFrame(columns=['mtime']),
+                pd.Series(index=empty, name='created', dtype=float))
+    with pd.HDFStore(path, mode='r') as store:
+        return store['scenarios'], store['created']
+
+
+def _catalogue_entry(result_file, scenario, mtime):
+    """Summarise a single result file for the catalogue.
+
+    Args:
+        result_file: HDF5 result file from urbs.save
+        scenario: scenario name
+        mtime: modification time of result_file
+
+    Returns:
+        (row, created) tuple of a Series for the scenarios table and a
+        Series of created energy by (scenario, com, pro)
+    """
+    with pd.HDFStore(result_file, mode='r') as store:
+        costs = store['result/costs']
+        metadata = store['metadata'] if 'metadata' in store else pd.Series()
+
+        commodity = store['data/commodity']
+        coms = (commodity.index[commodity.index.get_level_values('Type')
+                                .isin(CATALOGUE_COMMODITY_TYPES)]
+                .get_level_values('Commodity').unique().tolist())
+
+        # only the rows of the catalogued commodities are read
+        parts = []
+        if 'result/e_pro_out' in store:
+            e_pro_out = _select(store, 'result/e_pro_out', {'com': coms})
+            parts.append(e_pro_out.groupby(level=['com', 'pro']).sum())
+        if 'result/e_co_stock' in store:
+            e_co_stock = _select(store, 'result/e_co_stock', {'com': coms})
+            stock = e_co_stock.groupby(level='com').sum()
+            stock.index = pd.MultiIndex.from_arrays(
+                [stock.index, ['Stock'] * len(stock)], names=['com', 'pro'])
+            parts.append(stock)
+
+    row = pd.Series({
+        'file': os.path.basename(result_file),
+        'mtime': mtime,
+        'created': metadata.get('created'),
+        'solver_status': metadata.get('solver_status'),
+        'solve_time': metadata.get('solve_time', float('nan')),
+        'objective': costs.sum()}, name=scenario)
+    row = pd.concat([row, costs.astype(object)])
+    row.name = scenario
+
+    if parts:
+        created = pd.concat(parts)
+        created = created[created.index.get_level_values('com').isin(coms)]
+    else:
+        created = pd.Series(
+            index=pd.MultiIndex.from_arrays([[], []], names=['com', 'pro']),
+            dtype=float)
+    created = pd.concat([created], keys=[scenario], names=['scenario'])
+    return row, created
@@ -1,10 +1,44 @@
+import hashlib
+import os
 import pandas as pd
+import pickle
+import sys
+from collections import OrderedDict
 from xlrd import XLRDError
 import pyomo.core as pyomo
 from .modelhelper import *
-
-
-def read_excel(filename):
+from .profiling import lap
+
+
+# bump whenever _parse_excel changes the structure of the returned data, so
+# that stale cache files are not picked up
+INPUT_CACHE_VERSION = 1
+
+# input dict key -> (spreadsheet name, index columns)
+INPUT_SHEETS = OrderedDict([
+    ('global_prop', ('Global', ['Property'])),
+    ('site', ('Site', ['Name'])),
+    ('commodity', ('Commodity', ['Site', 'Commodity', 'Type'])),
+    ('process', ('Process', ['Site', 'Process'])),
+    ('process_commodity', ('Process-Commodity',
+                           ['Process', 'Commodity', 'Direction'])),
+    ('transmission', ('Transmission',
+                      ['Site In', 'Site Out', 'Transmission', 'Commodity'])),
+    ('storage', ('Storage', ['Site', 'Storage', 'Commodity'])),
+    ('demand', ('Demand', ['t'])),
+    ('supim', ('SupIm', ['t'])),
+    ('buy_sell_price', ('Buy-Sell-Price', ['t'])),
+    ('dsm', ('DSM', ['Site', 'Commodity'])),
+])
+
+# inputs whose columns are 'Site.Commodity' labels
+TIMESERIES_INPUTS = ['demand', 'supim', 'buy_sell_price']
+
+# parsed inputs of this process, keyed by content hash
+_input_cache = {}
+
+
+def read_excel(filename, cache=False, cache_dir=None):
     """Read Excel input file and prepare URBS input dict.
 
     Reads an Excel spreadsheet that adheres to the structure shown in
@@ -14,10 +48,22 @@ def read_excel(filename):
     2. The attribute 'annuity-factor' is derived here from the columns 'wacc'
     and 'depreciation' for 'Process', 'Transmission' and 'Storage'.
 
+    With cache=True, the parsed dict is pickled to cache_dir under the
+    SHA-1 hash of the spreadsheet's content and read from there on later
+    calls, which skips parsing the spreadsheet as long as it is unchanged.
+    The cache key includes the pandas and Python versions, as pickles may
+    not load in other versions; a cache file that cannot be read is
+    discarded and the spreadsheet parsed anew. Each call returns its own
+    deep copy, so scenario functions may modify the returned DataFrames in
+    place.
+
     Args:
         filename: filename to an Excel spreadsheet with the required sheets
             'Commodity', 'Process', 'Transmission', 'Storage', 'Demand' and
             'SupIm'.
+        cache: (optional) if True, use the parsed input cache
+        cache_dir: (optional) cache directory; defaults to the subdirectory
+            '.urbs-cache' next to filename
 
     Returns:
         a dict of 6 DataFrames
@@ -27,64 +73,230 @@ def read_excel(filename):
         >>> data['global_prop'].loc['CO2 limit', 'value']
         150000000
     """
+    if not cache:
+        return _parse_excel(filename)
+
+    with open(filename, 'rb') as f:
+        key = '{}-{}-pd{}-py{}.{}'.format(hashlib.sha1(f.read()).hexdigest(),
+                                          INPUT_CACHE_VERSION, pd.__version__,
+                                          *sys.version_info[:2])
+
+    if key not in _input_cache:
+        if cache_dir is None:
+            cache_dir = os.path.join(
+                os.path.dirname(os.path.abspath(filename)), '.urbs-cache')
+        cache_file = os.path.join(cache_dir, '{}-{}.pkl'.format(
+            os.path.splitext(os.path.basename(filename))[0], key))
+
+        data = _read_input_cache(cache_file)
+        if data is None:
+            data = _parse_excel(filename)
+            _write_input_cache(data, cache_file)
+        _input_cache[key] = data
+
+    return copy_input(_input_cache[key])
+
+
+def copy_input(data):
+    """Return a deep copy of an urbs input dict.
+
+    Args:
+        data: urbs input dict, e.g. from read_excel
+
+    Returns:
+        a dict of copies of the input DataFrames
+    """
+    return {key: df.copy(deep=True) for key, df in data.items()}
+
+
+def _read_input_cache(cache_file):
+    """Unpickle parsed input data from cache_file.
+
+    A cache file that cannot be unpickled (e.g. truncated, or written by an
+    incompatible library version) is removed.
+
+    Args:
+        cache_file: cache filename
+
+    Returns:
+        urbs input dict, or None if cache_file does not exist or is invalid
+    """
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            data = pickle.load(f)
+        if not isinstance(data, dict):
+            raise TypeError('not an urbs input dict')
+        return data
+    except Exception:
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+        return None
+
+
+def _write_input_cache(data, cache_file):
+    """Pickle parsed input data to cache_file.
+
+    The data is first written to a temporary file which is then renamed, so
+    that concurrent scenario workers never read a partially written cache.
+    If the cache file cannot be written, the cache is silently skipped.
+
+    Args:
+        data: urbs input dict
+        cache_file: cache filename
+
+    Returns:
+        Nothing
+    """
+    tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_file, cache_file)
+    except OSError:
+        # another process won the race or the directory is read-only
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def _parse_excel(filename):
+    """Parse the sheets of an Excel input file into an urbs input dict.
+
+    Args:
+        filename: filename to an Excel spreadsheet, see read_excel
+
+    Returns:
+        a dict of 6 DataFrames
+    """
     with pd.ExcelFile(filename) as xls:
-        site = xls.parse('Site').set_index(['Name'])
-        commodity = (
-            xls.parse('Commodity').set_index(['Site', 'Commodity', 'Type']))
-        process = xls.parse('Process').set_index(['Site', 'Process'])
-        process_commodity = (
-            xls.parse('Process-Commodity')
-               .set_index(['Process', 'Commodity', 'Direction']))
-        transmission = (
-            xls.parse('Transmission')
-               .set_index(['Site In', 'Site Out',
-                           'Transmission', 'Commodity']))
-        storage = (
-            xls.parse('Storage').set_index(['Site', 'Storage', 'Commodity']))
-        demand = xls.parse('Demand').set_index(['t'])
-        supim = xls.parse('SupIm').set_index(['t'])
-        buy_sell_price = xls.parse('Buy-Sell-Price').set_index(['t'])
-        dsm = xls.parse('DSM').set_index(['Site', 'Commodity'])
-        global_prop = xls.parse('Global').set_index(['Property'])
+        data = {key: xls.parse(sheet).set_index(index)
+                for key, (sheet, index) in INPUT_SHEETS.items()}
+    return _prepare_input(data)
+
+
+def _prepare_input(data):
+    """Split timeseries columns and sort indexes of a raw urbs input dict.
 
+    Args:
+        data: dict of input DataFrames with their index set, but timeseries
+            columns still of the form 'Site.Commodity'
+
+    Returns:
+        the prepared input dict
+    """
     # prepare input data
     # split columns by dots '.', so that 'DE.Elec' becomes the two-level
     # column index ('DE', 'Elec')
-    demand.columns = split_columns(demand.columns, '.')
-    supim.columns = split_columns(supim.columns, '.')
-    buy_sell_price.columns = split_columns(buy_sell_price.columns, '.')
-
-    data = {
-        'global_prop': global_prop,
-        'site': site,
-        'commodity': commodity,
-        'process': process,
-        'process_commodity': process_commodity,
-        'transmission': transmission,
-        'storage': storage,
-        'demand': demand,
-        'supim': supim,
-        'buy_sell_price': buy_sell_price,
-        'dsm': dsm
-        }
+    for key in TIMESERIES_INPUTS:
+        data[key].columns = split_columns(data[key].columns, '.')
 
     # sort nested indexes to make direct assignments work
     for key in data:
-        if isinstance(data[key].index, pd.core.index.MultiIndex):
+        if isinstance(data[key].index, pd.MultiIndex):
             data[key].sort_index(inplace=True)
     return data
 
 
+def read_input(path):
+    """Read urbs input dict from a spreadsheet or a directory of tables.
+
+    A directory must contain one Parquet (<key>.parquet) or CSV (<key>.csv)
+    file per input dict key, e.g. 'process.parquet' or 'demand.csv', as
+    written by write_input. Index levels are stored as ordinary columns and
+    timeseries columns as 'Site.Commodity' strings, just like in the
+    spreadsheet. If both formats are present, Parquet is preferred.
+
+    Args:
+        path: input directory or filename to an Excel spreadsheet, which is
+            passed on to read_excel
+
+    Returns:
+        a dict of input DataFrames, identical to read_excel
+
+    Example:
+        >>> write_input('mimo-example.xlsx', 'mimo-example')
+        >>> data = read_input('mimo-example')
+    """
+    if not os.path.isdir(path):
+        return read_excel(path)
+
+    data = {}
+    for key, (sheet, index) in INPUT_SHEETS.items():
+        filename = os.path.join(path, key)
+        if os.path.exists(filename + '.parquet'):
+            df = pd.read_parquet(filename + '.parquet')
+        elif os.path.exists(filename + '.csv'):
+            df = pd.read_csv(filename + '.csv', float_precision='round_trip')
+        else:
+            raise IOError("Input directory {} has no table '{}' (.parquet "
+                          "or .csv)".format(path, key))
+        data[key] = df.set_index(index)
+    return _prepare_input(data)
+
+
+def write_input(data, path, fmt='parquet'):
+    """Write urbs input dict to a directory of Parquet or CSV files.
+
+    Writes one file per input dict key in the layout read_input expects.
+    Use this to convert an existing spreadsheet once, e.g.
+    write_input('mimo-example.xlsx', 'mimo-example').
+
+    Args:
+        data: urbs input dict or filename to an Excel spreadsheet
+        path: output directory, created if not existent
+        fmt: (optional) 'parquet' (default, needs pyarrow or fastparquet)
+            or 'csv'
+
+    Returns:
+        Nothing
+    """
+    if fmt not in ('parquet', 'csv'):
+        raise ValueError("Unknown input format '{}'; use 'parquet' or "
+                         "'csv'".format(fmt))
+    if not isinstance(data, dict):
+        data = read_excel(data)
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    for key, (sheet, index) in INPUT_SHEETS.items():
+        df = data[key].copy()
+        if key in TIMESERIES_INPUTS:
+            # join MultiIndex columns ('DE', 'Elec') back to 'DE.Elec'
+            df.columns = ['.'.join(col) if isinstance(col, tuple) else col
+                          for col in df.columns]
+        if df.index.names == index:
+            df = df.reset_index()
+        elif df.empty:
+            # e.g. an emptied DataFrame from a scenario function
+            df = pd.DataFrame(columns=index)
+        else:
+            raise ValueError("Input table '{}' (sheet {}) must be indexed by "
+                             "{}, not {}".format(key, sheet, index,
+                                                 list(df.index.names)))
+
+        filename = os.path.join(path, '{}.{}'.format(key, fmt))
+        if fmt == 'parquet':
+            df.to_parquet(filename)
+        else:
+            df.to_csv(filename, index=False)
+
+
 # preparing the pyomo model
-def pyomo_model_prep(data, timesteps):
+def pyomo_model_prep(data, timesteps, profile=None):
     m = pyomo.ConcreteModel()
 
     # Preparations
     # ============
-    # Data import. Syntax to access a value within equation definitions looks
-    # like this:
+    # Data import. The DataFrames are used to build index sets; constraint
+    # rules access values through the dicts derived from them, as a
+    # DataFrame lookup is much slower. The syntax looks like this:
     #
-    #     m.storage.loc[site, storage, commodity][attribute]
+    #     m.storage_dict[attribute][(site, storage, commodity)]
     #
     m.global_prop = data['global_prop'].drop('description', axis=1)
     m.site = data['site']
@@ -98,19 +310,36 @@ def pyomo_model_prep(data, timesteps):
     m.buy_sell_price = data['buy_sell_price']
     m.timesteps = timesteps
     m.dsm = data['dsm']
+    lap(profile, 'input frames')
 
     # Converting Data frames to dict
+    m.site_dict = m.site.to_dict()
     m.commodity_dict = m.commodity.to_dict()  # Changed
     m.demand_dict = m.demand.to_dict()  # Changed
     m.supim_dict = m.supim.to_dict()  # Changed
     m.dsm_dict = m.dsm.to_dict()  # Changed
     m.buy_sell_price_dict = m.buy_sell_price.to_dict()
+    lap(profile, 'input dicts')
+
+    # representative period of each modelled timestep (None without
+    # aggregation) and DSM delay and recovery windows of each modelled
+    # timestep, which do not cross period boundaries
+    m.tm_period = timestep_periods(data, timesteps)
+    m.dsm_windows = DsmWindows(list(timesteps)[1:], m.dsm_dict, m.tm_period)
+    lap(profile, 'dsm windows')
 
     # process input/output ratios
     m.r_in = m.process_commodity.xs('In', level='Direction')['ratio']
     m.r_out = m.process_commodity.xs('Out', level='Direction')['ratio']
     m.r_in_dict = m.r_in.to_dict()
     m.r_out_dict = m.r_out.to_dict()
+    lap(profile, 'process ratios')
+
+    # (site, commodity) -> processes, transmissions and storages; used by
+    # commodity_balance to avoid rescanning all tuples for every timestep
+    m.com_incidence = commodity_incidence(
+        m.process, m.r_in, m.r_out, m.transmission, m.storage)
+    lap(profile, 'commodity incidence')
 
     # process areas
     m.proc_area = m.process['area-per-cap']
@@ -133,6 +362,9 @@ def pyomo_model_prep(data, timesteps):
     m.r_out_min_fraction = m.process_commodity.xs('Out', level='Direction')
     m.r_out_min_fraction = m.r_out_min_fraction['ratio-min']
     m.r_out_min_fraction = m.r_out_min_fraction[m.r_out_min_fraction > 0]
+    m.r_in_min_fraction_dict = m.r_in_min_fraction.to_dict()
+    m.r_out_min_fraction_dict = m.r_out_min_fraction.to_dict()
+    lap(profile, 'areas and partial ratios')
 
     # derive annuity factor from WACC and depreciation duration
     m.process['annuity-factor'] = annuity_factor(
@@ -144,12 +376,14 @@ def pyomo_model_prep(data, timesteps):
     m.storage['annuity-factor'] = annuity_factor(
         m.storage['depreciation'],
         m.storage['wacc'])
+    lap(profile, 'annuity factors')
 
     # Converting Data frames to dictionaries
     #
     m.process_dict = m.process.to_dict()  # Changed
     m.transmission_dict = m.transmission.to_dict()  # Changed
     m.storage_dict = m.storage.to_dict()  # Changed
+    lap(profile, 'cost dicts')
     return m
 
 
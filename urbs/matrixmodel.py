@@ -0,0 +1,1379 @@
+"""Sparse matrix backend for urbs models.
+
+Instead of creating one Pyomo expression per constraint index, this backend
+assembles the urbs linear program block by block (one block per constraint
+family) as sparse coefficient triplets directly from the input DataFrames.
+Each block loops over the (site, ...) tuples only; the time dimension is
+handled by NumPy arrays. The resulting problem is identical to the one built
+by create_model with the default Pyomo backend and can be written to a free
+MPS file or solved directly.
+
+"""
+import itertools
+import math
+import numpy as np
+import os
+import pandas as pd
+import time
+from collections import OrderedDict
+from datetime import datetime
+from .modelhelper import (annuity_factor, commodity_incidence,
+                          commodity_subset, sell_buy_pairs, sell_buy_tuples,
+                          timestep_periods, timestep_weights)
+from .pyomoio import get_entity, list_entities
+
+COST_TYPES = ['Invest', 'Fixed', 'Variable', 'Fuel', 'Revenue', 'Purchase',
+              'Environmental']
+
+
+class _Block(object):
+    """Index bookkeeping for a variable or constraint family.
+
+    A block is either indexed by a list of tuples only, or by the cartesian
+    product of a time set and a list of tuples. In the latter case, the
+    element for timestep position p (position within the model timesteps)
+    and tuple number j has the local number (p - t0) * n + j, where n is
+    the number of tuples and t0 the position of the first timestep of the
+    block's time set.
+    """
+    def __init__(self, name, tuples, labels, time=None, t0=0):
+        self.name = name
+        self.tuples = list(tuples)
+        self.labels = list(labels)
+        self.time = time
+        self.t0 = t0
+        self.n = len(self.tuples)
+        self.pos = dict((tup, j) for j, tup in enumerate(self.tuples))
+        if time is None:
+            self.size = self.n
+        else:
+            self.size = self.n * len(time)
+
+    def local(self, j, p=None):
+        """Local element number(s) of tuple j at timestep position(s) p."""
+        if p is None:
+            return j
+        return (np.asarray(p) - self.t0) * self.n + j
+
+    def index(self):
+        """Return a pandas (Multi)Index of all elements of the block."""
+        if self.labels == ['None']:
+            return pd.Index([None], name='None')
+        if not self.tuples:
+            return pd.MultiIndex.from_arrays([[]] * len(self.labels),
+                                             names=self.labels)
+        if len(self.labels) - (self.time is not None) == 1:
+            tuple_index = pd.Index([tup[0] for tup in self.tuples])
+        else:
+            tuple_index = pd.MultiIndex.from_tuples(self.tuples)
+        if self.time is None:
+            tuple_index.names = self.labels
+            return tuple_index
+        if isinstance(tuple_index, pd.MultiIndex):
+            levels = list(tuple_index.levels)
+            codes = [np.asarray(c) for c in tuple_index.codes]
+        else:
+            levels, codes = [tuple_index.unique()], [None]
+            codes[0] = levels[0].get_indexer(tuple_index)
+        nt = len(self.time)
+        return pd.MultiIndex(
+            levels=[pd.Index(self.time)] + levels,
+            codes=([np.repeat(np.arange(nt), self.n)] +
+                   [np.tile(c, nt) for c in codes]),
+            names=self.labels)
+
+
+class _VarBlock(_Block):
+    """Variable family occupying the columns offset...offset+size-1.
+
+    The bounds lb and ub are scalars or, once elements have been fixed by
+    MatrixModel.fix, arrays of one bound per element.
+    """
+    def __init__(self, name, tuples, labels, offset, time=None, t0=0,
+                 lb=0.0, ub=np.inf):
+        super(_VarBlock, self).__init__(name, tuples, labels, time, t0)
+        self.offset = offset
+        self.lb = lb
+        self.ub = ub
+
+    def cols(self, j, p=None):
+        """Column number(s) of tuple j at timestep position(s) p."""
+        return self.offset + self.local(j, p)
+
+
+class _ConBlock(_Block):
+    """Constraint family: coefficient triplets and row bounds."""
+    def __init__(self, name, tuples, labels, time=None, t0=0,
+                 lower=-np.inf, upper=np.inf):
+        super(_ConBlock, self).__init__(name, tuples, labels, time, t0)
+        self.lower = np.full(self.size, lower, dtype=float)
+        self.upper = np.full(self.size, upper, dtype=float)
+        self.active = np.ones(self.size, dtype=bool)
+        self._rows = []
+        self._cols = []
+        self._vals = []
+
+    def rows(self, j, p=None):
+        return self.local(j, p)
+
+    def add(self, rows, cols, vals):
+        """Add coefficients vals for (rows, cols); all are broadcast."""
+        rows, cols, vals = np.broadcast_arrays(
+            np.asarray(rows, dtype=np.int64),
+            np.asarray(cols, dtype=np.int64),
+            np.asarray(vals, dtype=float))
+        self._rows.append(rows.ravel())
+        self._cols.append(cols.ravel())
+        self._vals.append(vals.ravel())
+
+    def triplets(self):
+        """Return (rows, cols, vals) arrays of all coefficients."""
+        if not self._rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        return (np.concatenate(self._rows), np.concatenate(self._cols),
+                np.concatenate(self._vals))
+
+    def kept(self):
+        """Boolean mask of rows that are part of the problem.
+
+        Rows are dropped if their rule skipped them or if they are unbounded
+        in both directions (e.g. an infinite commodity maxperstep).
+        """
+        return self.active & ~(np.isneginf(self.lower) &
+                               np.isposinf(self.upper))
+
+
+class MatrixModel(object):
+    """urbs linear program in sparse matrix form.
+
+    Created by create_matrix_model. After solve(), the attributes _data and
+    _result mimic a solved and cached urbs model instance, so that
+    get_entity, report, result_figures and save accept it unchanged.
+
+    Variables that the Pyomo model indexes over a superset of the elements
+    that are part of the problem (e.g. e_pro_in over all commodities) are
+    listed in result_index with a block of that superset; the result cache
+    reports them over it, with NaN for elements that are not part of the
+    problem, like unused Pyomo variables.
+    """
+    def __init__(self, data, timesteps, dt=1, dual=False):
+        self.name = 'urbs'
+        self.created = datetime.now().strftime('%Y%m%dT%H%M')
+        self._data = data
+        self.timesteps = list(timesteps)
+        self.dt = dt
+        self.weight = float(8760) / ((len(self.timesteps) - 1) * dt)
+        self.dual = dual
+        self.variables = OrderedDict()
+        self.constraints = OrderedDict()
+        self.sets = OrderedDict()
+        self.result_index = OrderedDict()
+        self.num_cols = 0
+
+    def add_var(self, name, tuples, labels, time=None, lb=0.0, ub=np.inf):
+        """Add a variable family, optionally indexed over time.
+
+        Args:
+            name: variable name, e.g. 'e_pro_in'
+            tuples: list of index tuples (without timestep)
+            labels: index names, including 't' if indexed over time
+            time: None, 't' (all timesteps) or 'tm' (modelled timesteps)
+            lb, ub: lower and upper bound for all elements
+
+        Returns:
+            the new variable block
+        """
+        timeset, t0 = self._time(time)
+        block = _VarBlock(name, tuples, labels, self.num_cols, timeset, t0,
+                          lb, ub)
+        self.num_cols += block.size
+        self.variables[name] = block
+        return block
+
+    def add_con(self, name, tuples, labels, time=None,
+                lower=-np.inf, upper=np.inf):
+        """Add a constraint family, optionally indexed over time."""
+        timeset, t0 = self._time(time)
+        block = _ConBlock(name, tuples, labels, timeset, t0, lower, upper)
+        self.constraints[name] = block
+        return block
+
+    def fix(self, name, elements, values):
+        """Fix elements of a variable family to given values.
+
+        Args:
+            name: variable name, e.g. 'cap_pro'
+            elements: local element number(s) within the variable family
+            values: value(s) to fix the elements to
+
+        Returns:
+            Nothing
+        """
+        var = self.variables[name]
+        var.lb = np.array(np.broadcast_to(var.lb, var.size), dtype=float)
+        var.ub = np.array(np.broadcast_to(var.ub, var.size), dtype=float)
+        var.lb[elements] = values
+        var.ub[elements] = values
+
+    def _time(self, time):
+        if time is None:
+            return None, 0
+        elif time == 't':
+            return self.timesteps, 0
+        elif time == 'tm':
+            return self.timesteps[1:], 1
+        else:
+            raise ValueError("Unknown time set '{}'".format(time))
+
+    def row_blocks(self):
+        """Return list of (block, kept_mask, first_row) for all constraints.
+
+        first_row is the number of the block's first kept row within the
+        whole problem; rows are numbered block by block.
+        """
+        row_blocks = []
+        num_rows = 0
+        for block in self.constraints.values():
+            kept = block.kept()
+            row_blocks.append((block, kept, num_rows))
+            num_rows += int(kept.sum())
+        return row_blocks
+
+    def matrix(self):
+        """Assemble the problem in sparse matrix form.
+
+        Returns:
+            (A, row_lo, row_up, c, col_lo, col_up, row_blocks) with the
+            constraint matrix A as scipy.sparse.csr_matrix and row_blocks a
+            list of (block, kept_mask, first_row) tuples.
+        """
+        import scipy.sparse as sp
+
+        rows, cols, vals, row_lo, row_up = [], [], [], [], []
+        row_blocks = self.row_blocks()
+        for block, kept, first_row in row_blocks:
+            new_row = np.cumsum(kept) - 1 + first_row
+            r, c, v = block.triplets()
+            mask = kept[r]
+            rows.append(new_row[r[mask]])
+            cols.append(c[mask])
+            vals.append(v[mask])
+            row_lo.append(block.lower[kept])
+            row_up.append(block.upper[kept])
+        num_rows = sum(int(kept.sum()) for _, kept, _ in row_blocks)
+
+        A = sp.coo_matrix(
+            (np.concatenate(vals),
+             (np.concatenate(rows), np.concatenate(cols))),
+            shape=(num_rows, self.num_cols)).tocsr()
+        A.sum_duplicates()
+
+        col_lo = np.empty(self.num_cols)
+        col_up = np.empty(self.num_cols)
+        for var in self.variables.values():
+            col_lo[var.offset:var.offset + var.size] = var.lb
+            col_up[var.offset:var.offset + var.size] = var.ub
+
+        return (A, np.concatenate(row_lo), np.concatenate(row_up),
+                self.objective, col_lo, col_up, row_blocks)
+
+    def write_mps(self, filename):
+        """Write the problem to a free-format MPS file.
+
+        Rows and columns are named by their number (c1, c2, ... and x1, x2,
+        ...), as urbs names contain spaces that free MPS does not allow.
+
+        Args:
+            filename: MPS file to be written
+
+        Returns:
+            Nothing
+        """
+        import scipy.sparse as sp
+
+        A, row_lo, row_up, c, col_lo, col_up, _ = self.matrix()
+        rows = np.arange(1, A.shape[0] + 1)
+        cols = np.arange(1, A.shape[1] + 1)
+        eq = row_lo == row_up
+        le = ~eq & np.isneginf(row_lo)
+        ge = ~eq & ~le
+        rhs = np.where(le, row_up, row_lo)
+        ranged = ge & np.isfinite(row_up)
+        free = np.isneginf(col_lo) & np.isposinf(col_up)
+
+        with open(filename, 'w') as f:
+            f.write('NAME {}\nROWS\n N obj\n'.format(self.name))
+            sense = np.where(eq, 'E', np.where(le, 'L', 'G'))
+            _write_lines(f, ' %s c%d\n', sense, rows)
+
+            # objective (as row 0) and constraint coefficients, grouped by
+            # column as MPS requires
+            f.write('COLUMNS\n')
+            C = sp.vstack([sp.csr_matrix(c), A]).tocsc()
+            C.eliminate_zeros()
+            row_names = np.concatenate([['obj'], np.char.mod('c%d', rows)])
+            _write_lines(f, ' x%d obj 0\n', cols[np.diff(C.indptr) == 0])
+            _write_lines(f, ' x%d %s %r\n',
+                         np.repeat(cols, np.diff(C.indptr)),
+                         row_names[C.indices], C.data)
+
+            f.write('RHS\n')
+            _write_lines(f, ' rhs c%d %r\n', rows[rhs != 0], rhs[rhs != 0])
+            f.write('RANGES\n')
+            _write_lines(f, ' rng c%d %r\n', rows[ranged],
+                         (row_up - row_lo)[ranged])
+
+            f.write('BOUNDS\n')
+            _write_lines(f, ' FR bnd x%d\n', cols[free])
+            mi = np.isneginf(col_lo) & ~free
+            _write_lines(f, ' MI bnd x%d\n', cols[mi])
+            lo = np.isfinite(col_lo) & (col_lo != 0)
+            _write_lines(f, ' LO bnd x%d %r\n', cols[lo], col_lo[lo])
+            up = np.isfinite(col_up)
+            _write_lines(f, ' UP bnd x%d %r\n', cols[up], col_up[up])
+            f.write('ENDATA\n')
+
+    def write_lp(self, filename):
+        """Write the problem to a CPLEX LP file.
+
+        The file is streamed one constraint family at a time, so neither the
+        whole constraint matrix nor the whole file content are built in
+        memory. Rows and columns are named by their number (c1, c2, ... and
+        x1, x2, ...); ranged rows are written as two rows c<k>_l and c<k>_u.
+        All columns are listed in the objective in their order, so that
+        solvers number them like this model does.
+
+        Args:
+            filename: LP file to be written
+
+        Returns:
+            an array that maps each row of the LP file to its row number in
+            the model (as in matrix())
+        """
+        lp_rows = []
+        with open(filename, 'w') as f:
+            f.write('\\* {} *\\\nminimize\nobj:\n'.format(self.name))
+            _write_lines(f, '%+.17g x%d\n', self.objective,
+                         np.arange(1, self.num_cols + 1))
+            f.write('\nsubject to\n')
+            for block, kept, first_row in self.row_blocks():
+                lp_rows.append(_write_lp_block(f, block, kept, first_row,
+                                               self.num_cols))
+
+            f.write('\nbounds\n')
+            for var in self.variables.values():
+                cols = np.arange(var.offset + 1, var.offset + var.size + 1)
+                lb = np.broadcast_to(var.lb, var.size)
+                ub = np.broadcast_to(var.ub, var.size)
+                free = np.isneginf(lb) & np.isposinf(ub)
+                bounded = ~free & ((lb != 0) | np.isfinite(ub))
+                _write_lines(f, ' x%d free\n', cols[free])
+                _write_lines(f, ' %.17g <= x%d <= %.17g\n',
+                             lb[bounded], cols[bounded], ub[bounded])
+            f.write('end\n')
+        return np.concatenate(lp_rows)
+
+    def solve(self, solver='highs', logfile=None):
+        """Solve the problem and fill the result cache.
+
+        Args:
+            solver: 'highs' (default) to solve in memory with the HiGHS
+                solver shipped with SciPy, or 'glpk' or 'cbc' to write an
+                LP file and solve it with glpsol or cbc
+            logfile: (optional) solver log filename for 'glpk' and 'cbc'
+
+        On success, the result cache _result is filled with all variable
+        values (and duals, if the model was created with dual=True) and the
+        objective value is stored in obj_value; solver_status and
+        solve_time (seconds) are set like by run_scenario.
+
+        Returns:
+            the (x, duals) arrays of the solution
+        """
+        start = time.time()
+        if solver == 'highs':
+            x, duals = self._solve_highs()
+        elif solver in ('glpk', 'cbc'):
+            x, duals = self._solve_file(solver, logfile)
+        else:
+            raise ValueError("Unknown solver '{}'".format(solver))
+        self.solve_time = time.time() - start
+        self.solver_status = 'optimal'
+
+        self.obj_value = float(np.dot(self.objective, x))
+        self._result = self.result_cache(
+            x, duals if self.dual else None, self.row_blocks())
+        return x, duals
+
+    def _solve_highs(self):
+        import scipy.sparse as sp
+        from scipy.optimize import linprog
+
+        A, row_lo, row_up, c, col_lo, col_up, row_blocks = self.matrix()
+        eq = row_lo == row_up
+        le = ~eq & np.isfinite(row_up)
+        ge = ~eq & np.isfinite(row_lo)
+
+        result = linprog(
+            c,
+            A_ub=sp.vstack([A[le], -A[ge]]).tocsr(),
+            b_ub=np.concatenate([row_up[le], -row_lo[ge]]),
+            A_eq=A[eq], b_eq=row_lo[eq],
+            bounds=np.column_stack([col_lo, col_up]),
+            method='highs')
+        if result.status != 0:
+            raise RuntimeError('Solver failed: {}'.format(result.message))
+
+        # dual value of a row = d(objective) / d(row bound); a ranged
+        # row is split into an upper and a negated lower half
+        duals = np.zeros(A.shape[0])
+        duals[eq] = result.eqlin.marginals
+        num_le = int(le.sum())
+        duals[le] += result.ineqlin.marginals[:num_le]
+        duals[ge] -= result.ineqlin.marginals[num_le:]
+        return result.x, duals
+
+    def _solve_file(self, solver, logfile=None):
+        import shutil
+        import subprocess
+        import tempfile
+
+        tmpdir = tempfile.mkdtemp(prefix='urbs')
+        try:
+            lp_file = os.path.join(tmpdir, 'urbs.lp')
+            sol_file = os.path.join(tmpdir, 'urbs.sol')
+            lp_rows = self.write_lp(lp_file)
+
+            if solver == 'glpk':
+                cmd = ['glpsol', '--lp', lp_file, '-w', sol_file]
+                if logfile:
+                    cmd.extend(['--log', logfile])
+                subprocess.check_call(cmd)
+                x, lp_duals = _read_glpk_solution(sol_file, len(lp_rows),
+                                                  self.num_cols)
+            else:
+                cmd = ['cbc', lp_file, 'printingOptions', 'all', 'solve',
+                       'solution', sol_file]
+                with open(logfile or os.devnull, 'w') as log:
+                    subprocess.check_call(cmd, stdout=log)
+                x, lp_duals = _read_cbc_solution(sol_file, len(lp_rows),
+                                                 self.num_cols)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        # rows written twice (ranged rows) have at most one non-zero dual
+        duals = np.zeros(int(lp_rows.max()) + 1 if len(lp_rows) else 0)
+        np.add.at(duals, lp_rows, lp_duals)
+        return x, duals
+
+    def result_cache(self, x, duals=None, row_blocks=None):
+        """Create a result cache like saveload.create_result_cache.
+
+        Like Pyomo, which does not pass unused variables to the solver,
+        variables that are neither part of a kept row nor of the objective
+        are reported as NaN.
+
+        Args:
+            x: array of variable values, one per column
+            duals: (optional) array of dual values, one per kept row
+            row_blocks: (optional) row bookkeeping as returned by matrix();
+                default: row_blocks()
+
+        Returns:
+            a dict of entity names to pandas Series
+        """
+        if row_blocks is None:
+            row_blocks = self.row_blocks()
+        used = self.objective != 0
+        for block, kept, _ in row_blocks:
+            r, c, v = block.triplets()
+            used[c[kept[r] & (v != 0)]] = True
+        x = np.where(used, x, np.nan)
+
+        cache = OrderedDict()
+        for name, (tuples, labels) in self.sets.items():
+            block = _Block(name, tuples, labels)
+            cache[name] = pd.Series(1, index=block.index(), name=name)
+        for name, value in [('dt', self.dt), ('weight', self.weight)]:
+            cache[name] = pd.Series([value], index=pd.Index([None],
+                                                            name='None'),
+                                    name=name)
+        for name, var in self.variables.items():
+            cache[name] = pd.Series(
+                x[var.offset:var.offset + var.size],
+                index=var.index(), name=name)
+            if name in self.result_index:
+                cache[name] = cache[name].reindex(
+                    self.result_index[name].index())
+        if duals is not None:
+            for block, kept, first_row in row_blocks:
+                cache[block.name] = pd.Series(
+                    duals[first_row:first_row + int(kept.sum())],
+                    index=block.index()[kept], name=block.name)
+        return cache
+
+
+def _write_lines(f, fmt, *columns):
+    """Write one line per element of the given equally long arrays.
+
+    Lines are formatted with the %-style format string fmt and written in
+    chunks, so that the file content never has to be kept in memory.
+    """
+    chunk = 100000
+    for start in range(0, len(columns[0]), chunk):
+        values = zip(*[column[start:start + chunk].tolist()
+                       for column in columns])
+        f.write(''.join(fmt % value for value in values))
+
+
+def _write_lp_block(f, block, kept, first_row, num_cols):
+    """Write the kept rows of a constraint block in LP format.
+
+    Returns:
+        array of model row numbers, one per written LP row
+    """
+    import scipy.sparse as sp
+
+    number = np.cumsum(kept) - 1 + first_row  # model row numbers
+    r, c, v = block.triplets()
+    A = sp.coo_matrix((v, (r, c)), shape=(block.size, num_cols)).tocsr()
+    A.sum_duplicates()
+
+    lp_rows = []
+    local_rows = np.flatnonzero(kept)
+    chunk = 10000
+    for first in range(0, len(local_rows), chunk):
+        rows = local_rows[first:first + chunk]
+        lines = []
+        for row in rows.tolist():
+            start, end = A.indptr[row], A.indptr[row + 1]
+            body = ''.join('%+.17g x%d\n' % term for term in zip(
+                A.data[start:end].tolist(),
+                (A.indices[start:end] + 1).tolist())) or '0 x1\n'
+            lower, upper = block.lower[row], block.upper[row]
+            name = number[row] + 1
+            if lower == upper:
+                lines.append('c%d:\n%s= %.17g\n' % (name, body, lower))
+            elif np.isneginf(lower):
+                lines.append('c%d:\n%s<= %.17g\n' % (name, body, upper))
+            elif np.isposinf(upper):
+                lines.append('c%d:\n%s>= %.17g\n' % (name, body, lower))
+            else:
+                lines.append('c%d_l:\n%s>= %.17g\n' % (name, body, lower))
+                lines.append('c%d_u:\n%s<= %.17g\n' % (name, body, upper))
+                lp_rows.append(number[row])
+            lp_rows.append(number[row])
+        f.write(''.join(lines))
+    return np.array(lp_rows, dtype=np.int64)
+
+
+def _read_glpk_solution(filename, num_rows, num_cols):
+    """Read row duals and column values from a glpsol -w solution file.
+
+    Both the classic (GLPK <= 4.57) and the newer line-tagged format are
+    supported.
+
+    Returns:
+        (x, duals) arrays
+    """
+    x = np.zeros(num_cols)
+    duals = np.zeros(num_rows)
+    with open(filename) as f:
+        lines = (line.split() for line in f)
+        header = next(lines)
+        if header[0].isdigit():
+            # classic format: rows cols / pst dst obj / rows / columns
+            status = next(lines)
+            if status[:2] != ['2', '2']:
+                raise RuntimeError('glpsol found no optimal solution')
+            for k in range(int(header[0])):
+                duals[k] = float(next(lines)[2])
+            for k in range(int(header[1])):
+                x[k] = float(next(lines)[1])
+        else:
+            for tokens in itertools.chain([header], lines):
+                if tokens[0] == 's' and tokens[4:6] != ['f', 'f']:
+                    raise RuntimeError('glpsol found no optimal solution')
+                elif tokens[0] == 'i':
+                    duals[int(tokens[1]) - 1] = float(tokens[4])
+                elif tokens[0] == 'j':
+                    x[int(tokens[1]) - 1] = float(tokens[3])
+    return x, duals
+
+
+def _read_cbc_solution(filename, num_rows, num_cols):
+    """Read row duals and column values from a cbc solution file.
+
+    Returns:
+        (x, duals) arrays
+    """
+    x = np.zeros(num_cols)
+    duals = np.zeros(num_rows)
+    lp_row = 0
+    with open(filename) as f:
+        status = f.readline()
+        if not status.startswith('Optimal'):
+            raise RuntimeError('cbc found no optimal solution: ' + status)
+        for line in f:
+            # infeasible entries are prefixed with '**'
+            tokens = line.replace('**', '').split()
+            if tokens[1].startswith('x'):
+                x[int(tokens[1][1:]) - 1] = float(tokens[2])
+            else:
+                duals[lp_row] = float(tokens[3])
+                lp_row += 1
+    return x, duals
+
+
+def _series(df, key, timesteps):
+    """Return column key of a timeseries DataFrame as array over timesteps.
+
+    Columns of single-level spreadsheet headers (e.g. 'Elec buy' in
+    'Buy-Sell-Price') are 1-tuples after split_columns, hence both forms
+    of key are tried.
+    """
+    try:
+        column = df[(key,)] if not isinstance(key, tuple) else df[key]
+    except KeyError:
+        column = df[key]
+    return column.loc[timesteps].values.astype(float)
+
+
+def create_matrix_model(data, timesteps=None, dt=1, dual=False):
+    """Create a urbs MatrixModel from given input data.
+
+    Same arguments as create_model; all constraint families of the Pyomo
+    model are generated with identical coefficients and bounds.
+
+    Args:
+        data: a dict of DataFrames as returned by read_excel
+        timesteps: optional list of timesteps, default: demand timeseries
+        dt: timestep duration in hours (default: 1)
+        dual: set True to retrieve dual values after solving
+
+    Returns:
+        a MatrixModel object
+    """
+    if not timesteps:
+        timesteps = data['demand'].index.tolist()
+    mm = MatrixModel(data, timesteps, dt, dual)
+
+    global_prop = data['global_prop']
+    site = data['site']
+    commodity = data['commodity']
+    process = data['process']
+    process_commodity = data['process_commodity']
+    transmission = data['transmission']
+    storage = data['storage']
+    demand = data['demand']
+    supim = data['supim']
+    buy_sell_price = data['buy_sell_price']
+    dsm = data['dsm']
+
+    # derive annuity factor from WACC and depreciation duration (as in
+    # pyomo_model_prep, which also stores them in the input data)
+    for df in (process, transmission, storage):
+        df['annuity-factor'] = annuity_factor(df['depreciation'], df['wacc'])
+
+    com_dict = commodity.to_dict()
+    pro_dict = process.to_dict()
+    tra_dict = transmission.to_dict()
+    sto_dict = storage.to_dict()
+    dsm_dict = dsm.to_dict()
+
+    r_in = process_commodity.xs('In', level='Direction')['ratio']
+    r_out = process_commodity.xs('Out', level='Direction')['ratio']
+    r_in_min_fraction = process_commodity.xs('In', level='Direction')
+    r_in_min_fraction = r_in_min_fraction['ratio-min']
+    r_in_min_fraction = r_in_min_fraction[r_in_min_fraction > 0]
+    r_out_min_fraction = process_commodity.xs('Out', level='Direction')
+    r_out_min_fraction = r_out_min_fraction['ratio-min']
+    r_out_min_fraction = r_out_min_fraction[r_out_min_fraction > 0]
+    r_in_dict = r_in.to_dict()
+    r_out_dict = r_out.to_dict()
+
+    # sets
+    tm = mm.timesteps[1:]
+    P = np.arange(1, len(mm.timesteps))  # positions of tm within t
+    PT = np.arange(len(mm.timesteps))  # positions of t within t
+    tm_weight, tm_prev = timestep_weights(data, mm.timesteps, dt)
+    position = dict((t, p) for p, t in enumerate(mm.timesteps))
+    P_prev = np.array([position[tm_prev[t]] for t in tm], dtype=np.int64)
+    # representative period of each element of tm (all 0 without
+    # aggregation), whether it is the first one of its period, and the
+    # representative periods in the order of the original periods
+    tm_period = timestep_periods(data, mm.timesteps)
+    if tm_period is None:
+        tm_period = dict.fromkeys(tm, 0)
+        period_order = []
+    else:
+        period_order = data['period_order']['period'].tolist()
+        periods = data['period'].index.tolist()
+        period_pos = dict((p, i) for i, p in enumerate(periods))
+        period_last = dict(zip(periods, data['period']['last'].tolist()))
+        period_length = dict(zip(periods, (data['period']['last'] -
+                                           data['period']['first'] +
+                                           1).tolist()))
+        # weight of an original timestep, cf. timestep_weights
+        original_weight = float(8760) / (dt * sum(
+            period_length[p] for p in period_order))
+    P_period = np.array([tm_period[t] for t in tm])
+    P_first = np.r_[bool(period_order), P_period[1:] != P_period[:-1]]
+    sites = commodity.index.get_level_values('Site').unique()
+    com_tuples = commodity.index.tolist()
+    pro_tuples = process.index.tolist()
+    tra_tuples = transmission.index.tolist()
+    sto_tuples = storage.index.tolist()
+    dsm_site_tuples = [] if dsm.empty else dsm.index.tolist()
+
+    def tuples_by_process(pro_com_index):
+        coms = OrderedDict()
+        for pro, com in pro_com_index:
+            coms.setdefault(pro, []).append(com)
+        return [(sit, pro, com) for (sit, pro) in pro_tuples
+                for com in coms.get(pro, [])]
+
+    pro_input_tuples = tuples_by_process(r_in.index)
+    pro_output_tuples = tuples_by_process(r_out.index)
+    partial_pros = set(pro for pro, _ in r_in_min_fraction.index)
+    pro_partial_tuples = [(sit, pro) for (sit, pro) in pro_tuples
+                          if pro in partial_pros]
+    pro_partial_input_tuples = [
+        (sit, pro, com) for (sit, pro, com) in tuples_by_process(
+            r_in_min_fraction.index) if pro in partial_pros]
+    pro_partial_output_tuples = [
+        (sit, pro, com) for (sit, pro, com) in tuples_by_process(
+            r_out_min_fraction.index) if pro in partial_pros]
+    pro_maxgrad_tuples = [(sit, pro) for (sit, pro) in pro_tuples
+                          if pro_dict['max-grad'][(sit, pro)] < 1.0 / dt]
+    proc_area = process['area-per-cap']
+    pro_area_tuples = proc_area[proc_area >= 0].index.tolist()
+
+    com_supim = commodity_subset(com_tuples, 'SupIm')
+    com_stock = commodity_subset(com_tuples, 'Stock')
+    com_sell = commodity_subset(com_tuples, 'Sell')
+    com_buy = commodity_subset(com_tuples, 'Buy')
+    com_demand = commodity_subset(com_tuples, 'Demand')
+    com_env = commodity_subset(com_tuples, 'Env')
+
+    mm.sets['tm'] = ([(t,) for t in tm], ['t'])
+    mm.sets['com_tuples'] = (com_tuples, ['sit', 'com', 'com_type'])
+    mm.sets['pro_tuples'] = (pro_tuples, ['sit', 'pro'])
+    mm.sets['tra_tuples'] = (tra_tuples, ['sit', 'sit_', 'tra', 'com'])
+    mm.sets['sto_tuples'] = (sto_tuples, ['sit', 'sto', 'com'])
+    mm.sets['dsm_site_tuples'] = (dsm_site_tuples, ['sit', 'com'])
+    pro_sell_buy_tuples = sell_buy_tuples(
+        pro_tuples, pro_input_tuples,
+        sell_buy_pairs(pro_input_tuples, pro_output_tuples, com_sell,
+                       com_buy),
+        com_buy)
+    mm.sets['pro_sell_buy_tuples'] = (pro_sell_buy_tuples,
+                                      ['sit', 'pro', 'pro_'])
+
+    # DSM shift windows: for each (site, commodity), the positions (within
+    # tm) of all (t, tt) pairs with |t - tt| <= delay in the same period
+    dsm_windows = OrderedDict()
+    dsm_down_tuples = []
+    for (sit, com) in dsm_site_tuples:
+        delay = int(dsm_dict['delay'][(sit, com)])
+        step = np.repeat(np.arange(len(tm)), 2 * delay + 1)
+        shift = step + np.tile(np.arange(-delay, delay + 1), len(tm))
+        valid = (shift >= 0) & (shift < len(tm))
+        valid[valid] = P_period[step[valid]] == P_period[shift[valid]]
+        step, shift = step[valid], shift[valid]
+        dsm_windows[(sit, com)] = (step, shift, len(dsm_down_tuples))
+        dsm_down_tuples.extend((tm[i], tm[k], sit, com)
+                               for i, k in zip(step, shift))
+
+    # Variables
+    w = np.array([tm_weight[t] for t in tm])  # weights of P
+    costs = mm.add_var('costs', [(ct,) for ct in COST_TYPES], ['cost_type'],
+                       lb=-np.inf)
+    e_co = {}
+    for kind in ('stock', 'sell', 'buy'):
+        e_co[kind] = mm.add_var('e_co_' + kind, com_tuples,
+                                ['t', 'sit', 'com', 'com_type'], 'tm')
+    cap_pro = mm.add_var('cap_pro', pro_tuples, ['sit', 'pro'])
+    cap_pro_new = mm.add_var('cap_pro_new', pro_tuples, ['sit', 'pro'])
+    tau_pro = mm.add_var('tau_pro', pro_tuples, ['t', 'sit', 'pro'], 't')
+    e_pro_in = mm.add_var('e_pro_in', pro_input_tuples,
+                          ['t', 'sit', 'pro', 'com'], 'tm')
+    e_pro_out = mm.add_var('e_pro_out', pro_output_tuples,
+                           ['t', 'sit', 'pro', 'com'], 'tm')
+    # Pyomo indexes process flows over all commodities
+    coms = commodity.index.get_level_values('Commodity').unique()
+    for name in ('e_pro_in', 'e_pro_out'):
+        mm.result_index[name] = _Block(
+            name, [p + (com,) for p in pro_tuples for com in coms],
+            ['t', 'sit', 'pro', 'com'], tm, 1)
+    tra_labels = ['sit', 'sit_', 'tra', 'com']
+    cap_tra = mm.add_var('cap_tra', tra_tuples, tra_labels)
+    cap_tra_new = mm.add_var('cap_tra_new', tra_tuples, tra_labels)
+    e_tra_in = mm.add_var('e_tra_in', tra_tuples, ['t'] + tra_labels, 'tm')
+    e_tra_out = mm.add_var('e_tra_out', tra_tuples, ['t'] + tra_labels, 'tm')
+    sto_labels = ['sit', 'sto', 'com']
+    cap_sto_c = mm.add_var('cap_sto_c', sto_tuples, sto_labels)
+    cap_sto_c_new = mm.add_var('cap_sto_c_new', sto_tuples, sto_labels)
+    cap_sto_p = mm.add_var('cap_sto_p', sto_tuples, sto_labels)
+    cap_sto_p_new = mm.add_var('cap_sto_p_new', sto_tuples, sto_labels)
+    e_sto_in = mm.add_var('e_sto_in', sto_tuples, ['t'] + sto_labels, 'tm')
+    e_sto_out = mm.add_var('e_sto_out', sto_tuples, ['t'] + sto_labels, 'tm')
+    # for representative periods, storage content is relative to the start
+    # of the period and linked across periods by its content at the
+    # original period boundaries (cf. def_storage_state_inter_rule in
+    # urbs.model)
+    e_sto_con = mm.add_var('e_sto_con', sto_tuples, ['t'] + sto_labels, 't',
+                           lb=-np.inf if period_order else 0.0)
+    if period_order:
+        original_sto_tuples = [(o,) + s for o in range(len(period_order) + 1)
+                               for s in sto_tuples]
+        period_sto_tuples = [(p,) + s for p in periods for s in sto_tuples]
+        e_sto_con_inter = mm.add_var('e_sto_con_inter', original_sto_tuples,
+                                     ['original'] + sto_labels)
+        e_sto_con_max = mm.add_var('e_sto_con_max', period_sto_tuples,
+                                   ['period'] + sto_labels)
+        e_sto_con_min = mm.add_var('e_sto_con_min', period_sto_tuples,
+                                   ['period'] + sto_labels, lb=-np.inf,
+                                   ub=0.0)
+    dsm_up = mm.add_var('dsm_up', dsm_site_tuples, ['t', 'sit', 'com'], 'tm')
+    dsm_down = mm.add_var('dsm_down', dsm_down_tuples,
+                          ['t', 't_', 'sit', 'com'])
+
+    mm.objective = np.zeros(mm.num_cols)
+    mm.objective[costs.cols(0):costs.cols(0) + costs.size] = 1
+
+    # commodity balance terms (consumption counts positive), cf.
+    # modelhelper.commodity_balance
+    incidence = commodity_incidence(process, r_in, r_out, transmission,
+                                    storage)
+
+    def balance_terms(sit, com):
+        terms = []
+        inc = incidence.get((sit, com))
+        if inc is None:
+            return terms
+        terms.extend((e_pro_in, e_pro_in.pos[sp + (com,)], 1.0)
+                     for sp in inc['pro_in'])
+        terms.extend((e_pro_out, e_pro_out.pos[sp + (com,)], -1.0)
+                     for sp in inc['pro_out'])
+        terms.extend((e_tra_in, e_tra_in.pos[tra], 1.0)
+                     for tra in inc['tra_export'])
+        terms.extend((e_tra_out, e_tra_out.pos[tra], -1.0)
+                     for tra in inc['tra_import'])
+        for sto in inc['sto']:
+            terms.append((e_sto_in, e_sto_in.pos[sto], 1.0))
+            terms.append((e_sto_out, e_sto_out.pos[sto], -1.0))
+        return terms
+
+    # Constraints
+
+    # commodity
+    com_labels = ['sit', 'com', 'com_type']
+    res_vertex = mm.add_con('res_vertex', com_tuples, ['t'] + com_labels,
+                            'tm', lower=0, upper=0)
+    for j, (sit, com, com_type) in enumerate(com_tuples):
+        rows = res_vertex.rows(j, P)
+        if com in com_env or com in com_supim:
+            res_vertex.active[rows] = False
+            continue
+        for var, k, coef in balance_terms(sit, com):
+            res_vertex.add(rows, var.cols(k, P), -coef)
+        if com in com_stock:
+            res_vertex.add(rows, e_co['stock'].cols(j, P), 1.0)
+        if com in com_sell:
+            res_vertex.add(rows, e_co['sell'].cols(j, P), -1.0)
+        if com in com_buy:
+            res_vertex.add(rows, e_co['buy'].cols(j, P), 1.0)
+        if com in com_demand and (sit, com) in demand.columns:
+            res_vertex.lower[rows] = res_vertex.upper[rows] = _series(
+                demand, (sit, com), tm)
+        if (sit, com) in dsm_windows:
+            step, shift, first = dsm_windows[(sit, com)]
+            res_vertex.add(rows, dsm_up.cols(dsm_up.pos[(sit, com)], P), -1)
+            res_vertex.add(res_vertex.rows(j, shift + 1),
+                           dsm_down.cols(first + np.arange(len(step))), 1)
+
+    for kind, com_set in (('stock', com_stock), ('sell', com_sell),
+                          ('buy', com_buy)):
+        step_con = mm.add_con('res_{}_step'.format(kind), com_tuples,
+                              ['t'] + com_labels, 'tm')
+        total_con = mm.add_con('res_{}_total'.format(kind), com_tuples,
+                               com_labels)
+        for j, (sit, com, com_type) in enumerate(com_tuples):
+            if com not in com_set:
+                step_con.active[step_con.rows(j, P)] = False
+                total_con.active[j] = False
+                continue
+            step_con.add(step_con.rows(j, P), e_co[kind].cols(j, P), 1.0)
+            step_con.upper[step_con.rows(j, P)] = (
+                com_dict['maxperstep'][(sit, com, com_type)])
+            total_con.add(j, e_co[kind].cols(j, P), dt * w)
+            total_con.upper[j] = com_dict['max'][(sit, com, com_type)]
+
+    res_env_step = mm.add_con('res_env_step', com_tuples, ['t'] + com_labels,
+                              'tm')
+    res_env_total = mm.add_con('res_env_total', com_tuples, com_labels)
+    for j, (sit, com, com_type) in enumerate(com_tuples):
+        if com not in com_env:
+            res_env_step.active[res_env_step.rows(j, P)] = False
+            res_env_total.active[j] = False
+            continue
+        rows = res_env_step.rows(j, P)
+        for var, k, coef in balance_terms(sit, com):
+            res_env_step.add(rows, var.cols(k, P), -coef)
+            res_env_total.add(j, var.cols(k, P), -coef * dt * w)
+        res_env_step.upper[rows] = com_dict['maxperstep'][(sit, com,
+                                                           com_type)]
+        res_env_total.upper[j] = com_dict['max'][(sit, com, com_type)]
+
+    # process
+    pro_labels = ['sit', 'pro']
+    def_process_capacity = mm.add_con('def_process_capacity', pro_tuples,
+                                      pro_labels)
+    res_process_capacity = mm.add_con('res_process_capacity', pro_tuples,
+                                      pro_labels)
+    res_process_throughput_by_capacity = mm.add_con(
+        'res_process_throughput_by_capacity', pro_tuples,
+        ['t'] + pro_labels, 'tm', upper=0)
+    for j, sp in enumerate(pro_tuples):
+        def_process_capacity.add(j, [cap_pro.cols(j), cap_pro_new.cols(j)],
+                                 [1, -1])
+        def_process_capacity.lower[j] = def_process_capacity.upper[j] = (
+            pro_dict['inst-cap'][sp])
+        res_process_capacity.add(j, cap_pro.cols(j), 1)
+        res_process_capacity.lower[j] = pro_dict['cap-lo'][sp]
+        res_process_capacity.upper[j] = pro_dict['cap-up'][sp]
+        rows = res_process_throughput_by_capacity.rows(j, P)
+        res_process_throughput_by_capacity.add(rows, tau_pro.cols(j, P), 1)
+        res_process_throughput_by_capacity.add(rows, cap_pro.cols(j), -1)
+
+    partial_input = set(pro_partial_input_tuples)
+    partial_output = set(pro_partial_output_tuples)
+    for name, var, tuples, ratio in (
+            ('def_process_input', e_pro_in, pro_input_tuples, r_in_dict),
+            ('def_process_output', e_pro_out, pro_output_tuples,
+             r_out_dict)):
+        partial = partial_input if var is e_pro_in else partial_output
+        con_tuples = [spc for spc in tuples if spc not in partial]
+        con = mm.add_con(name, con_tuples, ['t', 'sit', 'pro', 'com'], 'tm',
+                         lower=0, upper=0)
+        for j, (sit, pro, com) in enumerate(con_tuples):
+            rows = con.rows(j, P)
+            con.add(rows, var.cols(var.pos[(sit, pro, com)], P), 1)
+            con.add(rows, tau_pro.cols(tau_pro.pos[(sit, pro)], P),
+                    -ratio[(pro, com)])
+
+    def_intermittent_supply = mm.add_con(
+        'def_intermittent_supply', pro_input_tuples,
+        ['t', 'sit', 'pro', 'com'], 'tm', lower=0, upper=0)
+    for j, (sit, pro, com) in enumerate(pro_input_tuples):
+        rows = def_intermittent_supply.rows(j, P)
+        if com not in com_supim:
+            def_intermittent_supply.active[rows] = False
+            continue
+        def_intermittent_supply.add(rows, e_pro_in.cols(j, P), 1)
+        def_intermittent_supply.add(rows, cap_pro.cols(cap_pro.pos[(sit,
+                                                                    pro)]),
+                                    -_series(supim, (sit, com), tm))
+
+    res_process_maxgrad_lower = mm.add_con(
+        'res_process_maxgrad_lower', pro_maxgrad_tuples, ['t'] + pro_labels,
+        'tm', upper=0)
+    res_process_maxgrad_upper = mm.add_con(
+        'res_process_maxgrad_upper', pro_maxgrad_tuples, ['t'] + pro_labels,
+        'tm', lower=0)
+    for j, sp in enumerate(pro_maxgrad_tuples):
+        k = tau_pro.pos[sp]
+        grad = pro_dict['max-grad'][sp] * dt
+        for con, sign in ((res_process_maxgrad_lower, -1),
+                          (res_process_maxgrad_upper, 1)):
+            rows = con.rows(j, P)
+            con.add(rows, tau_pro.cols(k, P_prev), 1)
+            con.add(rows, cap_pro.cols(cap_pro.pos[sp]), sign * grad)
+            con.add(rows, tau_pro.cols(k, P), -1)
+
+    res_area = mm.add_con('res_area', [(sit,) for sit in sites], ['sit'])
+    for j, sit in enumerate(sites):
+        area_tuples = [(s, p) for (s, p) in pro_area_tuples if s == sit]
+        area_per_cap = [pro_dict['area-per-cap'][sp] for sp in area_tuples]
+        if site.loc[sit]['area'] >= 0 and sum(area_per_cap) > 0:
+            res_area.add(j, [cap_pro.cols(cap_pro.pos[sp])
+                             for sp in area_tuples], area_per_cap)
+            res_area.upper[j] = site.loc[sit]['area']
+        else:
+            res_area.active[j] = False
+
+    res_sell_buy_symmetry = mm.add_con(
+        'res_sell_buy_symmetry', pro_sell_buy_tuples, ['sit', 'pro', 'pro_'],
+        lower=0, upper=0)
+    for j, (sit, pro_buy, pro_sell) in enumerate(pro_sell_buy_tuples):
+        res_sell_buy_symmetry.add(
+            j, [cap_pro.cols(cap_pro.pos[(sit, pro_buy)]),
+                cap_pro.cols(cap_pro.pos[(sit, pro_sell)])], [1, -1])
+
+    res_throughput_by_capacity_min = mm.add_con(
+        'res_throughput_by_capacity_min', pro_partial_tuples,
+        ['t'] + pro_labels, 'tm', lower=0)
+    for j, sp in enumerate(pro_partial_tuples):
+        rows = res_throughput_by_capacity_min.rows(j, P)
+        res_throughput_by_capacity_min.add(rows,
+                                           tau_pro.cols(tau_pro.pos[sp], P),
+                                           1)
+        res_throughput_by_capacity_min.add(rows,
+                                           cap_pro.cols(cap_pro.pos[sp]),
+                                           -pro_dict['min-fraction'][sp])
+
+    for name, var, tuples, ratio, ratio_min in (
+            ('def_partial_process_input', e_pro_in, pro_partial_input_tuples,
+             r_in_dict, r_in_min_fraction),
+            ('def_partial_process_output', e_pro_out,
+             pro_partial_output_tuples, r_out_dict, r_out_min_fraction)):
+        con = mm.add_con(name, tuples, ['t', 'sit', 'pro', 'com'], 'tm',
+                         lower=0, upper=0)
+        for j, (sit, pro, com) in enumerate(tuples):
+            R = ratio[(pro, com)]  # ratio at maximum operation point
+            r = ratio_min[pro, com]  # ratio at lowest operation point
+            min_fraction = pro_dict['min-fraction'][(sit, pro)]
+            online_factor = min_fraction * (r - R) / (1 - min_fraction)
+            throughput_factor = (R - min_fraction * r) / (1 - min_fraction)
+            rows = con.rows(j, P)
+            con.add(rows, var.cols(var.pos[(sit, pro, com)], P), 1)
+            con.add(rows, cap_pro.cols(cap_pro.pos[(sit, pro)]),
+                    -online_factor)
+            con.add(rows, tau_pro.cols(tau_pro.pos[(sit, pro)], P),
+                    -throughput_factor)
+
+    # transmission
+    def_transmission_capacity = mm.add_con('def_transmission_capacity',
+                                           tra_tuples, tra_labels)
+    def_transmission_output = mm.add_con(
+        'def_transmission_output', tra_tuples, ['t'] + tra_labels, 'tm',
+        lower=0, upper=0)
+    res_transmission_input_by_capacity = mm.add_con(
+        'res_transmission_input_by_capacity', tra_tuples,
+        ['t'] + tra_labels, 'tm', upper=0)
+    res_transmission_capacity = mm.add_con('res_transmission_capacity',
+                                           tra_tuples, tra_labels)
+    res_transmission_symmetry = mm.add_con('res_transmission_symmetry',
+                                           tra_tuples, tra_labels,
+                                           lower=0, upper=0)
+    for j, (sin, sout, tra, com) in enumerate(tra_tuples):
+        key = (sin, sout, tra, com)
+        def_transmission_capacity.add(j, [cap_tra.cols(j),
+                                          cap_tra_new.cols(j)], [1, -1])
+        def_transmission_capacity.lower[j] = tra_dict['inst-cap'][key]
+        def_transmission_capacity.upper[j] = tra_dict['inst-cap'][key]
+        rows = def_transmission_output.rows(j, P)
+        def_transmission_output.add(rows, e_tra_out.cols(j, P), 1)
+        def_transmission_output.add(rows, e_tra_in.cols(j, P),
+                                    -tra_dict['eff'][key])
+        rows = res_transmission_input_by_capacity.rows(j, P)
+        res_transmission_input_by_capacity.add(rows, e_tra_in.cols(j, P), 1)
+        res_transmission_input_by_capacity.add(rows, cap_tra.cols(j), -1)
+        res_transmission_capacity.add(j, cap_tra.cols(j), 1)
+        res_transmission_capacity.lower[j] = tra_dict['cap-lo'][key]
+        res_transmission_capacity.upper[j] = tra_dict['cap-up'][key]
+        res_transmission_symmetry.add(
+            j, [cap_tra.cols(j), cap_tra.cols(cap_tra.pos[(sout, sin, tra,
+                                                           com)])], [1, -1])
+
+    # storage
+    sto_cons = OrderedDict()
+    for name, time_set, lower, upper in (
+            ('def_storage_state', 'tm', 0, 0),
+            ('def_storage_power', None, -np.inf, np.inf),
+            ('def_storage_capacity', None, -np.inf, np.inf),
+            ('res_storage_input_by_power', 'tm', -np.inf, 0),
+            ('res_storage_output_by_power', 'tm', -np.inf, 0),
+            ('res_storage_state_by_capacity', 't', -np.inf, 0),
+            ('res_storage_power', None, -np.inf, np.inf),
+            ('res_storage_capacity', None, -np.inf, np.inf),
+            ('res_initial_and_final_storage_state', 't', -np.inf, np.inf)):
+        labels = sto_labels if time_set is None else ['t'] + sto_labels
+        sto_cons[name] = mm.add_con(name, sto_tuples, labels,
+                                    time_set, lower, upper)
+    con = sto_cons['res_initial_and_final_storage_state']
+    con.active[:] = False
+    for j, key in enumerate(sto_tuples):
+        # the content before the first timestep of a representative period
+        # is 0, as it is relative to the start of the period
+        rows = sto_cons['def_storage_state'].rows(j, P)
+        sto_cons['def_storage_state'].add(
+            rows,
+            [e_sto_con.cols(j, P), e_sto_in.cols(j, P),
+             e_sto_out.cols(j, P)],
+            np.array([1, -sto_dict['eff-in'][key] * dt,
+                      dt / sto_dict['eff-out'][key]])[:, np.newaxis])
+        sto_cons['def_storage_state'].add(
+            rows[~P_first], e_sto_con.cols(j, P_prev[~P_first]),
+            -(1 - sto_dict['discharge'][key]))
+
+        for name, cap, cap_new, inst in (
+                ('def_storage_power', cap_sto_p, cap_sto_p_new,
+                 'inst-cap-p'),
+                ('def_storage_capacity', cap_sto_c, cap_sto_c_new,
+                 'inst-cap-c')):
+            sto_cons[name].add(j, [cap.cols(j), cap_new.cols(j)], [1, -1])
+            sto_cons[name].lower[j] = sto_cons[name].upper[j] = (
+                sto_dict[inst][key])
+
+        for name, var in (('res_storage_input_by_power', e_sto_in),
+                          ('res_storage_output_by_power', e_sto_out)):
+            rows = sto_cons[name].rows(j, P)
+            sto_cons[name].add(rows, var.cols(j, P), 1)
+            sto_cons[name].add(rows, cap_sto_p.cols(j), -1)
+
+        rows = sto_cons['res_storage_state_by_capacity'].rows(j, PT)
+        sto_cons['res_storage_state_by_capacity'].add(
+            rows, e_sto_con.cols(j, PT), 1)
+        sto_cons['res_storage_state_by_capacity'].add(
+            rows, cap_sto_c.cols(j), -1)
+
+        for name, cap, suffix in (('res_storage_power', cap_sto_p, 'p'),
+                                  ('res_storage_capacity', cap_sto_c, 'c')):
+            sto_cons[name].add(j, cap.cols(j), 1)
+            sto_cons[name].lower[j] = sto_dict['cap-lo-' + suffix][key]
+            sto_cons[name].upper[j] = sto_dict['cap-up-' + suffix][key]
+
+        # content[t=first] == capacity * init <= content[t=last]; for
+        # representative periods, the relative content[t=first] is 0 and
+        # the content at the original period boundaries is restricted below
+        if period_order:
+            con.add(con.rows(j, 0), e_sto_con.cols(j, 0), 1)
+            con.active[con.rows(j, 0)] = True
+            con.lower[con.rows(j, 0)] = con.upper[con.rows(j, 0)] = 0
+            continue
+        first, last = con.rows(j, 0), con.rows(j, len(mm.timesteps) - 1)
+        for row, p in ((first, 0), (last, len(mm.timesteps) - 1)):
+            con.add(row, [e_sto_con.cols(j, p), cap_sto_c.cols(j)],
+                    [1, -sto_dict['init'][key]])
+            con.active[row] = True
+            con.lower[row] = 0
+        con.upper[first] = 0
+
+    # storage across representative periods, see the comment on
+    # def_storage_state_inter_rule in urbs.model
+    if period_order:
+        n, end = len(sto_tuples), len(period_order)
+        for name, tuples, labels, time_set, lower, upper in (
+                ('def_storage_state_inter', original_sto_tuples,
+                 ['original'] + sto_labels, None, 0, 0),
+                ('res_storage_state_max', sto_tuples, ['t'] + sto_labels,
+                 'tm', -np.inf, 0),
+                ('res_storage_state_min', sto_tuples, ['t'] + sto_labels,
+                 'tm', 0, np.inf),
+                ('res_storage_state_inter_by_capacity', original_sto_tuples,
+                 ['original'] + sto_labels, None, -np.inf, 0),
+                ('res_storage_state_inter_minimum', original_sto_tuples,
+                 ['original'] + sto_labels, None, 0, np.inf),
+                ('res_initial_and_final_storage_state_inter',
+                 original_sto_tuples, ['original'] + sto_labels, None, 0, 0)):
+            sto_cons[name] = mm.add_con(name, tuples, labels,
+                                        time_set, lower, upper)
+        P_period_pos = np.array([period_pos[p] for p in P_period])
+        for j, key in enumerate(sto_tuples):
+            # relative content within [min, max] of its period
+            for name in ('res_storage_state_max', 'res_storage_state_min'):
+                var = (e_sto_con_max if name.endswith('max')
+                       else e_sto_con_min)
+                rows = sto_cons[name].rows(j, P)
+                sto_cons[name].add(rows, e_sto_con.cols(j, P), 1)
+                sto_cons[name].add(rows, var.cols(P_period_pos * n + j), -1)
+
+            discharge = 1 - sto_dict['discharge'][key]
+            for o in range(end + 1):
+                k = o * n + j
+                con = sto_cons['res_storage_state_inter_by_capacity']
+                con.add(k, [e_sto_con_inter.cols(k), cap_sto_c.cols(j)],
+                        [1, -1])
+                con = sto_cons['res_initial_and_final_storage_state_inter']
+                con.add(k, [e_sto_con_inter.cols(k), cap_sto_c.cols(j)],
+                        [1, -sto_dict['init'][key]])
+                con.active[k] = o in (0, end)
+                if o == end:
+                    con.upper[k] = np.inf
+                    sto_cons['def_storage_state_inter'].active[k] = False
+                    sto_cons['res_storage_state_inter_minimum'].active[k] = (
+                        False)
+                    continue
+
+                p = period_order[o]
+                decay = discharge ** period_length[p]
+                sto_cons['def_storage_state_inter'].add(
+                    k, [e_sto_con_inter.cols(k + n), e_sto_con_inter.cols(k),
+                        e_sto_con.cols(j, position[period_last[p]])],
+                    [1, -decay, -1])
+                sto_cons['res_storage_state_inter_by_capacity'].add(
+                    k, e_sto_con_max.cols(period_pos[p] * n + j), 1)
+                sto_cons['res_storage_state_inter_minimum'].add(
+                    k, [e_sto_con_inter.cols(k),
+                        e_sto_con_min.cols(period_pos[p] * n + j)],
+                    [decay, 1])
+
+    # costs
+    def_costs = mm.add_con('def_costs', [(ct,) for ct in COST_TYPES],
+                           ['cost_type'], lower=0, upper=0)
+    for j, cost_type in enumerate(COST_TYPES):
+        def_costs.add(j, costs.cols(j), 1)
+    j = COST_TYPES.index('Invest')
+    for k, key in enumerate(pro_tuples):
+        def_costs.add(j, cap_pro_new.cols(k),
+                      -pro_dict['inv-cost'][key] *
+                      pro_dict['annuity-factor'][key])
+    for k, key in enumerate(tra_tuples):
+        def_costs.add(j, cap_tra_new.cols(k),
+                      -tra_dict['inv-cost'][key] *
+                      tra_dict['annuity-factor'][key])
+    for k, key in enumerate(sto_tuples):
+        def_costs.add(j, [cap_sto_p_new.cols(k), cap_sto_c_new.cols(k)],
+                      [-sto_dict['inv-cost-p'][key] *
+                       sto_dict['annuity-factor'][key],
+                       -sto_dict['inv-cost-c'][key] *
+                       sto_dict['annuity-factor'][key]])
+    j = COST_TYPES.index('Fixed')
+    for k, key in enumerate(pro_tuples):
+        def_costs.add(j, cap_pro.cols(k), -pro_dict['fix-cost'][key])
+    for k, key in enumerate(tra_tuples):
+        def_costs.add(j, cap_tra.cols(k), -tra_dict['fix-cost'][key])
+    for k, key in enumerate(sto_tuples):
+        def_costs.add(j, [cap_sto_p.cols(k), cap_sto_c.cols(k)],
+                      [-sto_dict['fix-cost-p'][key],
+                       -sto_dict['fix-cost-c'][key]])
+    j = COST_TYPES.index('Variable')
+    for k, key in enumerate(pro_tuples):
+        def_costs.add(j, tau_pro.cols(k, P),
+                      -dt * w * pro_dict['var-cost'][key])
+    for k, key in enumerate(tra_tuples):
+        def_costs.add(j, e_tra_in.cols(k, P),
+                      -dt * w * tra_dict['var-cost'][key])
+    for k, key in enumerate(sto_tuples):
+        def_costs.add(j, e_sto_con.cols(k, P),
+                      -w * sto_dict['var-cost-c'][key])
+        # content at the start of the original periods, which decays over
+        # the timesteps of the period (cf. storage_inter_content_costs)
+        decay = 1 - sto_dict['discharge'][key]
+        for o, p in enumerate(period_order):
+            def_costs.add(j, e_sto_con_inter.cols(o * len(sto_tuples) + k),
+                          -original_weight * sto_dict['var-cost-c'][key] *
+                          sum(decay ** i
+                              for i in range(1, period_length[p] + 1)))
+        def_costs.add(j, [e_sto_in.cols(k, P), e_sto_out.cols(k, P)],
+                      -dt * w * sto_dict['var-cost-p'][key])
+    for k, (sit, com, com_type) in enumerate(com_tuples):
+        key = (sit, com, com_type)
+        if com in com_stock:
+            def_costs.add(COST_TYPES.index('Fuel'), e_co['stock'].cols(k, P),
+                          -dt * w * com_dict['price'][key])
+        if com in com_sell:
+            def_costs.add(COST_TYPES.index('Revenue'),
+                          e_co['sell'].cols(k, P),
+                          w * dt * com_dict['price'][key] *
+                          _series(buy_sell_price, com, tm))
+        if com in com_buy:
+            def_costs.add(COST_TYPES.index('Purchase'),
+                          e_co['buy'].cols(k, P),
+                          -w * dt * com_dict['price'][key] *
+                          _series(buy_sell_price, com, tm))
+        if com in com_env:
+            for var, l, coef in balance_terms(sit, com):
+                def_costs.add(COST_TYPES.index('Environmental'),
+                              var.cols(l, P),
+                              coef * w * dt * com_dict['price'][key])
+
+    # demand side management
+    dsm_labels = ['t', 'sit', 'com']
+    def_dsm_variables = mm.add_con('def_dsm_variables', dsm_site_tuples,
+                                   dsm_labels, 'tm', lower=0, upper=0)
+    res_dsm_upward = mm.add_con('res_dsm_upward', dsm_site_tuples,
+                                dsm_labels, 'tm')
+    res_dsm_downward = mm.add_con('res_dsm_downward', dsm_site_tuples,
+                                  dsm_labels, 'tm')
+    res_dsm_maximum = mm.add_con('res_dsm_maximum', dsm_site_tuples,
+                                 dsm_labels, 'tm')
+    res_dsm_recovery = mm.add_con('res_dsm_recovery', dsm_site_tuples,
+                                  dsm_labels, 'tm')
+    for j, key in enumerate(dsm_site_tuples):
+        step, shift, first = dsm_windows[key]
+        down_cols = dsm_down.cols(first + np.arange(len(step)))
+        up_cols = dsm_up.cols(j, P)
+        rows = def_dsm_variables.rows(j, P)
+        def_dsm_variables.add(def_dsm_variables.rows(j, step + 1),
+                              down_cols, 1)
+        def_dsm_variables.add(rows, up_cols, -dsm_dict['eff'][key])
+
+        res_dsm_upward.add(rows, up_cols, 1)
+        res_dsm_upward.upper[rows] = int(dsm_dict['cap-max-up'][key])
+
+        res_dsm_downward.add(res_dsm_downward.rows(j, shift + 1),
+                             down_cols, 1)
+        res_dsm_downward.upper[rows] = dsm_dict['cap-max-do'][key]
+
+        res_dsm_maximum.add(rows, up_cols, 1)
+        res_dsm_maximum.add(res_dsm_maximum.rows(j, shift + 1), down_cols, 1)
+        res_dsm_maximum.upper[rows] = max(dsm_dict['cap-max-up'][key],
+                                          dsm_dict['cap-max-do'][key])
+
+        recov = int(dsm_dict['recov'][key])
+        step = np.repeat(np.arange(len(tm)), recov)
+        later = step + np.tile(np.arange(recov), len(tm))
+        valid = later < len(tm)
+        valid[valid] = P_period[step[valid]] == P_period[later[valid]]
+        res_dsm_recovery.add(res_dsm_recovery.rows(j, step[valid] + 1),
+                             dsm_up.cols(j, later[valid] + 1), 1)
+        res_dsm_recovery.upper[rows] = (dsm_dict['cap-max-up'][key] *
+                                        dsm_dict['delay'][key])
+
+    # global CO2 limit
+    res_global_co2_limit = mm.add_con('res_global_co2_limit', [(None,)],
+                                      ['None'])
+    co2_limit = global_prop.loc['CO2 limit', 'value']
+    if not math.isinf(co2_limit) and co2_limit >= 0:
+        for sit in sites:
+            for var, k, coef in balance_terms(sit, 'CO2'):
+                res_global_co2_limit.add(0, var.cols(k, P), -coef * dt * w)
+        res_global_co2_limit.upper[0] = co2_limit
+    else:
+        res_global_co2_limit.active[0] = False
+
+    return mm
+
+
+def solve_input(prob, solver='glpk', logfile=None):
+    """Solve the input data of a urbs model without Pyomo's problem writer.
+
+    Note that this does not solve the Pyomo model prob itself: the problem
+    is regenerated by the matrix backend from the model's input data
+    (prob._data, timesteps and dt), streamed to an LP file and solved by
+    glpsol or cbc (or solved in memory by HiGHS). Changes made to prob
+    after create_model, e.g. to mutable Params, fixed variables or
+    deactivated constraints, are therefore ignored; use a Pyomo solver for
+    such models. DSM always uses the pairwise formulation.
+
+    The solution is stored as result cache _result in the same format that
+    saveload.create_result_cache produces, with the sets and params of prob,
+    so that save, report and result_figures work as usual. Solution values
+    are not loaded back into the Pyomo variables.
+
+    Args:
+        prob: a urbs model instance, as created by create_model with any
+            backend
+        solver: 'glpk' (default), 'cbc' or 'highs'
+        logfile: (optional) solver log filename
+
+    Returns:
+        prob: the model instance with the result cache attached
+    """
+    if isinstance(prob, MatrixModel):
+        prob.solve(solver, logfile)
+        return prob
+
+    mm = create_matrix_model(prob._data, prob.timesteps, prob.dt.value,
+                             dual=hasattr(prob, 'dual'))
+    mm.solve(solver, logfile)
+    result = mm._result
+    for entity_type in ('set', 'par'):
+        for name in list_entities(prob, entity_type).index:
+            result[name] = get_entity(prob, name)
+    prob._result = result
+    return prob
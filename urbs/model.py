@@ -3,9 +3,12 @@ import pyomo.core as pyomo
 from datetime import datetime
 from .modelhelper import *
 from .input import *
+from .matrixmodel import create_matrix_model
+from .profiling import ModelProfile
 
 
-def create_model(data, timesteps=None, dt=1, dual=False):
+def create_model(data, timesteps=None, dt=1, dual=False, backend='pyomo',
+                 profile=False, dsm=None):
     """Create a pyomo ConcreteModel urbs object from given input data.
 
     Args:
@@ -14,16 +17,49 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         timesteps: optional list of timesteps, default: demand timeseries
         dt: timestep duration in hours (default: 1)
         dual: set True to add dual variables to model (slower); default: False
+        backend: 'pyomo' (default) to build a Pyomo ConcreteModel or 'matrix'
+            to assemble the same problem as sparse coefficient matrices,
+            which is much faster for long timeseries (see urbs.matrixmodel)
+        profile: set True to record the time of each data preparation step
+            and the time, number of indices and nonzeros of each model
+            component in DataFrame m.profile (see urbs.profiling); pyomo
+            backend only. Default: False
+        dsm: DSM formulation, 'compact' (one downshift variable per timestep
+            and a cumulative shift level, i.e. O(T) variables) or 'pairwise'
+            (one downshift variable per pair of timesteps within the delay,
+            O(T * delay) variables). Both allow the same up- and downshifts.
+            Default: 'compact' for the pyomo backend; the matrix backend
+            only supports 'pairwise'. The formulations differ in the index
+            of dsm_down in results: (t, sit, com) for 'compact', shifted
+            timestep pairs (t, t_, sit, com) for 'pairwise'
 
     Returns:
-        a pyomo ConcreteModel object
+        a pyomo ConcreteModel object, or a MatrixModel object if backend is
+        'matrix'
     """
+    if backend == 'matrix':
+        if profile:
+            raise ValueError("Profiling needs backend 'pyomo'")
+        if dsm not in (None, 'pairwise'):
+            raise ValueError("The matrix backend only supports the "
+                             "'pairwise' DSM formulation")
+        return create_matrix_model(data, timesteps, dt, dual)
+    elif backend != 'pyomo':
+        raise ValueError("Unknown backend '{}'".format(backend))
+    if dsm is None:
+        dsm = 'compact'
+    elif dsm not in ('compact', 'pairwise'):
+        raise ValueError("Unknown DSM formulation '{}'".format(dsm))
 
     # Optional
     if not timesteps:
         timesteps = data['demand'].index.tolist()
-    m = pyomo_model_prep(data, timesteps)  # preparing pyomo model
+    model_profile = ModelProfile() if profile else None
+    m = pyomo_model_prep(data, timesteps, model_profile)  # preparing model
+    if profile:
+        model_profile.watch(m)
     m.name = 'urbs'
+    m.dsm_formulation = dsm
     m.created = datetime.now().strftime('%Y%m%dT%H%M')
     m._data = data
 
@@ -55,6 +91,26 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         ordered=True,
         doc='Set of additional DSM time steps')
 
+    # representative periods (cf. urbs.aggregation) and the boundaries of
+    # the original periods they stand for, in chronological order; storage
+    # content is linked across periods at these boundaries
+    if m.tm_period is not None:
+        period = data['period']
+        m.period_order = data['period_order']['period'].tolist()
+        m.period_first = dict(zip(period.index.tolist(),
+                                  period['first'].tolist()))
+        m.period_last = dict(zip(period.index.tolist(),
+                                 period['last'].tolist()))
+        m.period = pyomo.Set(
+            initialize=period.index.tolist(),
+            ordered=True,
+            doc='Set of representative periods')
+        m.original = pyomo.Set(
+            initialize=range(len(m.period_order) + 1),
+            ordered=True,
+            doc='Set of original period boundaries, from the start of the '
+                'first to the end of the last original period')
+
     # site (e.g. north, middle, south...)
     m.sit = pyomo.Set(
         initialize=m.commodity.index.get_level_values('Site').unique(),
@@ -114,15 +170,12 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         within=m.sit*m.com,
         initialize=m.dsm.index,
         doc='Combinations of possible dsm by site, e.g. (Mid, Elec)')
-    m.dsm_down_tuples = pyomo.Set(
-        within=m.tm*m.tm*m.sit*m.com,
-        initialize=[(t, tt, site, commodity)
-                    for (t, tt, site, commodity)
-                    in dsm_down_time_tuples(m.timesteps[1:],
-                                            m.dsm_site_tuples,
-                                            m)],
-        doc='Combinations of possible dsm_down combinations, e.g. '
-            '(5001,5003,Mid,Elec)')
+    if dsm == 'pairwise':
+        m.dsm_down_tuples = pyomo.Set(
+            within=m.tm*m.tm*m.sit*m.com,
+            initialize=m.dsm_windows.tuples(m.dsm_site_tuples),
+            doc='Combinations of possible dsm_down combinations, e.g. '
+                '(5001,5003,Mid,Elec)')
 
     # process tuples for area rule
     m.pro_area_tuples = pyomo.Set(
@@ -151,7 +204,7 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         within=m.sit*m.pro,
         initialize=[(sit, pro)
                     for (sit, pro) in m.pro_tuples
-                    if m.process.loc[sit, pro]['max-grad'] < 1.0 / dt],
+                    if m.process_dict['max-grad'][(sit, pro)] < 1.0 / dt],
         doc='Processes with maximum gradient smaller than timestep length')
 
     # process tuples for partial feature
@@ -205,6 +258,41 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         initialize=commodity_subset(m.com_tuples, 'Env'),
         doc='Commodities that (might) have a maximum creation limit')
 
+    # buy-process -> sell-process pairing, computed once for the symmetry
+    # constraint
+    m.sell_buy_dict = sell_buy_pairs(m.pro_input_tuples, m.pro_output_tuples,
+                                     m.com_sell, m.com_buy)
+    m.pro_sell_buy_tuples = pyomo.Set(
+        within=m.sit*m.pro*m.pro,
+        initialize=sell_buy_tuples(m.pro_tuples, m.pro_input_tuples,
+                                   m.sell_buy_dict, m.com_buy),
+        doc='Buy and equivalent sell processes by site, '
+            'e.g. (South,Purchase,Feed-in)')
+
+    # commodity tuples by type, as index sets of the commodity constraints;
+    # a commodity has a type if it has that type at any site
+    m.com_vertex_tuples = pyomo.Set(
+        within=m.sit*m.com*m.com_type,
+        initialize=[c for c in m.com_tuples
+                    if c[1] not in m.com_env and c[1] not in m.com_supim],
+        doc='Commodities with a vertex rule, i.e. neither Env nor SupIm')
+    m.com_stock_tuples = pyomo.Set(
+        within=m.sit*m.com*m.com_type,
+        initialize=[c for c in m.com_tuples if c[1] in m.com_stock],
+        doc='Stock commodity tuples, e.g. (Mid,Coal,Stock)')
+    m.com_sell_tuples = pyomo.Set(
+        within=m.sit*m.com*m.com_type,
+        initialize=[c for c in m.com_tuples if c[1] in m.com_sell],
+        doc='Sell commodity tuples, e.g. (South,Elec sell,Sell)')
+    m.com_buy_tuples = pyomo.Set(
+        within=m.sit*m.com*m.com_type,
+        initialize=[c for c in m.com_tuples if c[1] in m.com_buy],
+        doc='Buy commodity tuples, e.g. (South,Elec buy,Buy)')
+    m.com_env_tuples = pyomo.Set(
+        within=m.sit*m.com*m.com_type,
+        initialize=[c for c in m.com_tuples if c[1] in m.com_env],
+        doc='Environmental commodity tuples, e.g. (Mid,CO2,Env)')
+
     # Parameters
 
     # weight = length of year (hours) / length of simulation (hours)
@@ -216,6 +304,49 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         initialize=float(8760) / (len(m.tm) * dt),
         doc='Pre-factor for variable costs and emissions for an annual result')
 
+    # per-timestep weights (averaging to m.weight) and predecessors; they
+    # only differ from m.weight and t-1 for representative periods, which
+    # are weighted by their number of occurrences and whose predecessors
+    # stay within the period (cf. urbs.aggregation)
+    m.tm_weight, m.tm_prev = timestep_weights(data, m.timesteps, dt)
+    m.representative_periods = m.tm_period is not None
+    if m.representative_periods:
+        # weight of an original timestep, c.f. timestep_weights
+        m.original_weight = float(8760) / (dt * sum(
+            w * (m.period_last[p] - m.period_first[p] + 1)
+            for p, w in zip(data['period'].index.tolist(),
+                            data['period']['weight'].tolist())))
+
+    # input values which scenarios commonly vary are mutable parameters, so
+    # that a scenario sweep can update them in place instead of rebuilding
+    # the model (cf. urbs.sweep.update_model); commodities without a price
+    # (e.g. demand) are left out, as NaN is not a valid value
+    m.commodity_price = pyomo.Param(
+        m.com_tuples,
+        initialize=dict((c, price) for c, price
+                        in m.commodity_dict['price'].items()
+                        if not math.isnan(price)),
+        within=pyomo.Reals,
+        mutable=True,
+        doc='Commodity price (EUR/MWh or multiplier of buy/sell price)')
+    m.process_cap_lo = pyomo.Param(
+        m.pro_tuples,
+        initialize=m.process_dict['cap-lo'],
+        within=pyomo.Reals,
+        mutable=True,
+        doc='Minimum total process capacity (MW)')
+    m.process_cap_up = pyomo.Param(
+        m.pro_tuples,
+        initialize=m.process_dict['cap-up'],
+        within=pyomo.Reals,
+        mutable=True,
+        doc='Maximum total process capacity (MW)')
+    m.co2_limit = pyomo.Param(
+        initialize=m.global_prop.loc['CO2 limit', 'value'],
+        within=pyomo.Reals,
+        mutable=True,
+        doc='Global CO2 limit (t/a)')
+
     # dt = spacing between timesteps. Required for storage equation that
     # converts between energy (storage content, e_sto_con) and power (all other
     # quantities that start with "e_")
@@ -312,18 +443,46 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         doc='Power flow out of storage (MW) per timestep')
     m.e_sto_con = pyomo.Var(
         m.t, m.sto_tuples,
-        within=pyomo.NonNegativeReals,
-        doc='Energy content of storage (MWh) in timestep')
+        within=(pyomo.Reals if m.representative_periods
+                else pyomo.NonNegativeReals),
+        doc='Energy content of storage (MWh) in timestep; relative to the '
+            'start of the period for representative periods')
+    if m.representative_periods:
+        m.e_sto_con_inter = pyomo.Var(
+            m.original, m.sto_tuples,
+            within=pyomo.NonNegativeReals,
+            doc='Energy content of storage (MWh) at original period '
+                'boundaries')
+        m.e_sto_con_max = pyomo.Var(
+            m.period, m.sto_tuples,
+            within=pyomo.NonNegativeReals,
+            doc='Maximum relative energy content of storage (MWh) within '
+                'representative period')
+        m.e_sto_con_min = pyomo.Var(
+            m.period, m.sto_tuples,
+            within=pyomo.NonPositiveReals,
+            doc='Minimum relative energy content of storage (MWh) within '
+                'representative period')
 
     # demand side management
     m.dsm_up = pyomo.Var(
         m.tm, m.dsm_site_tuples,
         within=pyomo.NonNegativeReals,
         doc='DSM upshift')
-    m.dsm_down = pyomo.Var(
-        m.dsm_down_tuples,
-        within=pyomo.NonNegativeReals,
-        doc='DSM downshift')
+    if dsm == 'pairwise':
+        m.dsm_down = pyomo.Var(
+            m.dsm_down_tuples,
+            within=pyomo.NonNegativeReals,
+            doc='DSM downshift in tt to compensate upshift in t')
+    else:
+        m.dsm_down = pyomo.Var(
+            m.tm, m.dsm_site_tuples,
+            within=pyomo.NonNegativeReals,
+            doc='DSM downshift')
+        m.dsm_shift = pyomo.Var(
+            m.tm, m.dsm_site_tuples,
+            within=pyomo.Reals,
+            doc='Cumulative DSM shift (upshift * efficiency - downshift)')
 
     # Equation declarations
     # equation bodies are defined in separate functions, referred to here by
@@ -331,39 +490,39 @@ def create_model(data, timesteps=None, dt=1, dual=False):
 
     # commodity
     m.res_vertex = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_vertex_tuples,
         rule=res_vertex_rule,
         doc='storage + transmission + process + source + buy - sell == demand')
     m.res_stock_step = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_stock_tuples,
         rule=res_stock_step_rule,
         doc='stock commodity input per step <= commodity.maxperstep')
     m.res_stock_total = pyomo.Constraint(
-        m.com_tuples,
+        m.com_stock_tuples,
         rule=res_stock_total_rule,
         doc='total stock commodity input <= commodity.max')
     m.res_sell_step = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_sell_tuples,
         rule=res_sell_step_rule,
         doc='sell commodity output per step <= commodity.maxperstep')
     m.res_sell_total = pyomo.Constraint(
-        m.com_tuples,
+        m.com_sell_tuples,
         rule=res_sell_total_rule,
         doc='total sell commodity output <= commodity.max')
     m.res_buy_step = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_buy_tuples,
         rule=res_buy_step_rule,
         doc='buy commodity output per step <= commodity.maxperstep')
     m.res_buy_total = pyomo.Constraint(
-        m.com_tuples,
+        m.com_buy_tuples,
         rule=res_buy_total_rule,
         doc='total buy commodity output <= commodity.max')
     m.res_env_step = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_env_tuples,
         rule=res_env_step_rule,
         doc='environmental output per step <= commodity.maxperstep')
     m.res_env_total = pyomo.Constraint(
-        m.com_tuples,
+        m.com_env_tuples,
         rule=res_env_total_rule,
         doc='total environmental commodity output <= commodity.max')
 
@@ -407,7 +566,7 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         doc='used process area <= total process area')
 
     m.res_sell_buy_symmetry = pyomo.Constraint(
-        m.pro_input_tuples,
+        m.pro_sell_buy_tuples,
         rule=res_sell_buy_symmetry_rule,
         doc='power connection capacity must be symmetric in both directions')
 
@@ -488,6 +647,35 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         m.t, m.sto_tuples,
         rule=res_initial_and_final_storage_state_rule,
         doc='storage content initial == and final >= storage.init * capacity')
+    if m.representative_periods:
+        m.def_storage_state_inter = pyomo.Constraint(
+            m.original, m.sto_tuples,
+            rule=def_storage_state_inter_rule,
+            doc='storage[o+1] = storage[o] * (1 - discharge)^period length '
+                '+ storage[end of period of o]')
+        m.res_storage_state_max = pyomo.Constraint(
+            m.tm, m.sto_tuples,
+            rule=res_storage_state_max_rule,
+            doc='storage content <= maximum storage content of period')
+        m.res_storage_state_min = pyomo.Constraint(
+            m.tm, m.sto_tuples,
+            rule=res_storage_state_min_rule,
+            doc='storage content >= minimum storage content of period')
+        m.res_storage_state_inter_by_capacity = pyomo.Constraint(
+            m.original, m.sto_tuples,
+            rule=res_storage_state_inter_by_capacity_rule,
+            doc='storage[o] + maximum storage content of period '
+                '<= storage capacity')
+        m.res_storage_state_inter_minimum = pyomo.Constraint(
+            m.original, m.sto_tuples,
+            rule=res_storage_state_inter_minimum_rule,
+            doc='storage[o] * (1 - discharge)^period length + minimum '
+                'storage content of period >= 0')
+        m.res_initial_and_final_storage_state_inter = pyomo.Constraint(
+            m.original, m.sto_tuples,
+            rule=res_initial_and_final_storage_state_inter_rule,
+            doc='storage[first] == and storage[last] >= '
+                'storage.init * capacity')
 
     # costs
     m.def_costs = pyomo.Constraint(
@@ -500,10 +688,26 @@ def create_model(data, timesteps=None, dt=1, dual=False):
         doc='minimize(cost = sum of all cost types)')
 
     # demand side management
-    m.def_dsm_variables = pyomo.Constraint(
-        m.tm, m.dsm_site_tuples,
-        rule=def_dsm_variables_rule,
-        doc='DSMup * efficiency factor n == DSMdo')
+    if dsm == 'pairwise':
+        m.def_dsm_variables = pyomo.Constraint(
+            m.tm, m.dsm_site_tuples,
+            rule=def_dsm_variables_rule,
+            doc='DSMup * efficiency factor n == DSMdo')
+    else:
+        m.def_dsm_shift = pyomo.Constraint(
+            m.tm, m.dsm_site_tuples,
+            rule=def_dsm_shift_rule,
+            doc='DSMshift = DSMshift(t-1) + DSMup * efficiency - DSMdo')
+
+        m.res_dsm_delay_up = pyomo.Constraint(
+            m.tm, m.dsm_site_tuples,
+            rule=res_dsm_delay_up_rule,
+            doc='DSMshift <= DSMdo(t+1, t + delay time L)')
+
+        m.res_dsm_delay_down = pyomo.Constraint(
+            m.tm, m.dsm_site_tuples,
+            rule=res_dsm_delay_down_rule,
+            doc='-DSMshift <= DSMup(t+1, t + delay time L) * efficiency')
 
     m.res_dsm_upward = pyomo.Constraint(
         m.tm, m.dsm_site_tuples,
@@ -531,6 +735,11 @@ def create_model(data, timesteps=None, dt=1, dual=False):
 
     if dual:
         m.dual = pyomo.Suffix(direction=pyomo.Suffix.IMPORT)
+
+    if profile:
+        model_profile.unwatch(m)
+        model_profile.count(m)
+        m.profile = model_profile.to_frame()
     return m
 
 
@@ -541,14 +750,10 @@ def create_model(data, timesteps=None, dt=1, dual=False):
 # vertex equation: calculate balance for given commodity and site;
 # contains implicit constraints for process activity, import/export and
 # storage activity (calculated by function commodity_balance);
-# contains implicit constraint for stock commodity source term
+# contains implicit constraint for stock commodity source term;
+# environmental and supim commodities don't have this constraint (yet), so it
+# is only defined over m.com_vertex_tuples
 def res_vertex_rule(m, tm, sit, com, com_type):
-    # environmental or supim commodities don't have this constraint (yet)
-    if com in m.com_env:
-        return pyomo.Constraint.Skip
-    if com in m.com_supim:
-        return pyomo.Constraint.Skip
-
     # helper function commodity_balance calculates balance from input to
     # and output from processes, storage and transmission.
     # if power_surplus > 0: production/storage/imports create net positive
@@ -584,22 +789,62 @@ def res_vertex_rule(m, tm, sit, com, com_type):
     # upshifted demand and increased by the downshifted demand.
     if (sit, com) in m.dsm_site_tuples:
         power_surplus -= m.dsm_up[tm, sit, com]
-        power_surplus += sum(m.dsm_down[t, tm, sit, com]
-                             for t in dsm_time_tuples(
-                                 tm, m.timesteps[1:],
-                                 m.dsm_dict['delay'][(sit, com)]))
+        power_surplus += dsm_down_sum(m, tm, sit, com)
     return power_surplus == 0
 
 # demand side management (DSM) constraints
+#
+# In the pairwise formulation, dsm_down[t, tt, sit, com] is the downshift in
+# tt that compensates the upshift in t, for all tt within the delay of t.
+# The compact formulation only has the total downshift dsm_down[tt, sit, com]
+# of each timestep and tracks the cumulative shift dsm_shift (upshift times
+# efficiency minus downshift so far). Upshifts and downshifts can be paired
+# within the delay if, and only if, the upshift of the timesteps up to t is
+# compensated by the downshift up to t + delay and vice versa, i.e.
+#
+#     dsm_shift[t] <= sum(dsm_down[tt] for tt in (t, t + delay])
+#    -dsm_shift[t] <= sum(dsm_up[tt] * eff for tt in (t, t + delay])
+#
+# which includes dsm_shift == 0 in the last timestep.
+
+
+def dsm_down_sum(m, tm, sit, com):
+    """Total DSM downshift in timestep tm, in either formulation."""
+    if m.dsm_formulation == 'compact':
+        return m.dsm_down[tm, sit, com]
+    return sum(m.dsm_down[t, tm, sit, com]
+               for t in m.dsm_windows.delay(tm, sit, com))
+
+
+# DSMshift = DSMshift(t-1) + DSMup * efficiency - DSMdo
+def def_dsm_shift_rule(m, tm, sit, com):
+    shift = (m.dsm_up[tm, sit, com] * m.dsm_dict['eff'][(sit, com)] -
+             m.dsm_down[tm, sit, com])
+    previous = m.dsm_windows.previous(tm)
+    if previous is not None:
+        shift += m.dsm_shift[previous, sit, com]
+    return m.dsm_shift[tm, sit, com] == shift
+
+
+# DSMshift <= DSMdo(t+1, t + delay time L)
+def res_dsm_delay_up_rule(m, tm, sit, com):
+    return (m.dsm_shift[tm, sit, com] <=
+            sum(m.dsm_down[t, sit, com]
+                for t in m.dsm_windows.later(tm, sit, com)))
+
+
+# -DSMshift <= DSMup(t+1, t + delay time L) * efficiency
+def res_dsm_delay_down_rule(m, tm, sit, com):
+    return (-m.dsm_shift[tm, sit, com] <=
+            sum(m.dsm_up[t, sit, com]
+                for t in m.dsm_windows.later(tm, sit, com)) *
+            m.dsm_dict['eff'][(sit, com)])
 
 
 # DSMup == DSMdo * efficiency factor n
 def def_dsm_variables_rule(m, tm, sit, com):
-    dsm_down_sum = 0
-    for tt in dsm_time_tuples(tm,
-                              m.timesteps[1:],
-                              m.dsm_dict['delay'][(sit, com)]):
-        dsm_down_sum += m.dsm_down[tm, tt, sit, com]
+    dsm_down_sum = sum(m.dsm_down[tm, tt, sit, com]
+                       for tt in m.dsm_windows.delay(tm, sit, com))
     return dsm_down_sum == (m.dsm_up[tm, sit, com] *
                             m.dsm_dict['eff'][(sit, com)])
 
@@ -611,34 +856,22 @@ def res_dsm_upward_rule(m, tm, sit, com):
 
 # DSMdo <= Cdo (threshold capacity of DSMdo)
 def res_dsm_downward_rule(m, tm, sit, com):
-    dsm_down_sum = 0
-    for t in dsm_time_tuples(tm,
-                             m.timesteps[1:],
-                             m.dsm_dict['delay'][(sit, com)]):
-        dsm_down_sum += m.dsm_down[t, tm, sit, com]
-    return dsm_down_sum <= m.dsm_dict['cap-max-do'][(sit, com)]
+    return (dsm_down_sum(m, tm, sit, com) <=
+            m.dsm_dict['cap-max-do'][(sit, com)])
 
 
 # DSMup + DSMdo <= max(Cup,Cdo)
 def res_dsm_maximum_rule(m, tm, sit, com):
-    dsm_down_sum = 0
-    for t in dsm_time_tuples(tm,
-                             m.timesteps[1:],
-                             m.dsm_dict['delay'][(sit, com)]):
-        dsm_down_sum += m.dsm_down[t, tm, sit, com]
-
     max_dsm_limit = max(m.dsm_dict['cap-max-up'][(sit, com)],
                         m.dsm_dict['cap-max-do'][(sit, com)])
-    return m.dsm_up[tm, sit, com] + dsm_down_sum <= max_dsm_limit
+    return (m.dsm_up[tm, sit, com] + dsm_down_sum(m, tm, sit, com) <=
+            max_dsm_limit)
 
 
 # DSMup(t, t + recovery time R) <= Cup * delay time L
 def res_dsm_recovery_rule(m, tm, sit, com):
-    dsm_up_sum = 0
-    for t in dsm_recovery(tm,
-                          m.timesteps[1:],
-                          m.dsm_dict['recov'][(sit, com)]):
-        dsm_up_sum += m.dsm_up[t, sit, com]
+    dsm_up_sum = sum(m.dsm_up[t, sit, com]
+                     for t in m.dsm_windows.recovery(tm, sit, com))
     return dsm_up_sum <= (m.dsm_dict['cap-max-up'][(sit, com)] *
                           m.dsm_dict['delay'][(sit, com)])
 
@@ -647,77 +880,59 @@ def res_dsm_recovery_rule(m, tm, sit, com):
 # commodity_balance of current (time step, site, commodity);
 # limit stock commodity use per time step
 def res_stock_step_rule(m, tm, sit, com, com_type):
-    if com not in m.com_stock:
-        return pyomo.Constraint.Skip
-    else:
-        return (m.e_co_stock[tm, sit, com, com_type] <=
-                m.commodity_dict['maxperstep'][(sit, com, com_type)])
+    return (m.e_co_stock[tm, sit, com, com_type] <=
+            m.commodity_dict['maxperstep'][(sit, com, com_type)])
 
 
 # limit stock commodity use in total (scaled to annual consumption, thanks
-# to m.weight)
+# to m.tm_weight)
 def res_stock_total_rule(m, sit, com, com_type):
-    if com not in m.com_stock:
-        return pyomo.Constraint.Skip
-    else:
-        # calculate total consumption of commodity com
-        total_consumption = 0
-        for tm in m.tm:
-            total_consumption += (
-                m.e_co_stock[tm, sit, com, com_type] * m.dt)
-        total_consumption *= m.weight
-        return (total_consumption <=
-                m.commodity_dict['max'][(sit, com, com_type)])
+    # calculate total consumption of commodity com
+    total_consumption = 0
+    for tm in m.tm:
+        total_consumption += (
+            m.e_co_stock[tm, sit, com, com_type] * m.dt *
+            m.tm_weight[tm])
+    return (total_consumption <=
+            m.commodity_dict['max'][(sit, com, com_type)])
 
 
 # limit sell commodity use per time step
 def res_sell_step_rule(m, tm, sit, com, com_type):
-    if com not in m.com_sell:
-        return pyomo.Constraint.Skip
-    else:
-        return (m.e_co_sell[tm, sit, com, com_type] <=
-                m.commodity_dict['maxperstep'][(sit, com, com_type)])
+    return (m.e_co_sell[tm, sit, com, com_type] <=
+            m.commodity_dict['maxperstep'][(sit, com, com_type)])
 
 
 # limit sell commodity use in total (scaled to annual consumption, thanks
-# to m.weight)
+# to m.tm_weight)
 def res_sell_total_rule(m, sit, com, com_type):
-    if com not in m.com_sell:
-        return pyomo.Constraint.Skip
-    else:
-        # calculate total sale of commodity com
-        total_consumption = 0
-        for tm in m.tm:
-            total_consumption += (
-                m.e_co_sell[tm, sit, com, com_type] * m.dt)
-        total_consumption *= m.weight
-        return (total_consumption <=
-                m.commodity_dict['max'][(sit, com, com_type)])
+    # calculate total sale of commodity com
+    total_consumption = 0
+    for tm in m.tm:
+        total_consumption += (
+            m.e_co_sell[tm, sit, com, com_type] * m.dt *
+            m.tm_weight[tm])
+    return (total_consumption <=
+            m.commodity_dict['max'][(sit, com, com_type)])
 
 
 # limit buy commodity use per time step
 def res_buy_step_rule(m, tm, sit, com, com_type):
-    if com not in m.com_buy:
-        return pyomo.Constraint.Skip
-    else:
-        return (m.e_co_buy[tm, sit, com, com_type] <=
-                m.commodity_dict['maxperstep'][(sit, com, com_type)])
+    return (m.e_co_buy[tm, sit, com, com_type] <=
+            m.commodity_dict['maxperstep'][(sit, com, com_type)])
 
 
 # limit buy commodity use in total (scaled to annual consumption, thanks
-# to m.weight)
+# to m.tm_weight)
 def res_buy_total_rule(m, sit, com, com_type):
-    if com not in m.com_buy:
-        return pyomo.Constraint.Skip
-    else:
-        # calculate total sale of commodity com
-        total_consumption = 0
-        for tm in m.tm:
-            total_consumption += (
-                m.e_co_buy[tm, sit, com, com_type] * m.dt)
-        total_consumption *= m.weight
-        return (total_consumption <=
-                m.commodity_dict['max'][(sit, com, com_type)])
+    # calculate total sale of commodity com
+    total_consumption = 0
+    for tm in m.tm:
+        total_consumption += (
+            m.e_co_buy[tm, sit, com, com_type] * m.dt *
+            m.tm_weight[tm])
+    return (total_consumption <=
+            m.commodity_dict['max'][(sit, com, com_type)])
 
 
 # environmental commodity creation == - commodity_balance of that commodity
@@ -725,27 +940,21 @@ def res_buy_total_rule(m, sit, com, com_type):
 # any process activity;
 # limit environmental commodity output per time step
 def res_env_step_rule(m, tm, sit, com, com_type):
-    if com not in m.com_env:
-        return pyomo.Constraint.Skip
-    else:
-        environmental_output = - commodity_balance(m, tm, sit, com)
-        return (environmental_output <=
-                m.commodity_dict['maxperstep'][(sit, com, com_type)])
+    environmental_output = - commodity_balance(m, tm, sit, com)
+    return (environmental_output <=
+            m.commodity_dict['maxperstep'][(sit, com, com_type)])
 
 
 # limit environmental commodity output in total (scaled to annual
-# emissions, thanks to m.weight)
+# emissions, thanks to m.tm_weight)
 def res_env_total_rule(m, sit, com, com_type):
-    if com not in m.com_env:
-        return pyomo.Constraint.Skip
-    else:
-        # calculate total creation of environmental commodity com
-        env_output_sum = 0
-        for tm in m.tm:
-            env_output_sum += (- commodity_balance(m, tm, sit, com) * m.dt)
-        env_output_sum *= m.weight
-        return (env_output_sum <=
-                m.commodity_dict['max'][(sit, com, com_type)])
+    # calculate total creation of environmental commodity com
+    env_output_sum = 0
+    for tm in m.tm:
+        env_output_sum += (- commodity_balance(m, tm, sit, com) * m.dt *
+                           m.tm_weight[tm])
+    return (env_output_sum <=
+            m.commodity_dict['max'][(sit, com, com_type)])
 
 # process
 
@@ -784,13 +993,13 @@ def res_process_throughput_by_capacity_rule(m, tm, sit, pro):
 
 
 def res_process_maxgrad_lower_rule(m, t, sit, pro):
-    return (m.tau_pro[t-1, sit, pro] -
+    return (m.tau_pro[m.tm_prev[t], sit, pro] -
             m.cap_pro[sit, pro] * m.process_dict['max-grad'][(sit, pro)] *
             m.dt <= m.tau_pro[t, sit, pro])
 
 
 def res_process_maxgrad_upper_rule(m, t, sit, pro):
-    return (m.tau_pro[t-1, sit, pro] +
+    return (m.tau_pro[m.tm_prev[t], sit, pro] +
             m.cap_pro[sit, pro] * m.process_dict['max-grad'][(sit, pro)] *
             m.dt >= m.tau_pro[t, sit, pro])
 
@@ -803,7 +1012,7 @@ def res_throughput_by_capacity_min_rule(m, tm, sit, pro):
 
 def def_partial_process_input_rule(m, tm, sit, pro, coin):
     R = m.r_in_dict[(pro, coin)]  # input ratio at maximum operation point
-    r = m.r_in_min_fraction[pro, coin]  # input ratio at lowest
+    r = m.r_in_min_fraction_dict[(pro, coin)]  # input ratio at lowest
     # operation point
     min_fraction = m.process_dict['min-fraction'][(sit, pro)]
 
@@ -816,8 +1025,9 @@ def def_partial_process_input_rule(m, tm, sit, pro, coin):
 
 
 def def_partial_process_output_rule(m, tm, sit, pro, coo):
-    R = m.r_out.loc[pro, coo]  # input ratio at maximum operation point
-    r = m.r_out_min_fraction[pro, coo]  # input ratio at lowest operation point
+    R = m.r_out_dict[(pro, coo)]  # input ratio at maximum operation point
+    # input ratio at lowest operation point
+    r = m.r_out_min_fraction_dict[(pro, coo)]
     min_fraction = m.process_dict['min-fraction'][(sit, pro)]
 
     online_factor = min_fraction * (r - R) / (1 - min_fraction)
@@ -830,39 +1040,30 @@ def def_partial_process_output_rule(m, tm, sit, pro, coo):
 
 # lower bound <= process capacity <= upper bound
 def res_process_capacity_rule(m, sit, pro):
-    return (m.process_dict['cap-lo'][sit, pro],
+    return (m.process_cap_lo[sit, pro],
             m.cap_pro[sit, pro],
-            m.process_dict['cap-up'][sit, pro])
+            m.process_cap_up[sit, pro])
 
 
 # used process area <= maximal process area
 def res_area_rule(m, sit):
-    if m.site.loc[sit]['area'] >= 0 and sum(
-                         m.process.loc[(s, p), 'area-per-cap']
+    if m.site_dict['area'][sit] >= 0 and sum(
+                         m.process_dict['area-per-cap'][(s, p)]
                          for (s, p) in m.pro_area_tuples
                          if s == sit) > 0:
         total_area = sum(m.cap_pro[s, p] *
-                         m.process.loc[(s, p), 'area-per-cap']
+                         m.process_dict['area-per-cap'][(s, p)]
                          for (s, p) in m.pro_area_tuples
                          if s == sit)
-        return total_area <= m.site.loc[sit]['area']
+        return total_area <= m.site_dict['area'][sit]
     else:
         # Skip constraint, if area is not numeric
         return pyomo.Constraint.Skip
 
 
 # power connection capacity: Sell == Buy
-def res_sell_buy_symmetry_rule(m, sit_in, pro_in, coin):
-    # constraint only for sell and buy processes
-    # and the processes must be in the same site
-    if coin in m.com_buy:
-        sell_pro = search_sell_buy_tuple(m, sit_in, pro_in, coin)
-        if sell_pro is None:
-            return pyomo.Constraint.Skip
-        else:
-            return (m.cap_pro[sit_in, pro_in] == m.cap_pro[sit_in, sell_pro])
-    else:
-        return pyomo.Constraint.Skip
+def res_sell_buy_symmetry_rule(m, sit, pro_buy, pro_sell):
+    return (m.cap_pro[sit, pro_buy] == m.cap_pro[sit, pro_sell])
 
 
 # transmission
@@ -904,9 +1105,16 @@ def res_transmission_symmetry_rule(m, sin, sout, tra, com):
 # storage content in timestep [t] == storage content[t-1] * (1-discharge)
 # + newly stored energy * input efficiency
 # - retrieved energy / output efficiency
+# for representative periods, storage content is relative to the start of
+# the period, i.e. storage content[t-1] is 0 in the first timestep
 def def_storage_state_rule(m, t, sit, sto, com):
+    if (m.representative_periods and
+            t == m.period_first[m.tm_period[t]]):
+        previous = 0
+    else:
+        previous = m.e_sto_con[m.tm_prev[t], sit, sto, com]
     return (m.e_sto_con[t, sit, sto, com] ==
-            m.e_sto_con[t-1, sit, sto, com] *
+            previous *
             (1 - m.storage_dict['discharge'][(sit, sto, com)]) +
             m.e_sto_in[t, sit, sto, com] *
             m.storage_dict['eff-in'][(sit, sto, com)] * m.dt -
@@ -961,7 +1169,14 @@ def res_storage_capacity_rule(m, sit, sto, com):
 # forced minimun  storage content in final timestep t[len(m.t)]
 # content[t=1] == storage capacity * fraction <= content[t=final]
 def res_initial_and_final_storage_state_rule(m, t, sit, sto, com):
-    if t == m.t[1]:  # first timestep (Pyomo uses 1-based indexing)
+    if m.representative_periods:
+        # storage content is relative to the start of each period; the
+        # initial and final content are those at the original period
+        # boundaries (c.f. res_initial_and_final_storage_state_inter_rule)
+        if t == m.t[1]:
+            return m.e_sto_con[t, sit, sto, com] == 0
+        return pyomo.Constraint.Skip
+    elif t == m.t[1]:  # first timestep (Pyomo uses 1-based indexing)
         return (m.e_sto_con[t, sit, sto, com] ==
                 m.cap_sto_c[sit, sto, com] *
                 m.storage_dict['init'][(sit, sto, com)])
@@ -973,22 +1188,115 @@ def res_initial_and_final_storage_state_rule(m, t, sit, sto, com):
         return pyomo.Constraint.Skip
 
 
+# storage across representative periods
+#
+# The absolute storage content in timestep k of original period o is
+#
+#     e_sto_con_inter[o] * (1 - discharge)^k + e_sto_con[k of period of o]
+#
+# with the relative content e_sto_con of its representative period. It is
+# kept within [0, capacity] by bounding the relative content of each period
+# by e_sto_con_min and e_sto_con_max (exact for storages without discharge).
+
+
+def storage_period_decay(m, p, sit, sto, com):
+    """Remaining fraction of a storage content after period p."""
+    length = m.period_last[p] - m.period_first[p] + 1
+    return (1 - m.storage_dict['discharge'][(sit, sto, com)]) ** length
+
+
+# storage[o+1] = storage[o] * (1 - discharge)^length + storage change of
+# the representative period of o
+def def_storage_state_inter_rule(m, o, sit, sto, com):
+    if o == len(m.period_order):
+        return pyomo.Constraint.Skip
+    p = m.period_order[o]
+    return (m.e_sto_con_inter[o + 1, sit, sto, com] ==
+            m.e_sto_con_inter[o, sit, sto, com] *
+            storage_period_decay(m, p, sit, sto, com) +
+            m.e_sto_con[m.period_last[p], sit, sto, com])
+
+
+# relative storage content <= maximum relative content of period
+def res_storage_state_max_rule(m, t, sit, sto, com):
+    return (m.e_sto_con[t, sit, sto, com] <=
+            m.e_sto_con_max[m.tm_period[t], sit, sto, com])
+
+
+# relative storage content >= minimum relative content of period
+def res_storage_state_min_rule(m, t, sit, sto, com):
+    return (m.e_sto_con[t, sit, sto, com] >=
+            m.e_sto_con_min[m.tm_period[t], sit, sto, com])
+
+
+# storage[o] + maximum relative content of period <= storage capacity
+def res_storage_state_inter_by_capacity_rule(m, o, sit, sto, com):
+    content = m.e_sto_con_inter[o, sit, sto, com]
+    if o < len(m.period_order):
+        content += m.e_sto_con_max[m.period_order[o], sit, sto, com]
+    return content <= m.cap_sto_c[sit, sto, com]
+
+
+# storage[o] * (1 - discharge)^length + minimum relative content >= 0
+def res_storage_state_inter_minimum_rule(m, o, sit, sto, com):
+    if o == len(m.period_order):
+        return pyomo.Constraint.Skip
+    p = m.period_order[o]
+    return (m.e_sto_con_inter[o, sit, sto, com] *
+            storage_period_decay(m, p, sit, sto, com) +
+            m.e_sto_con_min[p, sit, sto, com] >= 0)
+
+
+# content[start of first original period] == storage capacity * fraction
+# <= content[end of last original period]
+def res_initial_and_final_storage_state_inter_rule(m, o, sit, sto, com):
+    if o == 0:
+        return (m.e_sto_con_inter[o, sit, sto, com] ==
+                m.cap_sto_c[sit, sto, com] *
+                m.storage_dict['init'][(sit, sto, com)])
+    elif o == len(m.period_order):
+        return (m.e_sto_con_inter[o, sit, sto, com] >=
+                m.cap_sto_c[sit, sto, com] *
+                m.storage_dict['init'][(sit, sto, com)])
+    else:
+        return pyomo.Constraint.Skip
+
+
+def storage_inter_content_costs(m):
+    """Variable costs of the storage content at the start of all original
+    periods, which is added to the relative content e_sto_con of every
+    timestep k of the period with decay (1 - discharge)^k. Zero without
+    representative periods."""
+    if not m.representative_periods:
+        return 0
+    costs = 0
+    for o, p in enumerate(m.period_order):
+        length = m.period_last[p] - m.period_first[p] + 1
+        for s in m.sto_tuples:
+            if not m.storage_dict['var-cost-c'][s]:
+                continue
+            decay = 1 - m.storage_dict['discharge'][s]
+            costs += (m.e_sto_con_inter[(o,) + s] * m.original_weight *
+                      m.storage_dict['var-cost-c'][s] *
+                      sum(decay ** k for k in range(1, length + 1)))
+    return costs
+
+
 # total CO2 output <= Global CO2 limit
 def res_global_co2_limit_rule(m):
-    if math.isinf(m.global_prop.loc['CO2 limit', 'value']):
+    if math.isinf(pyomo.value(m.co2_limit)):
         return pyomo.Constraint.Skip
-    elif m.global_prop.loc['CO2 limit', 'value'] >= 0:
+    elif pyomo.value(m.co2_limit) >= 0:
         co2_output_sum = 0
         for tm in m.tm:
             for sit in m.sit:
                 # minus because negative commodity_balance represents creation
                 # of that commodity.
+                # scaling to annual output (cf. definition of m.weight)
                 co2_output_sum += (- commodity_balance(m, tm, sit, 'CO2') *
-                                   m.dt)
+                                   m.dt * m.tm_weight[tm])
 
-        # scaling to annual output (cf. definition of m.weight)
-        co2_output_sum *= m.weight
-        return (co2_output_sum <= m.global_prop.loc['CO2 limit', 'value'])
+        return (co2_output_sum <= m.co2_limit)
     else:
         return pyomo.Constraint.Skip
 
@@ -1042,73 +1350,68 @@ def def_costs_rule(m, cost_type):
 
     elif cost_type == 'Variable':
         return m.costs[cost_type] == \
-            sum(m.tau_pro[(tm,) + p] * m.dt * m.weight *
+            sum(m.tau_pro[(tm,) + p] * m.dt * m.tm_weight[tm] *
                 m.process_dict['var-cost'][p]
                 for tm in m.tm
                 for p in m.pro_tuples) + \
-            sum(m.e_tra_in[(tm,) + t] * m.dt * m.weight *
+            sum(m.e_tra_in[(tm,) + t] * m.dt * m.tm_weight[tm] *
                 m.transmission_dict['var-cost'][t]
                 for tm in m.tm
                 for t in m.tra_tuples) + \
-            sum(m.e_sto_con[(tm,) + s] * m.weight *
+            sum(m.e_sto_con[(tm,) + s] * m.tm_weight[tm] *
                 m.storage_dict['var-cost-c'][s] +
-                m.dt * m.weight *
+                m.dt * m.tm_weight[tm] *
                 (m.e_sto_in[(tm,) + s] + m.e_sto_out[(tm,) + s]) *
                 m.storage_dict['var-cost-p'][s]
                 for tm in m.tm
-                for s in m.sto_tuples)
+                for s in m.sto_tuples) + \
+            storage_inter_content_costs(m)
 
     elif cost_type == 'Fuel':
         return m.costs[cost_type] == sum(
-            m.e_co_stock[(tm,) + c] * m.dt * m.weight *
-            m.commodity_dict['price'][c]
-            for tm in m.tm for c in m.com_tuples
-            if c[1] in m.com_stock)
+            m.e_co_stock[(tm,) + c] * m.dt * m.tm_weight[tm] *
+            m.commodity_price[c]
+            for tm in m.tm for c in m.com_stock_tuples)
 
     elif cost_type == 'Revenue':
-        sell_tuples = commodity_subset(m.com_tuples, m.com_sell)
-
         try:
             return m.costs[cost_type] == -sum(
-                m.e_co_sell[(tm,) + c] * m.weight * m.dt *
+                m.e_co_sell[(tm,) + c] * m.tm_weight[tm] * m.dt *
                 m.buy_sell_price_dict[c[1], ][tm] *
-                m.commodity_dict['price'][c]
+                m.commodity_price[c]
                 for tm in m.tm
-                for c in sell_tuples)
+                for c in m.com_sell_tuples)
         except KeyError:
             return m.costs[cost_type] == -sum(
-                m.e_co_sell[(tm,) + c] * m.weight * m.dt *
+                m.e_co_sell[(tm,) + c] * m.tm_weight[tm] * m.dt *
                 m.buy_sell_price_dict[c[1]][tm] *
-                m.commodity_dict['price'][c]
+                m.commodity_price[c]
                 for tm in m.tm
-                for c in sell_tuples)
+                for c in m.com_sell_tuples)
 
     elif cost_type == 'Purchase':
-        buy_tuples = commodity_subset(m.com_tuples, m.com_buy)
-
         try:
             return m.costs[cost_type] == sum(
-                m.e_co_buy[(tm,) + c] * m.weight * m.dt *
+                m.e_co_buy[(tm,) + c] * m.tm_weight[tm] * m.dt *
                 m.buy_sell_price_dict[c[1], ][tm] *
-                m.commodity_dict['price'][c]
+                m.commodity_price[c]
                 for tm in m.tm
-                for c in buy_tuples)
+                for c in m.com_buy_tuples)
         except KeyError:
             return m.costs[cost_type] == sum(
-                m.e_co_buy[(tm,) + c] * m.weight * m.dt *
+                m.e_co_buy[(tm,) + c] * m.tm_weight[tm] * m.dt *
                 m.buy_sell_price_dict[c[1]][tm] *
-                m.commodity_dict['price'][c]
+                m.commodity_price[c]
                 for tm in m.tm
-                for c in buy_tuples)
+                for c in m.com_buy_tuples)
 
     elif cost_type == 'Environmental':
         return m.costs[cost_type] == sum(
             - commodity_balance(m, tm, sit, com) *
-            m.weight * m.dt *
-            m.commodity_dict['price'][(sit, com, com_type)]
+            m.tm_weight[tm] * m.dt *
+            m.commodity_price[(sit, com, com_type)]
             for tm in m.tm
-            for sit, com, com_type in m.com_tuples
-            if com in m.com_env)
+            for sit, com, com_type in m.com_env_tuples)
 
     else:
         raise NotImplementedError("Unknown cost type.")
@@ -1,4 +1,4 @@
-import pandas as pd
+import numpy as np
 
 
 def annuity_factor(n, i):
@@ -31,6 +31,11 @@ def commodity_balance(m, tm, sit, com):
     (from process/storage/transmission, counts negative) power. Used as helper
     function in create_model for constraints on demand and stock commodities.
 
+    The processes, transmissions and storages that touch (sit, com) are
+    looked up in the precomputed incidence index m.com_incidence (see
+    function commodity_incidence) instead of being searched for on every
+    call.
+
     Args:
         m: the model object
         tm: the timestep
@@ -41,110 +46,244 @@ def commodity_balance(m, tm, sit, com):
         balance: net value of consumed (positive) or provided (negative) power
 
     """
+    incidence = m.com_incidence.get((sit, com))
+    if incidence is None:
+        # commodity is neither produced, consumed, transported nor stored
+        # at this site
+        return 0
+
     balance = (sum(m.e_pro_in[(tm, site, process, com)]
                    # usage as input for process increases balance
-                   for site, process in m.pro_tuples
-                   if site == sit and (process, com) in m.r_in_dict)
+                   for site, process in incidence['pro_in'])
                - sum(m.e_pro_out[(tm, site, process, com)]
                      # output from processes decreases balance
-                     for site, process in m.pro_tuples
-                     if site == sit and (process, com) in m.r_out_dict)
-               + sum(m.e_tra_in[(tm, site_in, site_out, transmission, com)]
+                     for site, process in incidence['pro_out'])
+               + sum(m.e_tra_in[(tm,) + tra_tuple]
                      # exports increase balance
-                     for site_in, site_out, transmission, commodity
-                     in m.tra_tuples
-                     if site_in == sit and commodity == com)
-               - sum(m.e_tra_out[(tm, site_in, site_out, transmission, com)]
+                     for tra_tuple in incidence['tra_export'])
+               - sum(m.e_tra_out[(tm,) + tra_tuple]
                      # imports decrease balance
-                     for site_in, site_out, transmission, commodity
-                     in m.tra_tuples
-                     if site_out == sit and commodity == com)
-               + sum(m.e_sto_in[(tm, site, storage, com)] -
-                     m.e_sto_out[(tm, site, storage, com)]
+                     for tra_tuple in incidence['tra_import'])
+               + sum(m.e_sto_in[(tm,) + sto_tuple] -
+                     m.e_sto_out[(tm,) + sto_tuple]
                      # usage as input for storage increases consumption
                      # output from storage decreases consumption
-                     for site, storage, commodity in m.sto_tuples
-                     if site == sit and commodity == com))
+                     for sto_tuple in incidence['sto']))
     return balance
 
 
-def dsm_down_time_tuples(time, sit_com_tuple, m):
-    """ Dictionary for the two time instances of DSM_down
+def commodity_incidence(process, r_in, r_out, transmission, storage):
+    """Index processes, transmissions and storages by (site, commodity).
 
+    Builds, in one pass over the input DataFrames, the lookup table that
+    commodity_balance uses to find all terms of the balance of a commodity
+    at a site without scanning all process, transmission and storage tuples.
 
     Args:
-        time: list with time indices
-        sit_com_tuple: a list of (site, commodity) tuples
-        m: model instance
+        process: process DataFrame with index (Site, Process)
+        r_in: Series of process input ratios with index (Process, Commodity)
+        r_out: Series of process output ratios with index (Process, Commodity)
+        transmission: transmission DataFrame with index
+            (Site In, Site Out, Transmission, Commodity)
+        storage: storage DataFrame with index (Site, Storage, Commodity)
 
     Returns:
-        A list of possible time tuples depending on site and commodity
+        a dict (site, commodity) -> dict with the keys
+        'pro_in': list of (site, process) consuming the commodity,
+        'pro_out': list of (site, process) producing the commodity,
+        'tra_export': list of transmission tuples leaving the site,
+        'tra_import': list of transmission tuples entering the site and
+        'sto': list of (site, storage, commodity) storage tuples.
     """
-    if m.dsm.empty:
-        return []
-
-    delay = m.dsm['delay']
-    ub = max(time)
-    lb = min(time)
-    time_list = []
-
-    for (site, commodity) in sit_com_tuple:
-        for step1 in time:
-            for step2 in range(step1 - delay[site, commodity],
-                               step1 + delay[site, commodity] + 1):
-                if lb <= step2 <= ub:
-                    time_list.append((step1, step2, site, commodity))
+    incidence = {}
 
-    return time_list
+    def entry(sit, com):
+        if (sit, com) not in incidence:
+            incidence[(sit, com)] = {'pro_in': [], 'pro_out': [],
+                                     'tra_export': [], 'tra_import': [],
+                                     'sto': []}
+        return incidence[(sit, com)]
 
+    # commodities per process, so that each (site, process) is visited once
+    pro_in_coms = {}
+    for (pro, com) in r_in.index:
+        pro_in_coms.setdefault(pro, []).append(com)
+    pro_out_coms = {}
+    for (pro, com) in r_out.index:
+        pro_out_coms.setdefault(pro, []).append(com)
 
-def dsm_time_tuples(timestep, time, delay):
-    """ Tuples for the two time instances of DSM_down
+    for (sit, pro) in process.index:
+        for com in pro_in_coms.get(pro, []):
+            entry(sit, com)['pro_in'].append((sit, pro))
+        for com in pro_out_coms.get(pro, []):
+            entry(sit, com)['pro_out'].append((sit, pro))
 
-    Args:
-        timestep: current timestep
-        time: list with time indices
-        delay: allowed dsm delay in particular site and commodity
-
-    Returns:
-        A list of possible time tuples of a current time step in a specific
-        site and commodity
-    """
+    for (sit_in, sit_out, tra, com) in transmission.index:
+        entry(sit_in, com)['tra_export'].append((sit_in, sit_out, tra, com))
+        entry(sit_out, com)['tra_import'].append((sit_in, sit_out, tra, com))
 
-    ub = max(time)
-    lb = min(time)
+    for (sit, sto, com) in storage.index:
+        entry(sit, com)['sto'].append((sit, sto, com))
 
-    time_list = list()
+    return incidence
 
-    for step in range(timestep - delay, timestep + delay + 1):
-        if step >= lb and step <= ub:
-            time_list.append(step)
 
-    return time_list
+class DsmWindows(object):
+    """ Index of the DSM time windows of each modelled timestep
 
+    The windows of all timesteps are computed once per model and stored as
+    arrays of positions for each (site, commodity) tuple, so that the DSM
+    rules look them up in constant time. Windows are clipped to the
+    modelled timesteps and to the representative period of their timestep,
+    if any.
 
-def dsm_recovery(timestep, time, recov):
-    """ Time frame for the allowed time indices in case of recovery
+    Args:
+        timesteps: sorted list of modelled timesteps
+        dsm_dict: DSM input as dict of columns, e.g. m.dsm_dict
+        periods: (optional) dict of timestep to representative period, as
+            returned by timestep_periods
+    """
+    def __init__(self, timesteps, dsm_dict, periods=None):
+        self.timesteps = list(timesteps)
+        self.position = dict((step, i) for i, step in enumerate(timesteps))
+
+        # first and (exclusive) last position of the period of each position
+        n = len(self.timesteps)
+        if periods is None:
+            self.period_start = np.zeros(n, dtype=int)
+            self.period_end = np.full(n, n, dtype=int)
+        else:
+            labels = np.array([periods[step] for step in self.timesteps])
+            new = np.r_[True, labels[1:] != labels[:-1]]
+            starts = np.flatnonzero(new)
+            ends = np.r_[starts[1:], n]
+            counts = ends - starts
+            self.period_start = np.repeat(starts, counts)
+            self.period_end = np.repeat(ends, counts)
+
+        # (exclusive) end positions and start positions of the windows
+        steps = np.asarray(self.timesteps)
+        self.delay_start = {}
+        self.delay_end = {}
+        self.recovery_end = {}
+        for sit_com, delay in dsm_dict.get('delay', {}).items():
+            self.delay_start[sit_com] = np.maximum(np.searchsorted(
+                steps, steps - delay, side='left'),
+                self.period_start).tolist()
+            self.delay_end[sit_com] = np.minimum(np.searchsorted(
+                steps, steps + delay, side='right'),
+                self.period_end).tolist()
+        for sit_com, recov in dsm_dict.get('recov', {}).items():
+            self.recovery_end[sit_com] = np.minimum(np.searchsorted(
+                steps, steps + recov, side='left'),
+                self.period_end).tolist()
+
+    def delay(self, timestep, sit, com):
+        """Timesteps within the delay before and after timestep."""
+        i = self.position[timestep]
+        return self.timesteps[self.delay_start[(sit, com)][i]:
+                              self.delay_end[(sit, com)][i]]
+
+    def later(self, timestep, sit, com):
+        """Timesteps within the delay after timestep."""
+        i = self.position[timestep]
+        return self.timesteps[i + 1:self.delay_end[(sit, com)][i]]
+
+    def recovery(self, timestep, sit, com):
+        """Timesteps of the recovery period starting with timestep."""
+        i = self.position[timestep]
+        return self.timesteps[i:self.recovery_end[(sit, com)][i]]
+
+    def previous(self, timestep):
+        """The modelled timestep before timestep in its period, or None."""
+        i = self.position[timestep]
+        return self.timesteps[i - 1] if i > self.period_start[i] else None
+
+    def tuples(self, sit_com_tuples):
+        """List of (t, tt, site, commodity) tuples with tt within delay of t.
+
+        Args:
+            sit_com_tuples: list of (site, commodity) tuples with DSM
+
+        Returns:
+            the index of dsm_down in the pairwise DSM formulation
+        """
+        return [(t, tt, sit, com)
+                for (sit, com) in sit_com_tuples
+                for t in self.timesteps
+                for tt in self.delay(t, sit, com)]
+
+
+def timestep_periods(data, timesteps):
+    """ Representative period of each modelled timestep.
 
     Args:
-        timestep: current timestep
-        time: list with time indices
-        recov: allowed dsm recovery in particular site and commodity
+        data: urbs input dict
+        timesteps: list of timesteps, including the initial one
 
     Returns:
-        A list of possible time indices which are within the modelled time
-        area
+        dict of modelled timestep to representative period, or None if data
+        contains no representative periods (see
+        urbs.aggregation.aggregate_timeseries)
+
+    Raises:
+        ValueError: if the modelled timesteps are not exactly those of all
+            representative periods; the periods are linked in the order of
+            the original periods, so none can be left out
     """
+    if 'period' not in data:
+        return None
+    period = data['period']
+    periods = {}
+    for p, first, last in zip(period.index.tolist(),
+                              period['first'].tolist(),
+                              period['last'].tolist()):
+        periods.update((t, p) for t in range(first, last + 1))
+    if sorted(periods) != sorted(list(timesteps)[1:]):
+        raise ValueError('Models of representative periods must contain '
+                         'the timesteps of all periods, i.e. timesteps 1 to '
+                         '{} after the initial one.'.format(max(periods)))
+    return periods
+
+
+def timestep_weights(data, timesteps, dt):
+    """ Weight and predecessor of each modelled timestep.
+
+    The weight scales a timestep's costs and emissions to an annual result.
+    Normally, all modelled timesteps share the weight 8760 / (number of
+    modelled timesteps * dt) and the predecessor of a timestep is the one
+    before it. If data contains representative periods (see
+    urbs.aggregation.aggregate_timeseries), each timestep is weighted with
+    the number of original periods its period stands for, and predecessors
+    are restricted to the same period: the first timestep of a period
+    follows the last one of the same period, so that process ramping is
+    cyclic within each period. Storage content is not cyclic; it is linked
+    across periods (cf. def_storage_state_inter_rule in urbs.model).
 
-    ub = max(time)
+    Args:
+        data: urbs input dict
+        timesteps: list of timesteps, including the initial one
+        dt: timestep duration in hours
 
-    time_list = list()
+    Returns:
+        (weight, prev) tuple of dicts, keyed by modelled timestep
+    """
+    timesteps = list(timesteps)
+    tm = timesteps[1:]
+    prev = dict(zip(tm, timesteps[:-1]))
+    count = dict.fromkeys(tm, 1.0)
 
-    for step in range(timestep, timestep+recov):
-        if step <= ub:
-            time_list.append(step)
+    if timestep_periods(data, timesteps) is not None:
+        period = data['period']
+        for first, last, weight in zip(period['first'], period['last'],
+                                       period['weight']):
+            for t in range(first, last + 1):
+                count[t] = float(weight)
+            prev[first] = last
 
-    return time_list
+    scale = float(8760) / (sum(count.values()) * dt)
+    weight = dict((t, c * scale) for t, c in count.items())
+    return weight, prev
 
 
 def commodity_subset(com_tuples, type_name):
@@ -168,9 +307,77 @@ def commodity_subset(com_tuples, type_name):
                    if com in type_name)
 
 
+def sell_buy_pairs(pro_input_tuples, pro_output_tuples, com_sell, com_buy):
+    """ Return the equivalent sell-process for each buy-process.
+
+    A buy-process consumes a buy commodity. Its sell-process is the first
+    process producing a sell commodity that consumes, in some site, a
+    commodity the buy-process produces there.
+
+    Args:
+        pro_input_tuples: a list of (site, process, commodity) inputs
+        pro_output_tuples: a list of (site, process, commodity) outputs
+        com_sell: the set of sell commodities
+        com_buy: the set of buy commodities
+
+    Returns:
+        a dict of buy-process to sell-process
+    """
+    # (site, commodity) inputs and outputs of each process
+    pro_in = {}
+    pro_out = {}
+    for (sit, pro, com) in pro_input_tuples:
+        pro_in.setdefault(pro, set()).add((sit, com))
+    for (sit, pro, com) in pro_output_tuples:
+        pro_out.setdefault(pro, set()).add((sit, com))
+
+    sell_pros = [pro for (sit, pro, com) in pro_output_tuples
+                 if com in com_sell]
+    pairs = {}
+    for (sit, buy_pro, com) in pro_input_tuples:
+        if com not in com_buy or buy_pro in pairs:
+            continue
+        # check: buy - commodity == commodity - sell; for a site
+        for sell_pro in sell_pros:
+            if not pro_in.get(sell_pro, set()).isdisjoint(
+                    pro_out.get(buy_pro, set())):
+                pairs[buy_pro] = sell_pro
+                break
+    return pairs
+
+
+def sell_buy_tuples(pro_tuples, pro_input_tuples, pairs, com_buy):
+    """ Return the (site, buy-process, sell-process) tuples of a model.
+
+    Args:
+        pro_tuples: a list of (site, process) tuples
+        pro_input_tuples: a list of (site, process, commodity) inputs
+        pairs: a dict of buy-process to sell-process, c.f. sell_buy_pairs
+        com_buy: the set of buy commodities
+
+    Returns:
+        a list of unique (site, buy-process, sell-process) tuples, for buy-
+        processes whose sell-process exists in the same site
+    """
+    pro_tuples = set(pro_tuples)
+    tuples = []
+    seen = set()
+    for (sit, pro, com) in pro_input_tuples:
+        if com not in com_buy or pro not in pairs:
+            continue
+        tup = (sit, pro, pairs[pro])
+        if (sit, pairs[pro]) in pro_tuples and tup not in seen:
+            seen.add(tup)
+            tuples.append(tup)
+    return tuples
+
+
 def search_sell_buy_tuple(instance, sit_in, pro_in, coin):
     """ Return the equivalent sell-process for a given buy-process.
 
+    Looks up the pairing computed once during model creation, c.f.
+    sell_buy_pairs.
+
     Args:
         instance: a Pyomo ConcreteModel instance
         sit_in: a site
@@ -180,23 +387,4 @@ def search_sell_buy_tuple(instance, sit_in, pro_in, coin):
     Returns:
         a process
     """
-    pro_output_tuples = list(instance.pro_output_tuples.value)
-    pro_input_tuples = list(instance.pro_input_tuples.value)
-    # search the output commodities for the "buy" process
-    # buy_out = (site,output_commodity)
-    buy_out = set([(x[0], x[2])
-                   for x in pro_output_tuples
-                   if x[1] == pro_in])
-    # search the sell process for the output_commodity from the buy process
-    sell_output_tuple = ([x
-                          for x in pro_output_tuples
-                          if x[2] in instance.com_sell])
-    for k in range(len(sell_output_tuple)):
-        sell_pro = sell_output_tuple[k][1]
-        sell_in = set([(x[0], x[2])
-                       for x in pro_input_tuples
-                       if x[1] == sell_pro])
-        # check: buy - commodity == commodity - sell; for a site
-        if not(sell_in.isdisjoint(buy_out)):
-            return sell_pro
-    return None
+    return instance.sell_buy_dict.get(pro_in)
@@ -1,4 +1,6 @@
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from .input import get_input
 from .pyomoio import get_entity, get_entities
 from .util import is_string
@@ -75,153 +77,215 @@ def get_timeseries(instance, com, sites, timesteps=None):
         - storage: timeseries of commodity storage (level, stored, retrieved)
         - imported: timeseries of commodity import
         - exported: timeseries of commodity export
-        - dsm: timeseries of demand-side management
+        - dsm: timeseries of demand-side management; downshifts are summed
+          by shifted timestep, so that they are the same for the 'compact'
+          and 'pairwise' DSM formulations, whose dsm_down indices differ
+          (cf. create_model)
     """
+    timeseries = get_timeseries_many(instance, [(sites, com)], timesteps)
+    return list(timeseries.values())[0]
+
+
+def get_timeseries_many(instance, tuples, timesteps=None):
+    """Return the timeseries of get_timeseries for many (sites, com) tuples
+
+    Each result entity is retrieved once and pivoted to one column per index
+    combination (e.g. site, process and commodity) in a single pass. The
+    timeseries of each tuple are then sums over a selection of these columns.
+
+    Entities in the result cache of the instance are used as read-only views
+    (c.f. get_entity with copy=False) instead of being copied.
+
+    Args:
+        instance: a urbs model instance
+        tuples: list of (sites, com) tuples; sites is a site name or a list
+                of site names
+        timesteps: optional list of timesteps, default: all modelled timesteps
+
+    Returns:
+        dict of (sites, com) to a tuple (created, consumed, storage, imported,
+        exported, dsm) as returned by get_timeseries; lists of site names are
+        converted to tuples in the keys
+    """
+    cache = {}
     if timesteps is None:
         # default to all simulated timesteps
-        timesteps = sorted(get_entity(instance, 'tm').index)
+        timesteps = sorted(_get_cached_entity(instance, 'tm', cache).index)
     else:
         timesteps = sorted(timesteps)  # implicit: convert range to list
 
-    if is_string(sites):
-        # wrap single site name into list
-        sites = [sites]
-
-    # DEMAND
-    # default to zeros if commodity has no demand, get timeseries
-    try:
-        # select relevant timesteps (=rows)
-        # select commodity (xs), then the sites from remaining simple columns
-        # and sum all together to form a Series
-        demand = (get_input(instance, 'demand').loc[timesteps]
-                                               .xs(com, axis=1, level=1)[sites]
-                                               .sum(axis=1))
-    except KeyError:
-        demand = pd.Series(0, index=timesteps)
-    demand.name = 'Demand'
-
-    # STOCK
-    eco = get_entity(instance, 'e_co_stock')
-    eco = eco.xs([com, 'Stock'], level=['com', 'com_type'])
-    try:
-        stock = eco.unstack()[sites].sum(axis=1)
-    except KeyError:
-        stock = pd.Series(0, index=timesteps)
-    stock.name = 'Stock'
-
-    # PROCESS
-    created = get_entity(instance, 'e_pro_out')
-    created = created.xs(com, level='com').loc[timesteps]
-    try:
-        created = created.unstack(level='sit')[sites].fillna(0).sum(axis=1)
-        created = created.unstack(level='pro')
-        created = drop_all_zero_columns(created)
-    except KeyError:
-        created = pd.DataFrame(index=timesteps)
-
-    consumed = get_entity(instance, 'e_pro_in')
-    consumed = consumed.xs(com, level='com').loc[timesteps]
-    try:
-        consumed = consumed.unstack(level='sit')[sites].fillna(0).sum(axis=1)
-        consumed = consumed.unstack(level='pro')
-        consumed = drop_all_zero_columns(consumed)
-    except KeyError:
-        consumed = pd.DataFrame(index=timesteps)
-
-    # TRANSMISSION
-    other_sites = get_input(instance, 'site').index.difference(sites)
-
-    # if commodity is transportable
+    # one wide DataFrame per entity: timesteps x other index levels
+    demand = get_input(instance, 'demand').loc[timesteps]
+    stock = _pivot(_get_cached_entity(instance, 'e_co_stock', cache),
+                   timesteps)
+    created = _pivot(_get_cached_entity(instance, 'e_pro_out', cache),
+                     timesteps)
+    consumed = _pivot(_get_cached_entity(instance, 'e_pro_in', cache),
+                      timesteps)
+    stored = [_pivot(_get_cached_entity(instance, name, cache), timesteps)
+              for name in ['e_sto_con', 'e_sto_in', 'e_sto_out']]
+    dsmup = _pivot(_get_cached_entity(instance, 'dsm_up', cache), timesteps)
+    dsmdo = _get_cached_entity(instance, 'dsm_down', cache)
+    if not dsmdo.empty and dsmdo.index.nlevels == 4:
+        # pairwise DSM formulation: sum over the first time level to get
+        # DSM down by the shifted timestep
+        shifted_t = dsmdo.index.names[1]
+        dsmdo = dsmdo.groupby(level=[shifted_t, 'sit', 'com']).sum()
+        dsmdo.index.names = ['t', 'sit', 'com']
+    dsmdo = _pivot(dsmdo, timesteps)
+
     df_transmission = get_input(instance, 'transmission')
-    if com in set(df_transmission.index.get_level_values('Commodity')):
-        imported = get_entity(instance, 'e_tra_out')
-        imported = imported.loc[timesteps].xs(com, level='com')
-        imported = imported.unstack(level='tra').sum(axis=1)
-        imported = imported.unstack(level='sit_')[sites].fillna(0).sum(axis=1)
-        imported = imported.unstack(level='sit')
-
-        internal_import = imported[sites].sum(axis=1)  # ...from sites
-        other_sites_im = list(other_sites & imported.columns)
-        imported = imported[other_sites_im]  # ...from other_sites
-        imported = drop_all_zero_columns(imported)
-
-        exported = get_entity(instance, 'e_tra_in')
-        exported = exported.loc[timesteps].xs(com, level='com')
-        exported = exported.unstack(level='tra').sum(axis=1)
-        exported = exported.unstack(level='sit')[sites].fillna(0).sum(axis=1)
-        exported = exported.unstack(level='sit_')
-
-        internal_export = exported[sites].sum(axis=1)  # ...to sites (internal)
-        other_sites_ex = list(other_sites & exported.columns)
-        exported = exported[other_sites_ex]  # ...to other_sites
-        exported = drop_all_zero_columns(exported)
-    else:
-        imported = pd.DataFrame(index=timesteps)
-        exported = pd.DataFrame(index=timesteps)
-        internal_export = pd.Series(0, index=timesteps)
-        internal_import = pd.Series(0, index=timesteps)
-
-    # to be discussed: increase demand by internal transmission losses
-    internal_transmission_losses = internal_export - internal_import
-    demand = demand + internal_transmission_losses
-
-    # STORAGE
-    # group storage energies by commodity
-    # select all entries with desired commodity co
-    stored = get_entities(instance, ['e_sto_con', 'e_sto_in', 'e_sto_out'])
-    try:
-        stored = stored.loc[timesteps].xs(com, level='com')
-        stored = stored.groupby(level=['t', 'sit']).sum()
-        stored = stored.loc[(slice(None), sites), :].sum(level='t')
-        stored.columns = ['Level', 'Stored', 'Retrieved']
-    except (KeyError, ValueError):
-        stored = pd.DataFrame(0, index=timesteps,
-                              columns=['Level', 'Stored', 'Retrieved'])
-
-    # DEMAND SIDE MANAGEMENT (load shifting)
-    dsmup = get_entity(instance, 'dsm_up')
-    dsmdo = get_entity(instance, 'dsm_down')
-
-    if dsmup.empty:
-        # if no DSM happened, the demand is not modified (delta = 0)
-        delta = pd.Series(0, index=timesteps)
+    transportable = set(df_transmission.index.get_level_values('Commodity'))
+    if transportable:
+        imported = _pivot(_get_cached_entity(instance, 'e_tra_out', cache),
+                          timesteps)
+        exported = _pivot(_get_cached_entity(instance, 'e_tra_in', cache),
+                          timesteps)
+    all_sites = get_input(instance, 'site').index
+
+    results = OrderedDict()
+    for sites, com in tuples:
+        if is_string(sites):
+            # wrap single site name into list
+            sites = [sites]
+            key = (sites[0], com)
+        else:
+            sites = list(sites)
+            key = (tuple(sites), com)
+
+        # DEMAND
+        # default to zeros if commodity has no demand
+        com_demand = _sum_columns(demand, {1: [com], 0: sites})
+        com_demand.name = 'Demand'
+
+        # STOCK
+        com_stock = _sum_columns(stock, {'com': [com], 'com_type': ['Stock'],
+                                         'sit': sites})
+        com_stock.name = 'Stock'
+
+        # PROCESS
+        com_created = drop_all_zero_columns(_sum_columns(
+            created, {'com': [com], 'sit': sites}, by='pro'))
+        com_consumed = drop_all_zero_columns(_sum_columns(
+            consumed, {'com': [com], 'sit': sites}, by='pro'))
+
+        # TRANSMISSION
+        other_sites = all_sites.difference(sites)
+        if com in transportable:
+            # import: into sites, by origin site
+            com_imported = _sum_columns(
+                imported, {'com': [com], 'sit_': sites}, by='sit')
+            internal_import = com_imported.reindex(
+                columns=sites, fill_value=0).sum(axis=1)  # ...from sites
+            com_imported = drop_all_zero_columns(com_imported[
+                other_sites.intersection(com_imported.columns)])
+
+            # export: from sites, by destination site
+            com_exported = _sum_columns(
+                exported, {'com': [com], 'sit': sites}, by='sit_')
+            internal_export = com_exported.reindex(
+                columns=sites, fill_value=0).sum(axis=1)  # ...to sites
+            com_exported = drop_all_zero_columns(com_exported[
+                other_sites.intersection(com_exported.columns)])
+        else:
+            com_imported = pd.DataFrame(index=timesteps)
+            com_exported = pd.DataFrame(index=timesteps)
+            internal_export = pd.Series(0, index=timesteps)
+            internal_import = pd.Series(0, index=timesteps)
+
+        # to be discussed: increase demand by internal transmission losses
+        internal_transmission_losses = internal_export - internal_import
+        com_demand = com_demand + internal_transmission_losses
+
+        # STORAGE
+        # sum storage energies of commodity com over all storages in sites
+        com_stored = pd.concat(
+            [_sum_columns(wide, {'com': [com], 'sit': sites})
+             for wide in stored], axis=1)
+        com_stored.columns = ['Level', 'Stored', 'Retrieved']
+
+        # DEMAND SIDE MANAGEMENT (load shifting)
+        # the demand is modified by the difference of DSM up and DSM down;
+        # without DSM, delta is 0
+        delta = (_sum_columns(dsmup, {'com': [com], 'sit': sites}) -
+                 _sum_columns(dsmdo, {'com': [com], 'sit': sites}))
+        shifted = com_demand + delta
+
+        shifted.name = 'Shifted'
+        com_demand.name = 'Unshifted'
+        delta.name = 'Delta'
+
+        dsm = pd.concat((shifted, com_demand, delta), axis=1)
+
+        # JOINS
+        com_created = com_created.join(com_stock)  # show stock as created
+        com_consumed = com_consumed.join(shifted.rename('Demand'))
+
+        results[key] = (com_created, com_consumed, com_stored, com_imported,
+                        com_exported, dsm)
+    return results
+
+
+def _get_cached_entity(instance, name, cache):
+    """Return an entity of instance, retrieving it only once per cache.
 
-    else:
-        # DSM happened (dsmup implies that dsmdo must be non-zero, too)
-        # so the demand will be modified by the difference of DSM up and
-        # DSM down uses
-        # for sit in m.dsm_site_tuples:
-        try:
-            # select commodity
-            dsmup = dsmup.xs(com, level='com')
-            dsmdo = dsmdo.xs(com, level='com')
+    Args:
+        instance: a urbs model instance
+        name: name of a Set, Param, Var, Constraint or Objective
+        cache: dict of entities already retrieved, modified in place
+
+    Returns:
+        a read-only view of the Series of entity name
+    """
+    if name not in cache:
+        cache[name] = get_entity(instance, name, copy=False)
+    return cache[name]
 
-            # select sites
-            dsmup = dsmup.unstack()[sites].sum(axis=1)
-            dsmdo = dsmdo.unstack()[sites].sum(axis=1)
 
-            # convert dsmdo to Series by summing over the first time level
-            dsmdo = dsmdo.unstack().sum(axis=0)
-            dsmdo.index.names = ['t']
+def _pivot(entity, timesteps):
+    """Select timesteps of an entity and move all other levels to columns.
 
-            # derive secondary timeseries
-            delta = dsmup - dsmdo
-        except KeyError:
-            delta = pd.Series(0, index=timesteps)
+    Args:
+        entity: a Series indexed by time (level 't') and other levels
+        timesteps: sorted list of timesteps
 
-    shifted = demand + delta
+    Returns:
+        a DataFrame indexed by timesteps with one column per combination of
+        the other index levels in entity; columns are missing in the rows of
+        timesteps they have no values for
+    """
+    if entity.empty:
+        return pd.DataFrame(index=timesteps)
+    entity = entity[entity.index.get_level_values('t').isin(timesteps)]
+    levels = [level for level in entity.index.names if level != 't']
+    return entity.unstack(levels).reindex(timesteps)
 
-    shifted.name = 'Shifted'
-    demand.name = 'Unshifted'
-    delta.name = 'Delta'
 
-    dsm = pd.concat((shifted, demand, delta), axis=1)
+def _sum_columns(wide, select, by=None):
+    """Sum the selected columns of a wide DataFrame.
 
-    # JOINS
-    created = created.join(stock)  # show stock as created
-    consumed = consumed.join(shifted.rename('Demand'))
+    Args:
+        wide: a DataFrame with MultiIndex columns, e.g. from _pivot
+        select: dict of column levels (names or positions) to lists of
+                values; only columns having one of these values in each of
+                the levels are summed
+        by: optional column level to group by before summing
 
-    return created, consumed, stored, imported, exported, dsm
+    Returns:
+        a Series (or DataFrame with the values of by as columns) indexed like
+        wide; missing values count as 0
+    """
+    selected = np.ones(len(wide.columns), dtype=bool)
+    if len(wide.columns):
+        for level, values in select.items():
+            selected &= wide.columns.get_level_values(level).isin(values)
+    wide = wide.loc[:, selected].fillna(0)
+    if by is None:
+        return wide.sum(axis=1)
+    if not len(wide.columns):
+        return pd.DataFrame(index=wide.index)
+    # transposed, as grouping columns is deprecated in newer pandas
+    return wide.T.groupby(level=by).sum().T
 
 
 def drop_all_zero_columns(df):
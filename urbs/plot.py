@@ -1,11 +1,13 @@
+import matplotlib as mpl
 import matplotlib.pyplot as plt
+import multiprocessing
 import numpy as np
 import os
 import pandas as pd
 from random import random
 from .data import COLORS
 from .input import get_input
-from .output import get_constants, get_timeseries
+from .output import get_constants, get_timeseries, get_timeseries_many
 from .pyomoio import get_entity
 from .util import is_string
 
@@ -59,7 +61,7 @@ def sort_plot_elements(elements):
 def plot(prob, com, sit, timesteps=None,
          power_name='Power', energy_name='Energy',
          power_unit='MW', energy_unit='MWh', time_unit='h',
-         figure_size=(16, 12)):
+         figure_size=(16, 12), timeseries=None):
     """Plot a stacked timeseries of commodity balance and storage.
 
     Creates a stackplot of the energy balance of a given commodity, together
@@ -77,13 +79,12 @@ def plot(prob, com, sit, timesteps=None,
         energy_unit: optional string for storage plot; default: 'MWh'
         time_unit: optional string for time unit label; default: 'h'
         figure_size: optional (width, height) tuple in inch; default: (16, 12)
+        timeseries: optional tuple as returned by get_timeseries for com, sit
+                    and timesteps; default: retrieved from prob
 
     Returns:
         fig: figure handle
     """
-    import matplotlib.pyplot as plt
-    import matplotlib as mpl
-
     if timesteps is None:
         # default to all simulated timesteps
         timesteps = sorted(get_entity(prob, 'tm').index)
@@ -92,10 +93,70 @@ def plot(prob, com, sit, timesteps=None,
         # wrap single site in 1-element list for consistent behaviour
         sit = [sit]
 
-    (created, consumed, stored, imported, exported,
-     dsm) = get_timeseries(prob, com, sit, timesteps)
+    if timeseries is None:
+        timeseries = get_timeseries(prob, com, sit, timesteps)
+    plot_dsm, storage_capacity = _plot_settings(prob, com, sit)
+
+    return _draw_plot(com, sit, timesteps, timeseries, plot_dsm,
+                      storage_capacity, power_name=power_name,
+                      energy_name=energy_name, power_unit=power_unit,
+                      energy_unit=energy_unit, time_unit=time_unit,
+                      figure_size=figure_size)
+
+
+def _plot_settings(prob, com, sit, csto=None):
+    """Return the model-dependent settings of a plot.
 
-    costs, cpro, ctra, csto = get_constants(prob)
+    Args:
+        prob: urbs model instance
+        com: commodity name to plot
+        sit: list of site names to plot
+        csto: optional storage capacities as returned by get_constants;
+              default: retrieved from prob
+
+    Returns:
+        (plot_dsm, storage_capacity) tuple of whether to show the DSM subplot
+        and the total storage capacity (None if unknown)
+    """
+    try:
+        # detect whether DSM could be used in this plot
+        # if so, show DSM subplot (even if delta == 0 for the whole time)
+        df_dsm = get_input(prob, 'dsm')
+        plot_dsm = df_dsm.loc[(sit, com),
+                              ['cap-max-do', 'cap-max-up']].sum().sum() > 0
+    except (KeyError, TypeError):
+        plot_dsm = False
+
+    if csto is None:
+        csto = get_constants(prob)[3]
+    try:
+        storage_capacity = csto.loc[sit, :, com]['C Total'].sum()
+    except KeyError:
+        storage_capacity = None
+    return plot_dsm, storage_capacity
+
+
+def _draw_plot(com, sit, timesteps, timeseries, plot_dsm, storage_capacity,
+               power_name='Power', energy_name='Energy',
+               power_unit='MW', energy_unit='MWh', time_unit='h',
+               figure_size=(16, 12)):
+    """Draw the figure of plot from precomputed data only.
+
+    Args:
+        com: commodity name to plot
+        sit: list of site names to plot
+        timesteps: list of timesteps to plot
+        timeseries: tuple as returned by get_timeseries for com, sit and
+                    timesteps
+        plot_dsm: whether to show the DSM subplot
+        storage_capacity: total storage capacity for the storage y-axis limit
+                          or None
+        other arguments: as for plot
+
+    Returns:
+        fig: figure handle
+    """
+    (created, consumed, stored, imported, exported, dsm) = timeseries
 
     # move retrieved/stored storage timeseries to created/consumed and
     # rename storage columns back to 'storage' for color mapping
@@ -113,16 +174,8 @@ def plot(prob, com, sit, timesteps=None,
 
     # move demand to its own plot
     demand = consumed.pop('Demand')
-    original = dsm.pop('Unshifted')
-    deltademand = dsm.pop('Delta')
-    try:
-        # detect whether DSM could be used in this plot
-        # if so, show DSM subplot (even if delta == 0 for the whole time)
-        df_dsm = get_input(prob, 'dsm')
-        plot_dsm = df_dsm.loc[(sit, com),
-                              ['cap-max-do', 'cap-max-up']].sum().sum() > 0
-    except (KeyError, TypeError):
-        plot_dsm = False
+    original = dsm['Unshifted']
+    deltademand = dsm['Delta']
 
     # remove all columns from created which are all-zeros in both created and
     # consumed (except the last one, to prevent a completely empty frame)
@@ -236,10 +289,8 @@ def plot(prob, com, sit, timesteps=None,
     sp1[0].set_edgecolor(to_color('Decoration'))
     ax1.set_ylabel('{} ({})'.format(energy_name, energy_unit))
 
-    try:
-        ax1.set_ylim((0, 0.5 + csto.loc[sit, :, com]['C Total'].sum()))
-    except KeyError:
-        pass
+    if storage_capacity is not None:
+        ax1.set_ylim((0, 0.5 + storage_capacity))
 
     # PLOT DEMAND SIDE MANAGEMENT
     if plot_dsm:
@@ -296,7 +347,8 @@ def plot(prob, com, sit, timesteps=None,
 
 def result_figures(prob, figure_basename, plot_title_prefix=None,
                    plot_tuples=None, plot_sites_name=None,
-                   periods=None, extensions=None, **kwds):
+                   periods=None, extensions=None, workers=1,
+                   reuse_bbox=False, **kwds):
     """Create plots for multiple periods and sites and save them to files.
 
     Args:
@@ -311,6 +363,15 @@ def result_figures(prob, figure_basename, plot_title_prefix=None,
                  default: one period 'all' with all timesteps is assumed
         extensions: (optional) list of file extensions for plot images
                     default: png, pdf
+        workers: (optional) number of worker processes drawing the figures
+                 with the non-interactive Agg backend; each worker only
+                 receives the timeseries of its figures. Default: 1, i.e.
+                 all figures are drawn in the current process. Not possible
+                 within the worker processes of run_scenarios.
+        reuse_bbox: (optional) if True, the tight bounding box of each
+                    figure is computed once and cached for all extensions;
+                    otherwise, savefig computes it for each file with an
+                    extra draw. Each file is still rendered. Default: False
         **kwds: (optional) keyword arguments are forwarded to urbs.plot()
     """
     # default to all demand (sit, com) tuples if none are specified
@@ -325,7 +386,20 @@ def result_figures(prob, figure_basename, plot_title_prefix=None,
     if extensions is None:
         extensions = ['png', 'pdf']
 
-    # create timeseries plot for each demand (site, commodity) timeseries
+    # if no custom title prefix is specified, use the figure_basename
+    if not plot_title_prefix:
+        plot_title_prefix = os.path.basename(figure_basename)
+
+    # retrieve the timeseries of all plots of a period at once
+    site_tuples = [([sit] if is_string(sit) else list(sit), com)
+                   for sit, com in plot_tuples]
+    period_timeseries = dict(
+        (period, get_timeseries_many(prob, site_tuples, timesteps))
+        for period, timesteps in periods.items())
+    csto = get_constants(prob)[3]
+
+    # collect one drawing job per demand (site, commodity) and period
+    jobs = []
     for sit, com in plot_tuples:
         # wrap single site name in 1-element list for consistent behaviour
         if is_string(sit):
@@ -339,27 +413,71 @@ def result_figures(prob, figure_basename, plot_title_prefix=None,
         except:
             plot_sites_name[sit] = str(sit)
 
+        plot_dsm, storage_capacity = _plot_settings(prob, com, help_sit, csto)
+        title = '{}: {} in {}'.format(
+            plot_title_prefix, com, plot_sites_name[sit])
+
         for period, timesteps in periods.items():
-            # do the plotting
-            fig = plot(prob, com, help_sit, timesteps=timesteps, **kwds)
-
-            # change the figure title
-            ax0 = fig.get_axes()[0]
-            # if no custom title prefix is specified, use the figure_basename
-            if not plot_title_prefix:
-                plot_title_prefix = os.path.basename(figure_basename)
-
-            new_figure_title = '{}: {} in {}'.format(
-                plot_title_prefix, com, plot_sites_name[sit])
-            ax0.set_title(new_figure_title)
-
-            # save plot to files
-            for ext in extensions:
-                fig_filename = '{}-{}-{}-{}.{}'.format(
-                    figure_basename, com, ''.join(
-                        plot_sites_name[sit]), period, ext)
-                fig.savefig(fig_filename, bbox_inches='tight')
-            plt.close(fig)
+            timeseries = period_timeseries[period][(tuple(help_sit), com)]
+            fig_filenames = [
+                '{}-{}-{}-{}.{}'.format(
+                    figure_basename, com, ''.join(plot_sites_name[sit]),
+                    period, ext)
+                for ext in extensions]
+            jobs.append((com, help_sit, timesteps, timeseries, plot_dsm,
+                         storage_capacity, title, fig_filenames, reuse_bbox,
+                         kwds))
+
+    if workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(processes=min(workers, len(jobs)),
+                                    initializer=plt.switch_backend,
+                                    initargs=('agg',))
+        try:
+            pool.map(_result_figure, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            _result_figure(job)
+
+
+def _result_figure(job):
+    """Draw a figure of result_figures and save it to files.
+
+    Args:
+        job: tuple of com, sit, timesteps, timeseries, plot_dsm,
+             storage_capacity (as for _draw_plot), the figure title, the
+             list of filenames, reuse_bbox (as for result_figures) and a dict
+             of further keyword arguments for _draw_plot
+
+    Returns:
+        Nothing
+    """
+    (com, sit, timesteps, timeseries, plot_dsm, storage_capacity, title,
+     filenames, reuse_bbox, kwds) = job
+
+    # do the plotting
+    fig = _draw_plot(com, sit, timesteps, timeseries, plot_dsm,
+                     storage_capacity, **kwds)
+
+    # change the figure title
+    ax0 = fig.get_axes()[0]
+    ax0.set_title(title)
+
+    # save plot to files
+    if reuse_bbox:
+        # bbox_inches='tight' costs savefig an extra draw per file, so the
+        # bounding box is computed once from a single draw
+        fig.canvas.draw()
+        bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(
+            mpl.rcParams['savefig.pad_inches'])
+        for fig_filename in filenames:
+            fig.savefig(fig_filename, bbox_inches=bbox)
+    else:
+        for fig_filename in filenames:
+            fig.savefig(fig_filename, bbox_inches='tight')
+    plt.close(fig)
 
 
 def to_color(obj=None):
@@ -0,0 +1,162 @@
+"""Construction profile of urbs models
+
+create_model(..., profile=True) records how long each data preparation step
+and each Set, Param, Var, Constraint and Objective of the model take to
+create, together with their number of indices and nonzero coefficients. The
+result is attached to the model as DataFrame `profile` and saved by
+urbs.save, so that profiles of growing inputs can be compared.
+
+"""
+import time
+import pandas as pd
+import pyomo.core as pyomo
+
+# columns of the profile DataFrame
+PROFILE_COLUMNS = ['kind', 'time', 'indices', 'nonzeros']
+
+
+class ModelProfile(object):
+    """Records the construction steps of a model with their time and size.
+
+    Data preparation steps are recorded by lap, model components by watching
+    the model while its components are added.
+    """
+    def __init__(self):
+        self.records = []
+        self._last = time.time()
+        self._depth = 0
+
+    def add(self, name, kind, seconds):
+        """Record a construction step.
+
+        Args:
+            name: name of the step or component
+            kind: 'prep' for data preparation, or the component type as in
+                list_entities ('set', 'par', 'var', 'con', 'obj')
+            seconds: wall time of the step
+
+        Returns:
+            Nothing
+        """
+        self.records.append({'name': name, 'kind': kind, 'time': seconds,
+                             'indices': float('nan'),
+                             'nonzeros': float('nan')})
+        self._last = time.time()
+
+    def lap(self, name):
+        """Record a data preparation step that ends now.
+
+        The step is assumed to have started with the previous recorded step.
+
+        Args:
+            name: name of the step
+
+        Returns:
+            Nothing
+        """
+        self.add(name, 'prep', time.time() - self._last)
+
+    def watch(self, model):
+        """Time every component added to model until unwatch is called.
+
+        Pyomo constructs the components of a ConcreteModel when they are
+        added, so the time of add_component is their construction time.
+        Implicit components added during the construction of another one
+        (e.g. index sets) are counted towards that component.
+
+        Args:
+            model: a pyomo ConcreteModel
+
+        Returns:
+            Nothing
+        """
+        add_component = model.add_component
+
+        def timed_add_component(name, val):
+            start = time.time()
+            self._depth += 1
+            try:
+                add_component(name, val)
+            finally:
+                self._depth -= 1
+            if not self._depth:
+                self.add(name, _component_kind(val), time.time() - start)
+
+        # an instance attribute takes precedence over the Block method
+        object.__setattr__(model, 'add_component', timed_add_component)
+
+    def unwatch(self, model):
+        """Stop timing the components added to model."""
+        model.__dict__.pop('add_component', None)
+
+    def count(self, model):
+        """Count the indices and nonzeros of the recorded components.
+
+        Nonzeros are the variables in the (linear) expressions of each
+        constraint and the objective. For variables, they are the number of
+        constraint and objective coefficients referring to them.
+
+        Args:
+            model: the pyomo ConcreteModel of the recorded components
+
+        Returns:
+            Nothing
+        """
+        from pyomo.repn import generate_standard_repn
+
+        nonzeros = {}
+        for record in self.records:
+            if record['kind'] in ('prep', 'other'):
+                continue
+            component = getattr(model, record['name'])
+            record['indices'] = len(component)
+            if record['kind'] not in ('con', 'obj'):
+                continue
+
+            count = 0
+            for data in component.values():
+                expr = (data.body if record['kind'] == 'con'
+                        else data.expr)
+                repn = generate_standard_repn(expr, compute_values=False)
+                for var in (list(repn.linear_vars) +
+                            [v for pair in repn.quadratic_vars
+                             for v in pair] +
+                            list(repn.nonlinear_vars)):
+                    name = var.parent_component().name
+                    nonzeros[name] = nonzeros.get(name, 0) + 1
+                    count += 1
+            record['nonzeros'] = count
+
+        for record in self.records:
+            if record['kind'] == 'var':
+                record['nonzeros'] = nonzeros.get(record['name'], 0)
+
+    def to_frame(self):
+        """Return the profile as DataFrame.
+
+        Returns:
+            DataFrame indexed by step or component name in order of
+            construction, with columns kind, time (seconds), indices and
+            nonzeros (NaN where not applicable)
+        """
+        if not self.records:
+            return pd.DataFrame(columns=PROFILE_COLUMNS)
+        profile = pd.DataFrame(self.records).set_index('name')
+        return profile[PROFILE_COLUMNS]
+
+
+def lap(profile, name):
+    """Record a data preparation step in profile, unless profile is None."""
+    if profile is not None:
+        profile.lap(name)
+
+
+def _component_kind(component):
+    """Return the list_entities type of a pyomo component, or 'other'."""
+    for kind, component_type in (('set', pyomo.Set), ('par', pyomo.Param),
+                                 ('var', pyomo.Var),
+                                 ('con', pyomo.Constraint),
+                                 ('obj', pyomo.Objective)):
+        if isinstance(component, component_type):
+            return kind
+    return 'other'
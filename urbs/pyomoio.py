@@ -1,13 +1,17 @@
+import numpy as np
 import pandas as pd
 import pyomo.core as pyomo
 
 
-def get_entity(instance, name):
+def get_entity(instance, name, copy=True):
     """ Retrieve values (or duals) for an entity in a model instance.
 
     Args:
         instance: a Pyomo ConcreteModel instance
         name: name of a Set, Param, Var, Constraint or Objective
+        copy: (optional) if False, entities in the result cache of instance
+              are returned as read-only view instead of a copy; their values
+              cannot be modified then. Default: True
 
     Returns:
         a Pandas Series with domain as index and values (or 1's, for sets) of
@@ -15,12 +19,21 @@ def get_entity(instance, name):
     """
     # magic: short-circuit if problem contains a result cache
     if hasattr(instance, '_result') and name in instance._result:
-        return instance._result[name].copy(deep=True)
+        if copy:
+            return instance._result[name].copy(deep=True)
+        return _read_only_view(instance._result[name])
 
     # retrieve entity, its type and its onset names
     entity = instance.__getattribute__(name)
     labels = _get_onset_names(entity)
 
+    # indexed params, variables and constraints hold almost all values of a
+    # model; they are extracted in bulk
+    if (isinstance(entity, (pyomo.Param, pyomo.Var, pyomo.Constraint)) and
+            entity.dim() > 0):
+        return _get_indexed_values(instance, entity, name,
+                                   _unique_labels(labels, name))
+
     # extract values
     if isinstance(entity, pyomo.Set):
         if entity.dimen > 1:
@@ -38,51 +51,22 @@ def get_entity(instance, name):
             name = name+'_'
 
     elif isinstance(entity, pyomo.Param):
-        if entity.dim() > 1:
-            results = pd.DataFrame(
-                [v[0]+(v[1],) for v in entity.iteritems()])
-        elif entity.dim() == 1:
-            results = pd.DataFrame(
-                [(v[0], v[1]) for v in entity.iteritems()])
-        else:
-            results = pd.DataFrame(
-                [(v[0], v[1].value) for v in entity.iteritems()])
-            labels = ['None']
+        results = pd.DataFrame(
+            [(v[0], v[1].value) for v in entity.items()])
+        labels = ['None']
 
     elif isinstance(entity, pyomo.Constraint):
-        if entity.dim() > 1:
-            results = pd.DataFrame(
-                [v[0] + (instance.dual[v[1]],) for v in entity.iteritems()])
-        elif entity.dim() == 1:
-            results = pd.DataFrame(
-                [(v[0], instance.dual[v[1]]) for v in entity.iteritems()])
-        else:
-            results = pd.DataFrame(
-                [(v[0], instance.dual[v[1]]) for v in entity.iteritems()])
-            labels = ['None']
+        results = pd.DataFrame(
+            [(v[0], instance.dual[v[1]]) for v in entity.items()])
+        labels = ['None']
 
     else:
-        # create DataFrame
-        if entity.dim() > 1:
-            # concatenate index tuples with value if entity has
-            # multidimensional indices v[0]
-            results = pd.DataFrame(
-                [v[0]+(v[1].value,) for v in entity.iteritems()])
-        elif entity.dim() == 1:
-            # otherwise, create tuple from scalar index v[0]
-            results = pd.DataFrame(
-                [(v[0], v[1].value) for v in entity.iteritems()])
-        else:
-            # assert(entity.dim() == 0)
-            results = pd.DataFrame(
-                [(v[0], v[1].value) for v in entity.iteritems()])
-            labels = ['None']
+        # assert(entity.dim() == 0)
+        results = pd.DataFrame(
+            [(v[0], v[1].value) for v in entity.items()])
+        labels = ['None']
 
-    # check for duplicate onset names and append one to several "_" to make
-    # them unique, e.g. ['sit', 'sit', 'com'] becomes ['sit', 'sit_', 'com']
-    for k, label in enumerate(labels):
-        if label in labels[:k] or label == name:
-            labels[k] = labels[k] + "_"
+    labels = _unique_labels(labels, name)
 
     if not results.empty:
         # name columns according to labels + entity name
@@ -97,6 +81,98 @@ def get_entity(instance, name):
     return results
 
 
+def _read_only_view(series):
+    """ Return a view of a Series whose values cannot be modified.
+
+    The view shares its values with series through a new NumPy view, which
+    is flagged as not writeable, so that assignments to it raise a
+    ValueError instead of changing series; series itself stays writeable.
+    Index and name of the view can be changed without affecting series.
+
+    Args:
+        series: a Pandas Series, e.g. from a result cache
+
+    Returns:
+        a Series with read-only values shared with series
+    """
+    values = series.values
+    if not isinstance(values, np.ndarray):
+        return series.copy(deep=False)
+    # a new view, so that the flag does not apply to the values of series
+    values = values.view()
+    values.flags.writeable = False
+    return pd.Series(values, index=series.index.copy(), name=series.name,
+                     copy=False)
+
+
+def _get_indexed_values(instance, entity, name, labels):
+    """ Extract the values (or duals) of an indexed entity in bulk.
+
+    Instead of assembling a DataFrame from one tuple per index, the index
+    tuples and values are collected into flat lists in one pass over the
+    component's data dict. The index is then created from the integer codes
+    of each level, and the values are converted to an array at once.
+
+    Args:
+        instance: a Pyomo ConcreteModel instance
+        entity: an indexed Param, Var or Constraint of instance
+        name: name of the entity
+        labels: unique index level names
+
+    Returns:
+        a Pandas Series as returned by get_entity
+    """
+    if isinstance(entity, pyomo.Param):
+        # items() also covers default values, which are not stored
+        keys, values = zip(*entity.items()) if len(entity) else ((), ())
+        # pyomo.value also unwraps the values of mutable parameters
+        values = [pyomo.value(par) for par in values]
+    else:
+        # iterating the data dict directly skips the index set lookups of
+        # items(), which take most of the time otherwise
+        data = entity._data
+        keys = list(data.keys())
+        if isinstance(entity, pyomo.Constraint):
+            dual = instance.dual
+            values = [dual[con] for con in data.values()]
+        else:
+            values = [var.value for var in data.values()]
+    if not keys:
+        return pd.Series(name=name)
+
+    if entity.dim() > 1:
+        levels, codes = [], []
+        for level in zip(*keys):
+            level_codes, uniques = pd.Index(level).factorize(sort=True)
+            levels.append(uniques)
+            codes.append(level_codes)
+        index = pd.MultiIndex(levels=levels, codes=codes, names=labels,
+                              verify_integrity=False)
+    else:
+        index = pd.Index(keys, name=labels[0])
+    return pd.Series(values, index=index, name=name)
+
+
+def _unique_labels(labels, name):
+    """ Make index level names unique and distinct from the entity name.
+
+    Duplicate onset names get one to several "_" appended, e.g. ['sit',
+    'sit', 'com'] becomes ['sit', 'sit_', 'com'].
+
+    Args:
+        labels: list of onset names, as from _get_onset_names
+        name: entity name
+
+    Returns:
+        list of unique labels
+    """
+    labels = list(labels)
+    for k, label in enumerate(labels):
+        if label in labels[:k] or label == name:
+            labels[k] = labels[k] + "_"
+    return labels
+
+
 def get_entities(instance, names):
     """ Return one DataFrame with entities in columns and a common index.
 
@@ -1,10 +1,16 @@
+import os
 import pandas as pd
+from collections import OrderedDict
 from .input import get_input
-from .output import get_constants, get_timeseries
+from .output import get_constants, get_timeseries_many
 from .util import is_string
 
+# file formats for the timeseries sidecars of report
+SIDECAR_FORMATS = ('csv', 'parquet')
 
-def report(instance, filename, report_tuples=None, report_sites_name=None):
+
+def report(instance, filename, report_tuples=None, report_sites_name=None,
+           streaming=False, sidecars=None):
     """Write result summary to a spreadsheet file
 
     Args:
@@ -14,97 +20,252 @@ def report(instance, filename, report_tuples=None, report_sites_name=None):
                        create detailed timeseries sheets
         report_sites_name: (optional) dict of names for created timeseries
                        sheets
+        streaming: (optional) if True, each timeseries sheet is written as
+                   soon as it is computed, using the constant memory mode of
+                   xlsxwriter (must be installed); default: False
+        sidecars: (optional) list of formats ('csv', 'parquet') in which the
+                  timeseries sheets are written additionally, each to a file
+                  '<filename without extension>-<site name>.<com>.<format>'
     Returns:
         Nothing
     """
     # default to all demand (sit, com) tuples if none are specified
     if report_tuples is None:
         report_tuples = get_input(instance, 'demand').columns
+    if report_sites_name is None:
+        report_sites_name = {}
+    if sidecars is None:
+        sidecars = []
+    for fmt in sidecars:
+        if fmt not in SIDECAR_FORMATS:
+            raise ValueError("Unknown sidecar format '{}'; use 'csv' or "
+                             "'parquet'".format(fmt))
 
     costs, cpro, ctra, csto = get_constants(instance)
+    constants = [(costs.to_frame(), 'Costs'),
+                 (cpro, 'Process caps'),
+                 (ctra, 'Transmission caps'),
+                 (csto, 'Storage caps')]
+
+    # timeseries tableaus are computed one after another while writing
+    timeseries = _report_timeseries(instance, report_tuples,
+                                    report_sites_name)
+
+    if streaming:
+        _write_streaming(filename, constants, timeseries, sidecars)
+        return
 
     # create spreadsheet writer object
     with pd.ExcelWriter(filename) as writer:
 
         # write constants to spreadsheet
-        costs.to_frame().to_excel(writer, 'Costs')
-        cpro.to_excel(writer, 'Process caps')
-        ctra.to_excel(writer, 'Transmission caps')
-        csto.to_excel(writer, 'Storage caps')
-
-        # initialize timeseries tableaus
-        energies = []
-        timeseries = {}
-        help_ts = {}
+        for df, sheet_name in constants:
+            df.to_excel(writer, sheet_name=sheet_name)
 
         # collect timeseries data
-        for sit, com in report_tuples:
-
-            # wrap single site name in 1-element list for consistent behavior
-            if is_string(sit):
-                help_sit = [sit]
-            else:
-                help_sit = sit
-                sit = tuple(sit)
-
-            # check existence of predefined names, else define them
-            try:
-                report_sites_name[sit]
-            except:
-                report_sites_name[sit] = str(sit)
-
-            for lv in help_sit:
-                (created, consumed, stored, imported, exported,
-                 dsm) = get_timeseries(instance, com, lv)
-
-                overprod = pd.DataFrame(
-                    columns=['Overproduction'],
-                    data=created.sum(axis=1) - consumed.sum(axis=1) +
-                    imported.sum(axis=1) - exported.sum(axis=1) +
-                    stored['Retrieved'] - stored['Stored'])
-
-                tableau = pd.concat(
-                    [created, consumed, stored, imported, exported, overprod,
-                     dsm],
-                    axis=1,
-                    keys=['Created', 'Consumed', 'Storage', 'Import from',
-                          'Export to', 'Balance', 'DSM'])
-                help_ts[(lv, com)] = tableau.copy()
-
-                # timeseries sums
-                help_sums = pd.concat([created.sum(), consumed.sum(),
-                                       stored.sum().drop('Level'),
-                                       imported.sum(), exported.sum(),
-                                       overprod.sum(), dsm.sum()],
-                                      axis=0,
-                                      keys=['Created', 'Consumed', 'Storage',
-                                            'Import', 'Export', 'Balance',
-                                            'DSM'])
-                try:
-                    timeseries[(report_sites_name[sit], com)] = timeseries[
-                        (report_sites_name[sit], com)].add(
-                            help_ts[(lv, com)], axis=1, fill_value=0)
-                    sums = sums.add(help_sums, fill_value=0)
-                except:
-                    timeseries[(report_sites_name[sit], com)] = help_ts[
-                        (lv, com)]
-                    sums = help_sums
-
-            energies.append(sums.to_frame("{}.{}".format(
-                report_sites_name[sit], com)))
+        energies = []
+        tableaus = []
+        for name, tableau, sums in timeseries:
+            energies.append(sums.to_frame(name))
+            tableaus.append((name, tableau))
+            _write_sidecars(filename, name, tableau, sidecars)
 
         # write timeseries data (if any)
-        if timeseries:
+        if tableaus:
             # concatenate Commodity sums
             energy = pd.concat(energies, axis=1).fillna(0)
-            energy.to_excel(writer, 'Commodity sums')
+            energy.to_excel(writer, sheet_name='Commodity sums')
 
             # write timeseries to individual sheets
-            for sit, com in report_tuples:
-                if isinstance(sit, list):
-                    sit = tuple(sit)
-                # sheet names cannot be longer than 31 characters...
-                sheet_name = "{}.{} timeseries".format(
-                    report_sites_name[sit], com)[:31]
-                timeseries[(report_sites_name[sit], com)].to_excel(
-                    writer, sheet_name)
+            for name, tableau in tableaus:
+                tableau.to_excel(writer,
+                                 sheet_name=_timeseries_sheet_name(name))
+
+
+def _report_timeseries(instance, report_tuples, report_sites_name):
+    """Generate the timeseries tableau and sums of each report tuple.
+
+    The timeseries of all sites are retrieved at once; the tableaus are
+    assembled one by one when the generator is consumed.
+
+    Args:
+        instance: a urbs model instance
+        report_tuples: list of (sit, com) tuples as for report
+        report_sites_name: dict of names for the report tuples; missing
+                           names are added
+
+    Yields:
+        (name, tableau, sums) tuples of the name '<site name>.<com>', the
+        DataFrame of timeseries and the Series of their sums; tuples with
+        the same site name and commodity are summed up
+    """
+    # group the single sites by report name and commodity
+    groups = OrderedDict()
+    for sit, com in report_tuples:
+        # wrap single site name in 1-element list for consistent behavior
+        if is_string(sit):
+            help_sit = [sit]
+        else:
+            help_sit = sit
+            sit = tuple(sit)
+
+        # check existence of predefined names, else define them
+        if sit not in report_sites_name:
+            report_sites_name[sit] = str(sit)
+
+        groups.setdefault((report_sites_name[sit], com), []).extend(help_sit)
+
+    # retrieve the timeseries of all single sites at once
+    site_timeseries = get_timeseries_many(
+        instance, [(lv, com) for (name, com), sites in groups.items()
+                   for lv in sites])
+
+    for (name, com), sites in groups.items():
+        tableau = None
+        for lv in sites:
+            (created, consumed, stored, imported, exported,
+             dsm) = site_timeseries[(lv, com)]
+
+            overprod = pd.DataFrame(
+                columns=['Overproduction'],
+                data=created.sum(axis=1) - consumed.sum(axis=1) +
+                imported.sum(axis=1) - exported.sum(axis=1) +
+                stored['Retrieved'] - stored['Stored'])
+
+            help_ts = pd.concat(
+                [created, consumed, stored, imported, exported, overprod,
+                 dsm],
+                axis=1,
+                keys=['Created', 'Consumed', 'Storage', 'Import from',
+                      'Export to', 'Balance', 'DSM'])
+
+            # timeseries sums
+            help_sums = pd.concat([created.sum(), consumed.sum(),
+                                   stored.sum().drop('Level'),
+                                   imported.sum(), exported.sum(),
+                                   overprod.sum(), dsm.sum()],
+                                  axis=0,
+                                  keys=['Created', 'Consumed', 'Storage',
+                                        'Import', 'Export', 'Balance',
+                                        'DSM'])
+            if tableau is None:
+                tableau = help_ts
+                sums = help_sums
+            else:
+                tableau = tableau.add(help_ts, axis=1, fill_value=0)
+                sums = sums.add(help_sums, fill_value=0)
+
+        yield "{}.{}".format(name, com), tableau, sums
+
+
+def _timeseries_sheet_name(name):
+    """Return the sheet name for the timeseries of name '<site>.<com>'."""
+    # sheet names cannot be longer than 31 characters...
+    return "{} timeseries".format(name)[:31]
+
+
+def _write_streaming(filename, constants, timeseries, sidecars):
+    """Write the report spreadsheet sheet by sheet in constant memory.
+
+    Each timeseries tableau is written (and can be freed) as soon as it is
+    computed. Only the commodity sums are kept until the end.
+
+    Args:
+        filename: Excel spreadsheet filename, will be overwritten if exists
+        constants: list of (DataFrame, sheet name) tuples
+        timeseries: iterable of (name, tableau, sums) tuples as generated by
+                    _report_timeseries
+        sidecars: list of sidecar formats
+
+    Returns:
+        Nothing
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
+    try:
+        for df, sheet_name in constants:
+            _write_sheet(workbook.add_worksheet(sheet_name), df)
+
+        sums_sheet = None
+        energies = []
+        for name, tableau, sums in timeseries:
+            if sums_sheet is None:
+                # added first to keep the sheet order of report, but written
+                # last, once all sums are known
+                sums_sheet = workbook.add_worksheet('Commodity sums')
+            _write_sheet(workbook.add_worksheet(_timeseries_sheet_name(name)),
+                         tableau)
+            _write_sidecars(filename, name, tableau, sidecars)
+            energies.append(sums.to_frame(name))
+
+        if energies:
+            _write_sheet(sums_sheet, pd.concat(energies, axis=1).fillna(0))
+    finally:
+        workbook.close()
+
+
+def _write_sheet(worksheet, df):
+    """Write a DataFrame to an xlsxwriter worksheet row by row.
+
+    In constant memory mode, xlsxwriter only accepts rows in ascending order,
+    so DataFrame.to_excel, which writes column by column, cannot be used.
+    The layout is that of to_excel: one header row per column level, the
+    index names below (or, for simple columns, left of) the header and one
+    row per index entry, without merged cells.
+
+    Args:
+        worksheet: an xlsxwriter worksheet
+        df: a DataFrame
+
+    Returns:
+        Nothing
+    """
+    index_names = [name if name is not None else ''
+                   for name in df.index.names]
+    row = 0
+    for level in range(df.columns.nlevels):
+        worksheet.write_row(row, len(index_names),
+                            _cells(df.columns.get_level_values(level)))
+        row += 1
+    if df.columns.nlevels > 1:
+        row += 1
+    worksheet.write_row(row - 1, 0, index_names)
+
+    for index, values in zip(df.index, df.values):
+        if df.index.nlevels == 1:
+            index = (index,)
+        worksheet.write_row(row, 0, _cells(index) + _cells(values))
+        row += 1
+
+
+def _cells(values):
+    """Convert values to cell contents; missing values become blank cells."""
+    if hasattr(values, 'tolist'):
+        values = values.tolist()
+    return [None if pd.isnull(value) else value for value in values]
+
+
+def _write_sidecars(filename, name, tableau, sidecars):
+    """Write a timeseries tableau to sidecar files next to the report.
+
+    Args:
+        filename: Excel spreadsheet filename of the report
+        name: name of the tableau, '<site name>.<com>'
+        tableau: DataFrame of timeseries with two column levels
+        sidecars: list of formats ('csv', 'parquet')
+
+    Returns:
+        Nothing
+    """
+    basename = os.path.splitext(filename)[0]
+    for fmt in sidecars:
+        sidecar = '{}-{}.{}'.format(basename, name, fmt)
+        if fmt == 'csv':
+            tableau.to_csv(sidecar)
+        else:
+            # Parquet needs string column names, e.g. 'Created.Wind park'
+            flat = tableau.copy(deep=False)
+            flat.columns = ['.'.join(str(level) for level in column)
+                            for column in tableau.columns]
+            flat.to_parquet(sidecar)
@@ -0,0 +1,290 @@
+"""Rolling-horizon solution of long time horizons
+
+Instead of one monolithic problem, run_rolling_horizon solves a sequence of
+overlapping windows with fixed capacities, each generated with the matrix
+backend (see urbs.matrixmodel). Of every window, only the timesteps up to
+the start of the overlap are kept; the end state of this committed part
+(storage content, process throughput for the gradient limits and pending
+DSM shifts) is fixed at the start of the next window. No model of the
+whole horizon is built: the stitched solution is assembled from the result
+caches of the windows.
+
+"""
+import numpy as np
+import pandas as pd
+import time
+from collections import OrderedDict
+from .input import copy_input
+from .matrixmodel import COST_TYPES, MatrixModel, create_matrix_model
+from .pyomoio import get_entity
+
+CAPACITY_VARIABLES = ['cap_pro', 'cap_pro_new', 'cap_tra', 'cap_tra_new',
+                      'cap_sto_c', 'cap_sto_c_new', 'cap_sto_p',
+                      'cap_sto_p_new']
+
+# constraints on annual totals, which are enforced per window
+ANNUAL_LIMITS = ['res_stock_total', 'res_sell_total', 'res_buy_total',
+                 'res_env_total', 'res_global_co2_limit']
+
+
+def run_rolling_horizon(data, timesteps=None, window=168, overlap=24, dt=1,
+                        capacities=None, solver='highs'):
+    """Solve a urbs model window by window with a rolling horizon.
+
+    Each window has a length of window modelled timesteps, of which the
+    first window - overlap are kept; the next window starts right after
+    them. All capacities are fixed: either to the installed capacities
+    ('inst-cap' columns, no expansion) or to the result of a preceding
+    capacity planning run, e.g. on aggregated timeseries.
+
+    Limits on annual totals (commodity 'max', global CO2 limit) can only be
+    approximated, as no window knows the later ones. Each window gets the
+    share of the limit of its timesteps that are not carried over from the
+    previous window, i.e. the limit is spread evenly over the horizon; the
+    stitched solution may still exceed it slightly, as the overlap of a
+    window is solved again by the next one. Likewise, every window has to
+    end with at least the initial storage content, so that a myopic window
+    cannot empty the storages which later windows rely on.
+
+    DSM shifts from a committed timestep to one beyond the end of its
+    window are not part of any window: they are forced to 0 and missing
+    from the stitched dsm_down. This only happens for overlaps shorter than
+    the DSM delay.
+
+    Args:
+        data: urbs input dict, e.g. from read_excel; representative periods
+            (see urbs.aggregation) are not supported
+        timesteps: (optional) list of timesteps, default: demand timeseries
+        window: (optional) modelled timesteps per window, default: 168
+        overlap: (optional) timesteps solved again by the next window,
+            default: 24
+        dt: (optional) timestep duration in hours, default: 1
+        capacities: (optional) a solved urbs model instance (or result
+            container) whose capacities are used; default: installed
+            capacities
+        solver: (optional) solver for MatrixModel.solve, default: 'highs'
+
+    Returns:
+        a MatrixModel of the whole horizon (without variables and
+        constraints), whose result cache holds the stitched solution, so
+        that report, result_figures and save accept it; its attribute
+        windows lists the committed timesteps, objective value and solution
+        time of every window
+    """
+    if not 0 <= overlap < window:
+        raise ValueError('Overlap must be smaller than window length.')
+    if 'period' in data:
+        raise ValueError('Rolling horizon models do not support '
+                         'representative periods.')
+    if timesteps is None:
+        timesteps = data['demand'].index.tolist()
+    timesteps = list(timesteps)
+    last = len(timesteps) - 1  # position of last timestep
+    horizon = MatrixModel(data, timesteps, dt)
+
+    # DSM shifts reach back up to delay timesteps and the recovery limit
+    # sums over recov timesteps, so this many timesteps before the
+    # committed part are carried into the next window, too
+    carry = 0
+    if not data['dsm'].empty:
+        carry = int(max(data['dsm']['delay'].max(),
+                        data['dsm']['recov'].max()))
+
+    committed = OrderedDict()  # entity name: list of committed parts
+    costs = np.zeros(len(COST_TYPES))
+    windows = []
+    previous = None  # (model, solution, position of t0) of last window
+    start = 1  # position of first timestep to commit
+    while start <= last:
+        first = max(0, start - 1 - carry)  # position of window's t0
+        end = min(last, start + window - 1)
+        commit = end if end == last else start + window - overlap - 1
+
+        clock = time.time()
+        wm = create_matrix_model(copy_input(data), timesteps[first:end + 1],
+                                 dt)
+        _fix_capacities(wm, data, capacities)
+        if previous is not None:
+            pm, px, pfirst = previous
+            _fix_carried_state(wm, pm, px, first - pfirst, start - first,
+                               timesteps[start])
+        wx, _ = wm.solve(solver)
+        lo = 0 if start == 1 else start
+        _commit(wm, committed, timesteps[lo], timesteps[commit])
+        costs += _committed_costs(wm, wx, lo - first, commit - first,
+                                  horizon.weight)
+        windows.append((timesteps[start], timesteps[commit], wm.obj_value,
+                        time.time() - clock))
+        previous = (wm, wx, first)
+        start = commit + 1
+
+    # capacity costs, which are identical in every window
+    costs += _committed_costs(wm, wx, None, None, horizon.weight)
+
+    result = OrderedDict()
+    for name, values in wm._result.items():
+        if name in committed:
+            result[name] = pd.concat(committed[name])
+        elif name in ('dt', 'weight'):
+            result[name] = pd.Series([getattr(horizon, name)],
+                                     index=values.index, name=name)
+        elif name == 'costs':
+            result[name] = pd.Series(costs, index=values.index, name=name)
+        else:
+            result[name] = values
+    result['tm'] = pd.Series(1, index=pd.Index(timesteps[1:], name='t'),
+                             name='tm')
+
+    # input with derived columns (e.g. annuity factors), like the windows'
+    horizon._data = wm._data
+    horizon._result = result
+    horizon.obj_value = float(costs.sum())
+    horizon.windows = pd.DataFrame(
+        windows, columns=['first', 'last', 'objective', 'time'])
+    return horizon
+
+
+def _fix_capacities(wm, data, capacities):
+    """Fix the capacity variables of a window model.
+
+    Args:
+        wm: window MatrixModel
+        data: urbs input dict
+        capacities: solved urbs model instance or None for installed
+            capacities
+
+    Returns:
+        Nothing
+    """
+    if capacities is None:
+        for name in CAPACITY_VARIABLES:
+            if name.endswith('_new'):
+                wm.fix(name, slice(None), 0)
+        return
+
+    for name in CAPACITY_VARIABLES:
+        var = wm.variables[name]
+        values = get_entity(capacities, name)
+        wm.fix(name, np.arange(var.size),
+               [values[tup] for tup in var.tuples])
+
+
+def _fix_carried_state(wm, pm, px, shift, num_carried, t_start):
+    """Fix the carried-over timesteps of a window to the committed solution.
+
+    The first num_carried timesteps of the window (including its initial
+    timestep) have already been committed; they are part of the previous
+    window, whose solution holds their committed values. Their variables
+    are fixed and their constraints dropped, as these may refer to
+    timesteps before the window. Only the DSM recovery limit, which looks
+    ahead into the uncommitted timesteps, is kept.
+
+    The annual limits are restricted to the remaining timesteps: the
+    contribution of the fixed timesteps is added to their bound, which is
+    scaled to the share of the remaining timesteps.
+
+    Args:
+        wm: window MatrixModel
+        pm: MatrixModel of the previous window
+        px: solution of the previous window
+        shift: number of timesteps the window starts after the previous one
+        num_carried: number of carried-over timesteps
+        t_start: first timestep to be committed by this window
+
+    Returns:
+        Nothing
+    """
+    fixed = np.zeros(wm.num_cols)
+    for name, var in wm.variables.items():
+        prev_var = pm.variables[name]
+        if var.time is not None:
+            local = np.arange(max(0, num_carried - var.t0) * var.n)
+            fixed[var.cols(local)] = px[prev_var.cols(local + shift * var.n)]
+            wm.fix(name, local, fixed[var.cols(local)])
+        elif name == 'dsm_down':
+            # shifts between a committed and an uncommitted timestep; those
+            # missing in the previous window have never been committed
+            carried = [j for j, (t, tt, sit, com) in enumerate(var.tuples)
+                       if min(t, tt) < t_start]
+            wm.fix(name, carried,
+                   [px[prev_var.cols(prev_var.pos[var.tuples[j]])]
+                    if var.tuples[j] in prev_var.pos else 0
+                    for j in carried])
+
+    for name, con in wm.constraints.items():
+        if con.time is not None and name != 'res_dsm_recovery':
+            con.active[:max(0, num_carried - con.t0) * con.n] = False
+
+    share = (float(len(wm.timesteps) - num_carried) /
+             (len(wm.timesteps) - 1))
+    for name in ANNUAL_LIMITS:
+        con = wm.constraints[name]
+        rows, cols, vals = con.triplets()
+        contribution = np.bincount(rows, weights=vals * fixed[cols],
+                                   minlength=con.size)
+        bounded = np.isfinite(con.upper)
+        con.upper[bounded] = (con.upper[bounded] * share +
+                              contribution[bounded])
+
+
+def _commit(wm, committed, t_first, t_commit):
+    """Collect the committed part of a window solution.
+
+    Args:
+        wm: solved window MatrixModel
+        committed: dict of entity names to lists of committed parts of the
+            result cache, modified in place
+        t_first: first timestep to commit
+        t_commit: last timestep to commit
+
+    Returns:
+        Nothing
+    """
+    for name, var in wm.variables.items():
+        values = wm._result[name]
+        if var.time is not None:
+            t = values.index.get_level_values('t')
+        elif name == 'dsm_down':
+            t = np.minimum(values.index.get_level_values(0),
+                           values.index.get_level_values(1))
+        else:
+            continue
+        committed.setdefault(name, []).append(
+            values[(t >= t_first) & (t <= t_commit)])
+
+
+def _committed_costs(wm, wx, lo, commit, weight):
+    """Costs of the committed part of a window solution.
+
+    Each row of def_costs reads costs[cost_type] - (sum of cost terms) == 0.
+    The terms of timesteps are weighted like in a model of the whole
+    horizon.
+
+    Args:
+        wm: window MatrixModel
+        wx: solution of the window
+        lo, commit: first and last committed position within the window;
+            None for the terms of the variables without time index instead
+        weight: weight of a timestep in the whole horizon
+
+    Returns:
+        array of costs, one per cost type
+    """
+    mask = np.zeros(wm.num_cols, dtype=bool)
+    for name, var in wm.variables.items():
+        if name == 'costs' or (var.time is None) != (lo is None):
+            continue
+        if lo is None:
+            mask[var.cols(np.arange(var.size))] = True
+        else:
+            local = np.arange((max(lo, var.t0) - var.t0) * var.n,
+                              (commit + 1 - var.t0) * var.n)
+            mask[var.cols(local)] = True
+    scale = 1 if lo is None else weight / wm.weight
+
+    con = wm.constraints['def_costs']
+    rows, cols, vals = con.triplets()
+    used = mask[cols]
+    return -scale * np.bincount(rows[used],
+                                weights=vals[used] * wx[cols[used]],
+                                minlength=con.size)
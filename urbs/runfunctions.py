@@ -0,0 +1,317 @@
+import multiprocessing
+import os
+import pandas as pd
+import time
+import traceback
+from .catalogue import update_catalogue
+from .input import copy_input, read_excel
+from .model import create_model
+from .plot import result_figures
+from .report import report
+from .saveload import save
+from .sweep import is_persistent, update_model, update_persistent_solver
+from .validation import validate_input
+
+
+def prepare_result_directory(result_name):
+    """ create a time stamped directory within the result folder """
+    from datetime import datetime
+
+    # timestamp for result directory
+    now = datetime.now().strftime('%Y%m%dT%H%M')
+
+    # create result directory if not existent
+    result_dir = os.path.join('result', '{}-{}'.format(result_name, now))
+    if not os.path.exists(result_dir):
+        os.makedirs(result_dir)
+
+    return result_dir
+
+
+def setup_solver(optim, logfile='solver.log'):
+    """ """
+    if optim.name == 'gurobi':
+        # reference with list of option names
+        # http://www.gurobi.com/documentation/5.6/reference-manual/parameters
+        optim.set_options("logfile={}".format(logfile))
+        # optim.set_options("timelimit=7200")  # seconds
+        # optim.set_options("mipgap=5e-4")  # default = 1e-4
+    elif optim.name == 'glpk':
+        # reference with list of options
+        # execute 'glpsol --help'
+        optim.set_options("log={}".format(logfile))
+        # optim.set_options("tmlim=7200")  # seconds
+        # optim.set_options("mipgap=.0005")
+    else:
+        print("Warning from setup_solver: no options set for solver "
+              "'{}'!".format(optim.name))
+    return optim
+
+
+def run_scenario(input_file, timesteps, scenario, result_dir,
+                 plot_tuples=None,  plot_sites_name=None, plot_periods=None,
+                 report_tuples=None, report_sites_name=None,
+                 solver='glpk', tee=True, save_entities=None, cache=False):
+    """ run an urbs model for given input, time steps and scenario
+
+    Args:
+        input_file: filename to an Excel spreadsheet for urbs.read_excel
+        timesteps: a list of timesteps, e.g. range(0,8761)
+        scenario: a scenario function that modifies the input data dict
+        result_dir: directory name for result spreadsheet and plots
+        plot_tuples: (optional) list of plot tuples (c.f. urbs.result_figures)
+        plot_sites_name: (optional) dict of names for sites in plot_tuples
+        plot_periods: (optional) dict of plot periods(c.f. urbs.result_figures)
+        report_tuples: (optional) list of (sit, com) tuples (c.f. urbs.report)
+        report_sites_name: (optional) dict of names for sites in report_tuples
+        solver: (optional) solver name for SolverFactory, default 'glpk'
+        tee: (optional) print solver output to the console, default True
+        save_entities: (optional) entities to save (c.f. urbs.save), e.g.
+                       'report'; default: all
+        cache: (optional) use the parsed input cache (c.f.
+               urbs.read_excel), default False
+
+    Returns:
+        the urbs model instance
+    """
+    import pyomo.environ
+    from pyomo.opt.base import SolverFactory
+
+    # scenario name, read and modify data for scenario
+    sce = scenario.__name__
+    data = read_excel(input_file, cache=cache)
+    data = scenario(data)
+    validate_input(data)
+
+    # create model
+    prob = create_model(data, timesteps)
+
+    # create filename for logfile
+    log_filename = os.path.join(result_dir, '{}.log').format(sce)
+
+    # solve model and read results
+    optim = SolverFactory(solver)  # cplex, glpk, gurobi, ...
+    optim = setup_solver(optim, logfile=log_filename)
+    start = time.time()
+    result = optim.solve(prob, tee=tee)
+    prob.solve_time = time.time() - start
+    prob.solver_status = str(result.solver.termination_condition)
+
+    _write_results(prob, sce, result_dir, plot_tuples, plot_sites_name,
+                   plot_periods, report_tuples, report_sites_name,
+                   save_entities)
+    return prob
+
+
+def _write_results(prob, sce, result_dir, plot_tuples=None,
+                   plot_sites_name=None, plot_periods=None,
+                   report_tuples=None, report_sites_name=None,
+                   save_entities=None):
+    """ save, report and plot the results of a solved scenario
+
+    Args:
+        prob: a solved urbs model instance
+        sce: scenario name, used for the file names
+        result_dir: directory name for result spreadsheet and plots
+        others: as in run_scenario
+
+    Returns:
+        Nothing
+    """
+    # save problem solution (and input data) to HDF5 file
+    save(prob, os.path.join(result_dir, '{}.h5'.format(sce)),
+         entities=save_entities)
+
+    # write report to spreadsheet
+    report(
+        prob,
+        os.path.join(result_dir, '{}.xlsx').format(sce),
+        report_tuples=report_tuples,
+        report_sites_name=report_sites_name)
+
+    # result plots
+    result_figures(
+        prob,
+        os.path.join(result_dir, '{}'.format(sce)),
+        plot_title_prefix=sce.replace('_', ' '),
+        plot_tuples=plot_tuples,
+        plot_sites_name=plot_sites_name,
+        periods=plot_periods,
+        figure_size=(24, 9))
+
+
+def _run_scenario_job(job):
+    """ run a single scenario and summarise its outcome
+
+    Used as the process pool target of run_scenarios. Any exception raised
+    while running the scenario is caught and reported in the returned
+    summary, so that one failing scenario does not abort the whole batch.
+
+    Args:
+        job: tuple (input_file, timesteps, scenario, result_dir, kwargs)
+
+    Returns:
+        dict with keys scenario, status, objective, time and error
+    """
+    input_file, timesteps, scenario, result_dir, kwargs = job
+    summary = {'scenario': scenario.__name__,
+               'status': 'failed',
+               'objective': float('nan'),
+               'time': 0.0,
+               'error': ''}
+
+    start = time.time()
+    try:
+        prob = run_scenario(input_file, timesteps, scenario, result_dir,
+                            **kwargs)
+        summary['status'] = getattr(prob, 'solver_status', 'ok')
+        summary['objective'] = float(prob.obj())
+    except Exception:
+        summary['error'] = traceback.format_exc()
+    summary['time'] = time.time() - start
+    return summary
+
+
+def run_scenarios(input_file, timesteps, scenarios, result_dir, workers=None,
+                  **kwargs):
+    """ run several urbs scenarios in parallel
+
+    Each scenario is run by run_scenario in its own worker process, so the
+    wall time of a batch approaches the time of its slowest scenario once
+    there are at least as many workers as scenarios. Solver output is
+    written to one logfile per scenario in result_dir instead of the
+    console. A failing scenario is recorded in the returned summary and
+    does not stop the remaining ones. Finally, the scenario catalogue of
+    result_dir is updated (c.f. urbs.update_catalogue).
+
+    Args:
+        input_file: filename to an Excel spreadsheet for urbs.read_excel
+        timesteps: a list of timesteps, e.g. range(0,8761)
+        scenarios: list of scenario functions; must be defined at module
+                   level so that they can be sent to the worker processes
+        result_dir: directory name for result spreadsheets and plots
+        workers: (optional) number of worker processes; defaults to the
+                 number of CPUs, capped at the number of scenarios. With
+                 workers=1 all scenarios run in the current process.
+        **kwargs: further arguments passed on to run_scenario, e.g.
+                  plot_tuples, report_tuples, solver or cache
+
+    Returns:
+        DataFrame indexed by scenario name with columns status, objective,
+        time (seconds) and error (traceback of failed scenarios)
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(scenarios)))
+    kwargs.setdefault('tee', False)
+
+    # parse the input once up front, so that the workers only load the
+    # parsed input cache instead of parsing the spreadsheet concurrently
+    if kwargs.get('cache'):
+        read_excel(input_file, cache=True)
+
+    jobs = [(input_file, timesteps, scenario, result_dir, kwargs)
+            for scenario in scenarios]
+
+    if workers == 1:
+        summaries = [_run_scenario_job(job) for job in jobs]
+    else:
+        # one fresh process per scenario keeps the memory of finished
+        # models from piling up in long-lived workers
+        pool = multiprocessing.Pool(processes=workers, maxtasksperchild=1)
+        try:
+            summaries = pool.map(_run_scenario_job, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    update_catalogue(result_dir)
+
+    summary = pd.DataFrame(summaries).set_index('scenario')
+    return summary[['status', 'objective', 'time', 'error']]
+
+
+def run_sweep(input_file, timesteps, scenarios, result_dir,
+              solver='appsi_highs', tee=False, cache=False, **kwargs):
+    """ run urbs scenarios one after another on a single model instance
+
+    Scenarios that only change mutable input values (commodity prices,
+    process capacity bounds and the global CO2 limit, cf. urbs.sweep) are
+    applied to the model of the previous scenario instead of creating it
+    anew. With a persistent solver, only the changed coefficients are sent
+    to the solver, which restarts from the previous basis. Scenarios that
+    change the model structure (e.g. removing all DSM entries) fall back to
+    creating the model from scratch. Finally, the scenario catalogue of
+    result_dir is updated (c.f. urbs.update_catalogue).
+
+    Args:
+        input_file: filename to an Excel spreadsheet for urbs.read_excel
+        timesteps: a list of timesteps, e.g. range(0,8761)
+        scenarios: list of scenario functions; similar scenarios should be
+                   listed next to each other to share a model
+        result_dir: directory name for result spreadsheets and plots
+        solver: (optional) solver name for SolverFactory, default
+                'appsi_highs'; persistent solvers (e.g. appsi_highs,
+                gurobi_persistent) are warm started
+        tee: (optional) print solver output to the console, default False
+        cache: (optional) use the parsed input cache (c.f.
+               urbs.read_excel), default False
+        **kwargs: further arguments for the result output as in
+                  run_scenario, e.g. plot_tuples or report_tuples
+
+    Returns:
+        DataFrame indexed by scenario name with columns status, objective,
+        time (seconds), rebuilt (whether the model was created anew) and
+        error (traceback of failed scenarios)
+    """
+    import pyomo.environ
+    from pyomo.opt.base import SolverFactory
+
+    data = read_excel(input_file, cache=cache)
+    prob = None
+    summaries = []
+    for scenario in scenarios:
+        sce = scenario.__name__
+        summary = {'scenario': sce,
+                   'status': 'failed',
+                   'objective': float('nan'),
+                   'time': 0.0,
+                   'rebuilt': False,
+                   'error': ''}
+        start = time.time()
+        try:
+            sce_data = scenario(copy_input(data))
+            validate_input(sce_data)
+
+            if prob is None or not update_model(prob, sce_data):
+                summary['rebuilt'] = True
+                prob = create_model(sce_data, timesteps)
+                optim = SolverFactory(solver)
+                persistent = is_persistent(optim)
+                if persistent == 'legacy':
+                    optim.set_instance(prob)
+            elif persistent == 'legacy':
+                update_persistent_solver(optim, prob)
+            if persistent is None:
+                optim = setup_solver(optim, logfile=os.path.join(
+                    result_dir, '{}.log'.format(sce)))
+
+            solve_start = time.time()
+            result = optim.solve(prob, tee=tee)
+            prob.solve_time = time.time() - solve_start
+            prob.solver_status = str(result.solver.termination_condition)
+            summary['status'] = prob.solver_status
+            summary['objective'] = float(pyomo.environ.value(prob.obj))
+
+            _write_results(prob, sce, result_dir, **kwargs)
+        except Exception:
+            summary['error'] = traceback.format_exc()
+            # the model may be half-updated, so start over
+            prob = None
+        summary['time'] = time.time() - start
+        summaries.append(summary)
+
+    update_catalogue(result_dir)
+
+    summary = pd.DataFrame(summaries).set_index('scenario')
+    return summary[['status', 'objective', 'time', 'rebuilt', 'error']]
@@ -1,44 +1,168 @@
 import pandas as pd
+import warnings
 from .pyomoio import get_entity, list_entities
+from .util import is_string
 
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
 
-def create_result_cache(prob):
-    entity_types = ['set', 'par', 'var']
-    if hasattr(prob, 'dual'):
-        entity_types.append('con')
+# model attributes saved as metadata, e.g. for the scenario catalogue
+METADATA_ATTRIBUTES = ['created', 'solver_status', 'solve_time']
 
-    entities = []
-    for entity_type in entity_types:
-        entities.extend(list_entities(prob, entity_type).index.tolist())
+# entities read by report, result_figures, get_constants and get_timeseries
+REPORT_ENTITIES = [
+    'tm', 'costs',
+    'cap_pro', 'cap_pro_new', 'cap_tra', 'cap_tra_new',
+    'cap_sto_c', 'cap_sto_c_new', 'cap_sto_p', 'cap_sto_p_new',
+    'e_co_stock', 'e_pro_in', 'e_pro_out', 'e_tra_in', 'e_tra_out',
+    'e_sto_con', 'e_sto_in', 'e_sto_out', 'dsm_up', 'dsm_down']
+
+
+def create_result_cache(prob, entities=None):
+    """Extract entities of a model instance into a dict of Series.
+
+    Args:
+        prob: a urbs model instance
+        entities: (optional) list of entity names, or 'report' for the
+            entities needed by report and result_figures (REPORT_ENTITIES);
+            default: all sets, params, variables and, if the model has
+            duals, constraints
+
+    Returns:
+        dict of entity names to pandas Series; entities already in the
+        result cache of prob are taken from there without copying
+    """
+    cached = getattr(prob, '_result', {})
+
+    if entities is None:
+        entity_types = ['set', 'par', 'var']
+        if hasattr(prob, 'dual'):
+            entity_types.append('con')
+
+        entities = []
+        for entity_type in entity_types:
+            entities.extend(list_entities(prob, entity_type).index.tolist())
+        entities.extend(name for name in cached if name not in entities)
+    elif is_string(entities) and entities == 'report':
+        entities = REPORT_ENTITIES
 
     result_cache = {}
     for entity in entities:
-        result_cache[entity] = get_entity(prob, entity)
+        if entity in cached:
+            result_cache[entity] = cached[entity]
+        elif hasattr(prob, entity):
+            result_cache[entity] = get_entity(prob, entity)
     return result_cache
 
 
-def save(prob, filename):
+def save(prob, filename, entities=None, complib='blosc:zstd', complevel=5):
     """Save urbs model input and result cache to a HDF5 store file.
 
+    Result entities are written in compressed table format, with their
+    index levels (e.g. t, sit, com) as data columns, so that load can read
+    slices of them. Input DataFrames, empty and scalar entities are written
+    in (compressed) fixed format.
+
+    Model attributes listed in METADATA_ATTRIBUTES (time of creation,
+    solver status and solve time) are saved as Series 'metadata'. The
+    construction profile of create_model(..., profile=True), if any, is
+    saved as DataFrame 'profile', e.g. for pd.read_hdf(filename, 'profile').
+
+    Entities are saved with the index they have in prob; in particular,
+    dsm_down is indexed by (t, sit, com) for the 'compact' DSM formulation
+    and by timestep pairs (t, t_, sit, com) for the 'pairwise' one and the
+    matrix backend (cf. create_model). get_timeseries accepts both.
+
+    No result cache is attached to prob, so that a model can be solved and
+    saved again, e.g. by run_sweep.
+
     Args:
         prob: a urbs model instance containing a solution
         filename: HDF5 store file to be written
+        entities: (optional) list of entity names to save, or 'report' for
+            only those needed by report and result_figures; default: all
+        complib: (optional) compression library, default: 'blosc:zstd'
+        complevel: (optional) compression level 0-9, default: 5
 
     Returns:
         Nothing
     """
-    import warnings
-    warnings.filterwarnings('ignore',
-                            category=pd.io.pytables.PerformanceWarning)
+    result = create_result_cache(prob, entities)
+
+    import tables
 
-    if not hasattr(prob, '_result'):
-        prob._result = create_result_cache(prob)
+    with warnings.catch_warnings(), \
+            pd.HDFStore(filename, mode='w', complib=complib,
+                        complevel=complevel) as store:
+        # harmless for the small input tables and scalar entities: pickled
+        # object columns and index names like 'Site In'
+        warnings.simplefilter('ignore', pd.io.pytables.PerformanceWarning)
+        warnings.simplefilter('ignore', tables.NaturalNameWarning)
 
-    with pd.HDFStore(filename, mode='w') as store:
         for name in prob._data.keys():
-            store['data/'+name] = prob._data[name]
-        for name in prob._result.keys():
-            store['result/'+name] = prob._result[name]
+            # fixed format, as tables do not support MultiIndex columns
+            store.put('data/'+name, prob._data[name])
+        for name in result.keys():
+            _put_result(store, 'result/'+name, result[name])
+
+        metadata = pd.Series(dict((attr, getattr(prob, attr))
+                                  for attr in METADATA_ATTRIBUTES
+                                  if hasattr(prob, attr)), dtype=object)
+        if len(metadata):
+            store.put('metadata', metadata)
+        if isinstance(getattr(prob, 'profile', None), pd.DataFrame):
+            store.put('profile', prob.profile)
+
+
+def _put_result(store, key, value):
+    """Write a result Series to store, as queryable table if possible."""
+    if len(value):
+        try:
+            store.put(key, value, format='table', data_columns=True,
+                      index=False)
+            return
+        except (TypeError, ValueError):
+            # e.g. scalars, whose index holds None; drop partial node
+            if key in store:
+                store.remove(key)
+    store.put(key, value)
+
+
+def _where(storer, where):
+    """Translate a where dict into conditions on the levels of a table.
+
+    Args:
+        storer: storer of a result node written by save
+        where: dict of index level names to a value, a list of values or
+            a slice of values (including both ends)
+
+    Returns:
+        list of condition strings for HDFStore.select; levels which the
+        table does not have are ignored
+    """
+    if storer.is_multi_index:
+        columns = dict((level, level) for level in storer.levels)
+    else:
+        # the single index of a Series table is called 'index' in queries
+        columns = {storer.info['index'].get('index_name'): 'index'}
+
+    conditions = []
+    for level, value in where.items():
+        if level not in columns:
+            continue
+        column = columns[level]
+        if isinstance(value, slice):
+            if value.start is not None:
+                conditions.append('{} >= {!r}'.format(column, value.start))
+            if value.stop is not None:
+                conditions.append('{} <= {!r}'.format(column, value.stop))
+        elif isinstance(value, (list, tuple)):
+            conditions.append('{} == {!r}'.format(column, list(value)))
+        else:
+            conditions.append('{} == {!r}'.format(column, value))
+    return conditions
 
 
 class ResultContainer(object):
@@ -48,15 +172,68 @@ class ResultContainer(object):
         self._result = result
 
 
-def load(filename):
+class _LazyStoreGroup(Mapping):
+    """ Read-only dict of the nodes of one group in a HDF5 store file.
+
+    Nodes are read from the file on first access only and kept afterwards.
+    The file is opened for each read, so it must not be moved or modified
+    while the container is in use.
+    """
+    def __init__(self, filename, group, where=None):
+        self._filename = filename
+        self._group = group
+        self._where = where
+        with pd.HDFStore(filename, mode='r') as store:
+            self._names = [node._v_name for node in store.get_node(group)]
+        self._cache = {}
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in self._names:
+                raise KeyError(name)
+            with pd.HDFStore(self._filename, mode='r') as store:
+                self._cache[name] = _select(
+                    store, '{}/{}'.format(self._group, name), self._where)
+        return self._cache[name]
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+
+def _select(store, key, where=None):
+    """Read a node from store, only the rows matching where for tables."""
+    storer = store.get_storer(key)
+    if where and storer.is_table:
+        return store.select(key, where=_where(storer, where))
+    return store[key]
+
+
+def load(filename, lazy=False, where=None):
     """Load a urbs model result container from a HDF5 store file.
 
     Args:
         filename: an existing HDF5 store file
+        lazy: (optional) if True, input and result entities are only read
+            from the file when first accessed, e.g. by get_entity; if False
+            (default), everything is read at once
+        where: (optional) dict of index level names to a value, a list of
+            values or a slice (including both ends), e.g. {'com': 'Elec',
+            't': slice(1, 168)}; only the matching rows of each result
+            entity having these levels are read. Input data is not sliced.
 
     Returns:
         prob: the modified instance containing the result cache
     """
+    if lazy:
+        return ResultContainer(_LazyStoreGroup(filename, 'data'),
+                               _LazyStoreGroup(filename, 'result', where))
+
     with pd.HDFStore(filename, mode='r') as store:
         data_cache = {}
         for group in store.get_node('data'):
@@ -64,6 +241,7 @@ def load(filename):
 
         result_cache = {}
         for group in store.get_node('result'):
-            result_cache[group._v_name] = store[group._v_pathname]
+            result_cache[group._v_name] = _select(
+                store, group._v_pathname, where)
 
     return ResultContainer(data_cache, result_cache)
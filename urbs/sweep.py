@@ -0,0 +1,153 @@
+"""In-place model updates for scenario sweeps
+
+Scenarios often only change a few input values, e.g. commodity prices, the
+global CO2 limit or process capacity bounds. create_model declares these
+values as mutable parameters, so that update_model can apply such a
+scenario to an existing model instead of building it again. A persistent
+solver then only receives the changed coefficients and restarts from the
+basis of the previous solution.
+
+"""
+import numpy as np
+
+# (input table, column) -> mutable parameter of create_model; for table
+# 'global_prop', only the row 'CO2 limit' is mutable
+MUTABLE_INPUTS = {
+    ('commodity', 'price'): 'commodity_price',
+    ('process', 'cap-lo'): 'process_cap_lo',
+    ('process', 'cap-up'): 'process_cap_up',
+    ('global_prop', 'value'): 'co2_limit'}
+
+# constraints whose coefficients or bounds depend on the mutable parameters
+PARAMETER_CONSTRAINTS = ['def_costs', 'res_process_capacity',
+                         'res_global_co2_limit']
+
+
+def update_model(prob, data):
+    """Apply the input of another scenario to a model as parameter update.
+
+    This is only possible if the new input differs from the model's input
+    in mutable values alone (see MUTABLE_INPUTS). Values switching between
+    finite and infinite change the model structure, as infinite bounds and
+    limits are left out when the model is created.
+
+    Args:
+        prob: a urbs model instance from create_model
+        data: urbs input dict of the new scenario
+
+    Returns:
+        True if the model has been updated, False if the input differs
+        structurally; the model is left unchanged then and has to be
+        created anew
+    """
+    if set(data.keys()) != set(prob._data.keys()):
+        return False
+    changes = []
+    for key in data:
+        columns = [col for table, col in MUTABLE_INPUTS if table == key]
+        changed = _changed_columns(prob._data[key], data[key], columns)
+        if changed is None:
+            return False
+        changes.extend((key, col) for col in changed)
+
+    if ('global_prop', 'value') in changes:
+        old = prob._data['global_prop'].loc['CO2 limit', 'value']
+        new = data['global_prop'].loc['CO2 limit', 'value']
+        # the CO2 limit constraint is skipped for infinite or negative limits
+        if np.isinf(old) or np.isinf(new) or (old >= 0) != (new >= 0):
+            return False
+        other = data['global_prop'].index != 'CO2 limit'
+        if not prob._data['global_prop'].loc[other, 'value'].equals(
+                data['global_prop'].loc[other, 'value']):
+            return False
+
+    for key, col in changes:
+        # frames of the model are updated in place, as prob.commodity,
+        # prob.process and prob._data share them
+        prob._data[key][col] = data[key][col]
+        param = getattr(prob, MUTABLE_INPUTS[key, col])
+        if key == 'global_prop':
+            prob.global_prop[col] = data[key][col]
+            param.value = data[key].loc['CO2 limit', col]
+        else:
+            values = data[key][col].to_dict()
+            getattr(prob, key + '_dict')[col] = values
+            param.store_values(dict((k, v) for k, v in values.items()
+                                    if not np.isnan(v)))
+    return True
+
+
+def update_persistent_solver(optim, prob):
+    """Send the constraints that depend on mutable parameters anew.
+
+    Persistent solver interfaces of pyomo.solvers (e.g. gurobi_persistent)
+    do not track parameter values, so after update_model the affected
+    constraints have to be replaced in the solver instance. The appsi
+    interfaces (e.g. appsi_highs) detect changed parameters themselves.
+
+    Args:
+        optim: a persistent solver with prob as its instance
+        prob: a urbs model instance updated by update_model
+
+    Returns:
+        Nothing
+    """
+    for name in PARAMETER_CONSTRAINTS:
+        for con in getattr(prob, name).values():
+            optim.remove_constraint(con)
+            optim.add_constraint(con)
+
+
+def is_persistent(optim):
+    """Tell whether a solver keeps its model instance between solves.
+
+    Args:
+        optim: a solver from SolverFactory
+
+    Returns:
+        'appsi' for the appsi interfaces, 'legacy' for the persistent
+        interfaces of pyomo.solvers or None
+    """
+    if hasattr(optim, 'update_config'):
+        return 'appsi'
+    try:
+        from pyomo.solvers.plugins.solvers.persistent_solver import \
+            PersistentSolver
+    except ImportError:
+        return None
+    if isinstance(optim, PersistentSolver):
+        return 'legacy'
+    return None
+
+
+def _changed_columns(old, new, columns):
+    """Find the changed mutable columns of an input table.
+
+    Args:
+        old: input DataFrame of the model
+        new: input DataFrame of the new scenario
+        columns: names of the mutable columns of this table
+
+    Returns:
+        list of changed mutable columns, or None if the table differs in
+        other respects or a value changes between finite and infinite
+    """
+    if not old.index.equals(new.index):
+        return None
+    # create_model adds derived columns (e.g. annuity-factor) to its input
+    if not set(new.columns) <= set(old.columns):
+        return None
+    fixed = [col for col in new.columns if col not in columns]
+    if not old[fixed].equals(new[fixed]):
+        return None
+
+    changed = []
+    for col in columns:
+        if col not in new.columns or old[col].equals(new[col]):
+            continue
+        old_values = old[col].values.astype(float)
+        new_values = new[col].values.astype(float)
+        if (np.isinf(old_values) != np.isinf(new_values)).any():
+            return None
+        changed.append(col)
+    return changed
@@ -1,68 +1,130 @@
 import pandas as pd
 
 
-def validate_input(data):
+def validate_input(data, raise_errors=True):
     """ Input validation function
 
-    This function raises errors if inconsistent or illogical inputs are
-    made, that might lead to erreneous results.
+    This function checks the input for inconsistent or illogical entries,
+    that might lead to erreneous results. All checks work on whole
+    DataFrames and every violation is collected, instead of stopping at
+    the first one.
 
     Args:
         data: Input data frames as read in by input.read_excel
+        raise_errors: (optional) if True (default), raise a ValueError
+            listing all violations, if there are any
 
     Returns:
-        Customized error messages.
+        list of violations, each a dict with keys 'table' (input sheet),
+        'index' (offending row index) and 'message'; empty if the input is
+        valid
 
     """
+    violations = []
+    violations.extend(_check_commodities_defined(data))
+    violations.extend(_check_capacity_bounds(
+        data['process'], 'process',
+        [('cap-lo', 'inst-cap', 'cap-up', 'processes')]))
+    violations.extend(_check_capacity_bounds(
+        data['transmission'], 'transmission',
+        [('cap-lo', 'inst-cap', 'cap-up', 'transmissions')]))
+    violations.extend(_check_capacity_bounds(
+        data['storage'], 'storage',
+        [('cap-lo-p', 'inst-cap-p', 'cap-up-p', 'storage powers'),
+         ('cap-lo-c', 'inst-cap-c', 'cap-up-c', 'storage capacities')]))
+    violations.extend(_check_supim(data['supim']))
 
-    # Ensure correct formation of vertex rule
-    for (sit, pro) in data['process'].index:
-        for com in data['commodity'].index.get_level_values('Commodity'):
-            simplified_pro_com_index = ([(p, c) for p, c, d in
-                                        data['process_commodity'].index
-                                        .tolist()])
-            simplified_com_index = ([(s, c) for s, c, t in data['commodity']
-                                    .index.tolist()])
-            if ((pro, com) in simplified_pro_com_index and
-                (sit, com) not in simplified_com_index):
-                raise ValueError('Commodities used in a process at a site must'
-                                 ' be specified in the commodity input sheet'
-                                 '! The pair (' + sit + ',' + com + ')'
-                                 ' is not in commodity input sheet.')
-
-    # Identify infeasible process, transmission and storage capacity
-    # constraints before solving
-    for index in data['process'].index:
-        if not (data['process'].loc[index]['cap-lo'] <=
-                data['process'].loc[index]['cap-up'] and
-                data['process'].loc[index]['inst-cap'] <=
-                data['process'].loc[index]['cap-up']):
-            raise ValueError('Ensure cap_lo <= cap_up and inst_cap <= cap_up'
-                             ' for all processes.')
-
-    for index in data['transmission'].index:
-        if not (data['transmission'].loc[index]['cap-lo'] <=
-                data['transmission'].loc[index]['cap-up'] and
-                data['transmission'].loc[index]['inst-cap'] <=
-                data['transmission'].loc[index]['cap-up']):
-            raise ValueError('Ensure cap_lo <= cap_up and inst_cap <= cap_up'
-                             ' for all transmissions.')
-
-    for index in data['storage'].index:
-        if not (data['storage'].loc[index]['cap-lo-p'] <=
-                data['storage'].loc[index]['cap-up-p'] and
-                data['storage'].loc[index]['inst-cap-p'] <=
-                data['storage'].loc[index]['cap-up-p']):
-            raise ValueError('Ensure cap_lo <= cap_up and inst_cap <= cap_up'
-                             ' for all storage powers.')
-
-        elif not (data['storage'].loc[index]['cap-lo-c'] <=
-                  data['storage'].loc[index]['cap-up-c'] and
-                  data['storage'].loc[index]['inst-cap-c'] <=
-                  data['storage'].loc[index]['cap-up-c']):
-            raise ValueError('Ensure cap_lo <= cap_up and inst_cap <= cap_up'
-                             ' for all storage capacities.')
-
-    # Identify SupIm values larger than 1, which lead to an infeasible model
-    if (data['supim'] > 1).sum().sum() > 0:
-        raise ValueError('All values in Sheet SupIm must be <= 1.')
+    if raise_errors and violations:
+        raise ValueError(
+            '{} input error(s):\n'.format(len(violations)) +
+            '\n'.join('{} {}: {}'.format(v['table'], v['index'], v['message'])
+                      for v in violations))
+    return violations
+
+
+def _check_commodities_defined(data):
+    """ Ensure correct formation of vertex rule
+
+    Commodities used in a process at a site must be specified in the
+    commodity input sheet for that site.
+
+    Args:
+        data: Input data frames as read in by input.read_excel
+
+    Returns:
+        list of violations
+    """
+    commodity = data['commodity'].index
+    known_coms = set(commodity.get_level_values('Commodity'))
+    com_sites = pd.DataFrame({
+        'Site': commodity.get_level_values('Site'),
+        'Commodity': commodity.get_level_values('Commodity'),
+        'defined': True}).drop_duplicates(['Site', 'Commodity'])
+
+    process = data['process'].index
+    pro_sites = pd.DataFrame({
+        'Site': process.get_level_values('Site'),
+        'Process': process.get_level_values('Process')})
+    pro_coms = pd.DataFrame({
+        'Process': data['process_commodity'].index
+                                            .get_level_values('Process'),
+        'Commodity': data['process_commodity'].index
+                                              .get_level_values('Commodity')})
+    pro_coms = pro_coms[pro_coms['Commodity'].isin(known_coms)]
+
+    # all (site, process, commodity) combinations, flagged if the
+    # (site, commodity) pair is missing in the commodity sheet
+    used = (pro_sites.merge(pro_coms.drop_duplicates(), on='Process')
+                     .merge(com_sites, on=['Site', 'Commodity'], how='left'))
+    missing = used[used['defined'].isnull()]
+
+    return [{'table': 'process',
+             'index': (sit, pro),
+             'message': 'Commodities used in a process at a site must be '
+                        'specified in the commodity input sheet! The pair '
+                        '({},{}) is not in commodity input sheet.'
+                        .format(sit, com)}
+            for sit, pro, com in zip(missing['Site'], missing['Process'],
+                                     missing['Commodity'])]
+
+
+def _check_capacity_bounds(df, table, bounds):
+    """ Identify infeasible capacity constraints before solving
+
+    Args:
+        df: process, transmission or storage input DataFrame
+        table: name of the input table, for the violation report
+        bounds: list of (cap_lo, inst_cap, cap_up, name) column name tuples;
+            rows must satisfy cap_lo <= cap_up and inst_cap <= cap_up
+
+    Returns:
+        list of violations
+    """
+    violations = []
+    for cap_lo, inst_cap, cap_up, name in bounds:
+        # negated, so that missing values count as violations, too
+        invalid = ~((df[cap_lo] <= df[cap_up]) & (df[inst_cap] <= df[cap_up]))
+        violations.extend(
+            {'table': table,
+             'index': index,
+             'message': 'Ensure cap_lo <= cap_up and inst_cap <= cap_up'
+                        ' for all {}.'.format(name)}
+            for index in df.index[invalid.values])
+    return violations
+
+
+def _check_supim(supim):
+    """ Identify SupIm values larger than 1, which lead to an infeasible model
+
+    Args:
+        supim: SupIm input DataFrame
+
+    Returns:
+        list of violations, one per offending (site, commodity) column
+    """
+    too_large = (supim > 1).sum()
+    return [{'table': 'supim',
+             'index': column,
+             'message': 'All values in Sheet SupIm must be <= 1; {} '
+                        'timesteps exceed 1.'.format(count)}
+            for column, count in too_large[too_large > 0].items()]